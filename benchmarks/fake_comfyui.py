@@ -0,0 +1,427 @@
+"""In-process stand-in for a ComfyUI server, for benchmarks and integration tests.
+
+Implements the parts of the ComfyUI API the client uses (``/system_stats``,
+``/prompt``, ``/queue``, ``/interrupt``, ``/history/{id}``, ``/view`` and
+``/ws``) and
+"executes" prompts by sleeping, streaming the same WebSocket events a real
+server sends. Execution time, jitter and failure rates are configurable, so
+the whole pipeline can be load tested without a GPU::
+
+    python -m benchmarks.fake_comfyui --port 8188 --delay 2.0
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import struct
+import time
+import uuid
+import zlib
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from aiohttp import WSMsgType, web
+
+
+def solid_png(seed: str, size: int = 64) -> bytes:
+    """A valid ``size`` x ``size`` RGB PNG whose colour depends on ``seed``."""
+    red, green, blue = hashlib.sha256(seed.encode()).digest()[:3]
+    row = b"\x00" + bytes((red, green, blue)) * size
+    pixels = zlib.compress(row * size)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", pixels)
+        + chunk(b"IEND", b"")
+    )
+
+
+class FakeComfyUI:
+    """A fake ComfyUI backend with ``workers`` simulated GPUs.
+
+    Each prompt takes ``execution_delay`` seconds (± ``jitter``), spread over
+    ``steps`` progress events. ``failure_rate`` is the share of prompts that
+    end in ``execution_error``; ``reject_rate`` the share of ``POST /prompt``
+    calls answered with HTTP 500. Each GPU keeps one checkpoint loaded;
+    running a prompt for another checkpoint first costs ``swap_delay``.
+    """
+
+    def __init__(
+        self,
+        execution_delay: float = 0.5,
+        jitter: float = 0.0,
+        steps: int = 4,
+        failure_rate: float = 0.0,
+        reject_rate: float = 0.0,
+        workers: int = 1,
+        swap_delay: float = 0.0,
+        image_size: int = 64,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.execution_delay = execution_delay
+        self.jitter = jitter
+        self.steps = max(1, steps)
+        self.failure_rate = failure_rate
+        self.reject_rate = reject_rate
+        self.workers = workers
+        self.swap_delay = swap_delay
+        self.image_size = image_size
+        self.random = random.Random(seed)
+        self.pending: Deque[Dict[str, Any]] = deque()
+        self.running: Dict[str, Dict[str, Any]] = {}
+        self.history: Dict[str, Dict[str, Any]] = {}
+        self.images: Dict[str, bytes] = {}
+        self.sockets: Dict[str, Set[web.WebSocketResponse]] = {}
+        self.counters = {
+            "submitted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+            "deleted": 0,
+            "interrupted": 0,
+        }
+        self.checkpoint_loads = 0
+        self.swap_seconds = 0.0
+        self._number = 0
+        self._work: Optional[asyncio.Condition] = None
+        self._worker_tasks: List["asyncio.Task[None]"] = []
+        self._executions: Dict[str, "asyncio.Task[None]"] = {}
+        self._interrupts: Set[str] = set()
+        self._runner: Optional[web.AppRunner] = None
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/system_stats", self.handle_system_stats)
+        app.router.add_post("/prompt", self.handle_prompt)
+        app.router.add_get("/queue", self.handle_queue)
+        app.router.add_post("/queue", self.handle_queue_edit)
+        app.router.add_post("/interrupt", self.handle_interrupt)
+        app.router.add_get("/history/{prompt_id}", self.handle_history)
+        app.router.add_get("/view", self.handle_view)
+        app.router.add_get("/ws", self.handle_websocket)
+        app.on_startup.append(self._start_workers)
+        app.on_shutdown.append(self._stop_workers)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Serve on ``host:port`` (0 picks a free port); returns the port."""
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return int(self._runner.addresses[0][1])
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self.pending),
+            "running": len(self.running),
+            **self.counters,
+            "checkpoint_loads": self.checkpoint_loads,
+            "swap_seconds": round(self.swap_seconds, 3),
+        }
+
+    async def handle_system_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"system": {"os": "fake"}, "devices": []})
+
+    async def handle_prompt(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        workflow = body.get("prompt")
+        if not isinstance(workflow, dict) or not workflow:
+            return web.json_response({"error": "invalid prompt"}, status=400)
+        if self.random.random() < self.reject_rate:
+            self.counters["rejected"] += 1
+            return web.json_response({"error": "injected failure"}, status=500)
+
+        prompt_id = str(body.get("prompt_id") or uuid.uuid4())
+        if (
+            prompt_id in self.history
+            or prompt_id in self.running
+            or any(item["prompt_id"] == prompt_id for item in self.pending)
+        ):
+            return web.json_response({"error": "prompt_id already exists"}, status=400)
+
+        self._number += 1
+        item = {
+            "number": self._number,
+            "prompt_id": prompt_id,
+            "prompt": workflow,
+            "client_id": body.get("client_id"),
+        }
+        assert self._work is not None
+        async with self._work:
+            self.pending.append(item)
+            self._work.notify()
+        self.counters["submitted"] += 1
+        return web.json_response(
+            {"prompt_id": prompt_id, "number": self._number, "node_errors": {}}
+        )
+
+    async def handle_queue(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "queue_running": [_queue_entry(item) for item in self.running.values()],
+                "queue_pending": [_queue_entry(item) for item in self.pending],
+            }
+        )
+
+    async def handle_queue_edit(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        deleted = set(body.get("delete") or [])
+        if body.get("clear"):
+            deleted.update(item["prompt_id"] for item in self.pending)
+        remaining = [item for item in self.pending if item["prompt_id"] not in deleted]
+        self.counters["deleted"] += len(self.pending) - len(remaining)
+        self.pending = deque(remaining)
+        # Like ComfyUI: an empty 200 response.
+        return web.Response()
+
+    async def handle_interrupt(self, request: web.Request) -> web.Response:
+        body = await request.json() if request.can_read_body else {}
+        prompt_id = body.get("prompt_id")
+        for running_id, task in list(self._executions.items()):
+            if prompt_id is None or prompt_id == running_id:
+                self._interrupts.add(running_id)
+                task.cancel()
+        return web.Response()
+
+    async def handle_history(self, request: web.Request) -> web.Response:
+        prompt_id = request.match_info["prompt_id"]
+        entry = self.history.get(prompt_id)
+        return web.json_response({prompt_id: entry} if entry else {})
+
+    async def handle_view(self, request: web.Request) -> web.Response:
+        image = self.images.get(request.query.get("filename", ""))
+        if image is None:
+            return web.Response(status=404)
+        return web.Response(body=image, content_type="image/png")
+
+    async def handle_websocket(self, request: web.Request) -> web.WebSocketResponse:
+        client_id = request.query.get("clientId", "")
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        self.sockets.setdefault(client_id, set()).add(ws)
+        try:
+            await ws.send_json(
+                {"type": "status", "data": {"sid": client_id, "status": {}}}
+            )
+            async for msg in ws:
+                if msg.type == WSMsgType.ERROR:
+                    break
+        finally:
+            self.sockets.get(client_id, set()).discard(ws)
+        return ws
+
+    async def _start_workers(self, app: web.Application) -> None:
+        self._work = asyncio.Condition()
+        self._worker_tasks = [
+            asyncio.ensure_future(self._worker()) for _ in range(self.workers)
+        ]
+
+    async def _stop_workers(self, app: web.Application) -> None:
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        for sockets in list(self.sockets.values()):
+            for ws in list(sockets):
+                await ws.close()
+
+    async def _worker(self) -> None:
+        assert self._work is not None
+        work = self._work
+        loaded: Optional[str] = None
+        while True:
+            async with work:
+                await work.wait_for(lambda: bool(self.pending))
+                item = self.pending.popleft()
+            self.running[item["prompt_id"]] = item
+            try:
+                checkpoint = _checkpoint(item["prompt"])
+                if checkpoint is not None and checkpoint != loaded:
+                    self.checkpoint_loads += 1
+                    self.swap_seconds += self.swap_delay
+                    await asyncio.sleep(self.swap_delay)
+                    loaded = checkpoint
+                execution = asyncio.ensure_future(self._execute(item))
+                self._executions[item["prompt_id"]] = execution
+                try:
+                    await execution
+                except asyncio.CancelledError:
+                    if item["prompt_id"] not in self._interrupts:
+                        raise
+                    # Interrupted; the worker itself carries on.
+                    await self._interrupted(item)
+            finally:
+                self._executions.pop(item["prompt_id"], None)
+                self._interrupts.discard(item["prompt_id"])
+                self.running.pop(item["prompt_id"], None)
+
+    async def _execute(self, item: Dict[str, Any]) -> None:
+        prompt_id = item["prompt_id"]
+        client_id = item["client_id"]
+        workflow = item["prompt"]
+        started = time.time()
+        await self._send(client_id, "execution_start", {"prompt_id": prompt_id})
+
+        duration = max(
+            0.0, self.execution_delay + self.random.uniform(-1, 1) * self.jitter
+        )
+        sampler = next(
+            (node_id for node_id, node in workflow.items() if "Sampler" in str(node)),
+            None,
+        )
+        await self._send(
+            client_id, "executing", {"node": sampler, "prompt_id": prompt_id}
+        )
+        for step in range(1, self.steps + 1):
+            await asyncio.sleep(duration / self.steps)
+            await self._send(
+                client_id,
+                "progress",
+                {
+                    "value": step,
+                    "max": self.steps,
+                    "node": sampler,
+                    "prompt_id": prompt_id,
+                },
+            )
+
+        if self.random.random() < self.failure_rate:
+            self.counters["failed"] += 1
+            self.history[prompt_id] = {
+                "prompt": [item["number"], prompt_id, workflow, {}, []],
+                "outputs": {},
+                "status": {"status_str": "error", "completed": False},
+            }
+            await self._send(
+                client_id,
+                "execution_error",
+                {
+                    "prompt_id": prompt_id,
+                    "node_id": sampler,
+                    "exception_message": "injected failure",
+                },
+            )
+            # ComfyUI signals the end of execution after an error as well.
+            await self._send(
+                client_id, "executing", {"node": None, "prompt_id": prompt_id}
+            )
+            return
+
+        batch_size = max(
+            (
+                int(node.get("inputs", {}).get("batch_size", 1))
+                for node in workflow.values()
+                if isinstance(node, dict)
+                and node.get("class_type") == "EmptyLatentImage"
+            ),
+            default=1,
+        )
+        outputs: Dict[str, Any] = {}
+        for node_id, node in workflow.items():
+            if isinstance(node, dict) and node.get("class_type") == "SaveImage":
+                images = []
+                for index in range(batch_size):
+                    filename = f"fake_{prompt_id}_{node_id}_{index}.png"
+                    self.images[filename] = solid_png(filename, self.image_size)
+                    images.append(
+                        {"filename": filename, "subfolder": "", "type": "output"}
+                    )
+                outputs[node_id] = {"images": images}
+        self.history[prompt_id] = {
+            "prompt": [item["number"], prompt_id, workflow, {}, list(outputs)],
+            "outputs": outputs,
+            "status": {
+                "status_str": "success",
+                "completed": True,
+                "messages": [["execution_success", {"timestamp": started}]],
+            },
+        }
+        self.counters["completed"] += 1
+        await self._send(client_id, "executing", {"node": None, "prompt_id": prompt_id})
+        await self._send(client_id, "execution_success", {"prompt_id": prompt_id})
+
+    async def _interrupted(self, item: Dict[str, Any]) -> None:
+        prompt_id = item["prompt_id"]
+        self.counters["interrupted"] += 1
+        self.history[prompt_id] = {
+            "prompt": [item["number"], prompt_id, item["prompt"], {}, []],
+            "outputs": {},
+            "status": {"status_str": "error", "completed": False},
+        }
+        await self._send(
+            item["client_id"],
+            "execution_interrupted",
+            {"prompt_id": prompt_id, "node_id": None, "executed": []},
+        )
+        await self._send(
+            item["client_id"], "executing", {"node": None, "prompt_id": prompt_id}
+        )
+
+    async def _send(
+        self, client_id: Optional[str], message_type: str, data: Dict[str, Any]
+    ) -> None:
+        # Like ComfyUI, execution events go to the client that queued the
+        # prompt only.
+        for ws in list(self.sockets.get(client_id or "", ())):
+            if ws.closed:
+                continue
+            try:
+                await ws.send_json({"type": message_type, "data": data})
+            except ConnectionError:
+                pass
+
+
+def _checkpoint(workflow: Dict[str, Any]) -> Optional[str]:
+    for node in workflow.values():
+        if (
+            isinstance(node, dict)
+            and node.get("class_type") == "CheckpointLoaderSimple"
+        ):
+            return str(node.get("inputs", {}).get("ckpt_name"))
+    return None
+
+
+def _queue_entry(item: Dict[str, Any]) -> List[Any]:
+    return [item["number"], item["prompt_id"], item["prompt"], {}, []]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a fake ComfyUI server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8188)
+    parser.add_argument("--delay", type=float, default=0.5, help="seconds per prompt")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--steps", type=int, default=4)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--reject-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--swap-delay", type=float, default=0.0, help="seconds per checkpoint load"
+    )
+    args = parser.parse_args()
+
+    fake = FakeComfyUI(
+        execution_delay=args.delay,
+        jitter=args.jitter,
+        steps=args.steps,
+        failure_rate=args.failure_rate,
+        reject_rate=args.reject_rate,
+        workers=args.workers,
+        swap_delay=args.swap_delay,
+    )
+    web.run_app(fake.create_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
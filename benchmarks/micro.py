@@ -0,0 +1,345 @@
+"""Microbenchmarks for the per-message CPU path.
+
+Covers intent parsing (``IntentProcessor.process``), template rendering
+(``WorkflowOrchestrator._create_workflow_from_template`` and a 100+ node
+``CompiledTemplate``) and the JSON encoding ``queue_prompt`` does on every
+submission. Each benchmark reports ops/sec and, from a separate tracemalloc
+pass, peak and retained bytes per operation::
+
+    python -m benchmarks.micro                      # print results as JSON
+    python -m benchmarks.micro --check              # fail on regressions
+    python -m benchmarks.micro --repeat 3 --update-baseline  # new baseline
+
+Throughput is also reported relative to a fixed pure-Python calibration
+loop, and ``--check`` compares that normalised figure, so a baseline
+recorded on one machine stays meaningful on a faster or slower one.
+"""
+
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Sequence, TypeVar
+
+from loguru import logger
+
+from src.intent_processing import IntentProcessor
+from src.workflow_engine import WorkflowOrchestrator
+from src.workflow_engine.compiled_template import CompiledTemplate
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+T = TypeVar("T")
+
+SUBJECTS = [
+    "a red sports car",
+    "a lighthouse on a cliff at dusk",
+    "my cat sleeping on a stack of books",
+    "a cyberpunk street market in the rain",
+    "a bowl of ramen",
+    "an old man reading a newspaper in a cafe",
+]
+TEMPLATES = [
+    "generate an image of {subject}",
+    "Can you draw {subject} in anime style please?",
+    "paint {subject}, artistic, oil painting, dramatic lighting",
+    "create a realistic picture of {subject} but keep it family friendly",
+    "make a photo of {subject}",
+    "change the background of the image to {subject}",
+    "adjust the colors, make it darker",
+    "hey, how are you doing today?",
+    "what can you do?",
+    "{subject}? no idea what to ask, just chatting about {subject}",
+]
+
+
+def message_corpus(size: int = 1000, seed: int = 0) -> List[str]:
+    """Realistic chat messages: generation, modification and small talk."""
+    rng = random.Random(seed)
+    return [
+        rng.choice(TEMPLATES).format(subject=rng.choice(SUBJECTS)) for _ in range(size)
+    ]
+
+
+def large_workflow(samplers: int = 25) -> Dict[str, Any]:
+    """A multi-stage graph: one loader plus ``samplers`` encode/sample/decode/
+    save chains (``4 * samplers + 1`` nodes)."""
+    graph: Dict[str, Any] = {
+        "1": {
+            "class_type": "CheckpointLoaderSimple",
+            "inputs": {"ckpt_name": "sd3.5_medium.safetensors"},
+        }
+    }
+    for index in range(samplers):
+        base = 10 * (index + 1)
+        positive, latent, sampler, decode = (str(base + k) for k in range(4))
+        graph[positive] = {
+            "class_type": "CLIPTextEncode",
+            "inputs": {"text": f"{{prompt}}, variation {index}", "clip": ["1", 1]},
+        }
+        graph[latent] = {
+            "class_type": "EmptyLatentImage",
+            "inputs": {"width": 1024, "height": 1024, "batch_size": 1},
+        }
+        graph[sampler] = {
+            "class_type": "KSampler",
+            "inputs": {
+                "seed": index,
+                "steps": 28,
+                "cfg": 4.5,
+                "sampler_name": "euler",
+                "scheduler": "normal",
+                "denoise": 1.0,
+                "model": ["1", 0],
+                "positive": [positive, 0],
+                "negative": [positive, 0],
+                "latent_image": [latent, 0],
+            },
+        }
+        graph[decode] = {
+            "class_type": "VAEDecode",
+            "inputs": {"samples": [sampler, 0], "vae": ["1", 2]},
+        }
+        graph[str(base + 4)] = {
+            "class_type": "SaveImage",
+            "inputs": {"images": [decode, 0], "filename_prefix": f"chain_{index}"},
+        }
+    return graph
+
+
+def run_sync(coroutine: Coroutine[Any, Any, T]) -> T:
+    """Drive a coroutine that never suspends without an event loop."""
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value  # type: ignore[no-any-return]
+    coroutine.close()
+    raise RuntimeError("coroutine suspended; use an event loop instead")
+
+
+def calibration() -> Callable[[], Any]:
+    """Fixed pure-Python work used to normalise ops/sec across machines."""
+    data = list(range(200))
+
+    def op() -> Any:
+        return sum(value * value for value in data if value % 3) + len(
+            {str(value) for value in data[:50]}
+        )
+
+    return op
+
+
+def benchmarks() -> Dict[str, Callable[[], Any]]:
+    processor = IntentProcessor()
+    orchestrator = WorkflowOrchestrator(None)
+    corpus = message_corpus()
+    large_template = CompiledTemplate("large", large_workflow())
+    parameters = {
+        "prompt": "a lighthouse on a cliff at dusk",
+        "negative_prompt": "blurry",
+        "seed": 42,
+        "steps": 30,
+        "width": 768,
+        "height": 1344,
+    }
+    basic = orchestrator._create_workflow_from_template("basic_generation", parameters)
+    large = large_template.render(parameters)
+    cursor = iter(range(sys.maxsize))
+
+    def intent_process() -> Any:
+        message = corpus[next(cursor) % len(corpus)]
+        return run_sync(processor.process(message))
+
+    def intent_process_batch_64() -> Any:
+        start = next(cursor) % (len(corpus) - 64)
+        return run_sync(processor.process_batch(corpus[start : start + 64]))
+
+    def render_basic() -> Any:
+        return orchestrator._create_workflow_from_template(
+            "basic_generation", parameters
+        )
+
+    def render_large() -> Any:
+        return large_template.render(parameters)
+
+    def encode(workflow: Dict[str, Any]) -> Callable[[], Any]:
+        client_id = f"my-chat-ai-comfyui-{uuid.uuid4().hex}"
+
+        def op() -> Any:
+            # What aiohttp's ``json=`` does for queue_prompt's payload.
+            return json.dumps(
+                {"prompt": workflow, "client_id": client_id, "prompt_id": "p"}
+            ).encode()
+
+        return op
+
+    return {
+        "intent_process": intent_process,
+        "intent_process_batch_64": intent_process_batch_64,
+        "render_basic_template": render_basic,
+        "render_large_template": render_large,
+        "encode_basic_prompt": encode(basic),
+        "encode_large_prompt": encode(large),
+    }
+
+
+def measure(
+    op: Callable[[], Any], min_time: float = 0.2, rounds: int = 5, memory: bool = True
+) -> Dict[str, float]:
+    """Best-of-``rounds`` ops/sec plus tracemalloc peak/retained bytes per op."""
+    op()
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            op()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / 10:
+            break
+        number *= 2
+    number = max(1, int(number * min_time / elapsed))
+
+    best = float("inf")
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for _ in range(number):
+                op()
+            best = min(best, (time.perf_counter() - started) / number)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    if not memory:
+        return {"ops_per_sec": 1 / best}
+
+    tracemalloc.start()
+    try:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        op()
+        _, peak = tracemalloc.get_traced_memory()
+        peak_bytes = max(0, peak - current)
+
+        # Results are dropped, so only leaks and growing caches are retained.
+        gc.collect()
+        before, _ = tracemalloc.get_traced_memory()
+        for _ in range(100):
+            op()
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "ops_per_sec": 1 / best,
+        "peak_bytes": float(peak_bytes),
+        "retained_bytes_per_op": max(0.0, (after - before) / 100),
+    }
+
+
+def run_suite(
+    names: Optional[Sequence[str]] = None, min_time: float = 0.2, rounds: int = 5
+) -> Dict[str, Any]:
+    suite = benchmarks()
+    selected = list(names) if names else list(suite)
+    reference = calibration()
+
+    results: Dict[str, Dict[str, float]] = {}
+    references = []
+    for name in selected:
+        # Calibrating next to each benchmark cancels out slow drift (thermal
+        # throttling, noisy neighbours) over the length of the run.
+        speed = measure(reference, min_time, rounds, memory=False)["ops_per_sec"]
+        result = measure(suite[name], min_time, rounds)
+        result["normalized"] = result["ops_per_sec"] / speed
+        results[name] = {key: round(value, 4) for key, value in result.items()}
+        references.append(speed)
+    return {
+        "python": sys.version.split()[0],
+        "calibration_ops_per_sec": round(max(references, default=0.0), 1),
+        "benchmarks": results,
+    }
+
+
+def best_of(first: Dict[str, Any], second: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge two suite runs, keeping each benchmark's faster result."""
+    merged = dict(first, benchmarks=dict(first["benchmarks"]))
+    for name, result in second["benchmarks"].items():
+        current = merged["benchmarks"].get(name)
+        if current is None or result["normalized"] > current["normalized"]:
+            merged["benchmarks"][name] = result
+    return merged
+
+
+def compare(
+    results: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float = 0.3,
+    memory_tolerance: float = 0.5,
+) -> List[str]:
+    """Regressions of ``results`` against ``baseline``, as readable lines."""
+    regressions = []
+    for name, base in baseline.get("benchmarks", {}).items():
+        current = results["benchmarks"].get(name)
+        if current is None:
+            continue
+        floor = base["normalized"] * (1 - tolerance)
+        if current["normalized"] < floor:
+            regressions.append(
+                f"{name}: normalized throughput {current['normalized']:.4g} "
+                f"< {floor:.4g} (baseline {base['normalized']:.4g})"
+            )
+        # Small absolute slack so tiny allocations don't flap.
+        ceiling = base["peak_bytes"] * (1 + memory_tolerance) + 1024
+        if current["peak_bytes"] > ceiling:
+            regressions.append(
+                f"{name}: peak {current['peak_bytes']:.0f} B "
+                f"> {ceiling:.0f} B (baseline {base['peak_bytes']:.0f} B)"
+            )
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="CPU hot path microbenchmarks")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all)")
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="runs of the suite; best one wins"
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--check", action="store_true", help="fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    results = run_suite(args.names, args.min_time, args.rounds)
+    for _ in range(args.repeat - 1):
+        results = best_of(results, run_suite(args.names, args.min_time, args.rounds))
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+        return 0
+    if args.check:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
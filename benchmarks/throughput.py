@@ -0,0 +1,236 @@
+"""End-to-end throughput benchmark against the fake ComfyUI server.
+
+Drives ``ChatManager.process_message`` through the real client, orchestrator
+and scheduler at a fixed concurrency and prints a JSON report with latency
+percentiles and jobs/sec, e.g.::
+
+    python -m benchmarks.throughput --requests 200 --concurrency 20 --delay 0.2
+
+Pass ``--comfyui host:port`` to benchmark an already running server instead
+of the in-process fake.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from loguru import logger
+
+from benchmarks.fake_comfyui import FakeComfyUI
+from src.chat_interface import ChatManager
+from src.comfyui_control import ComfyUIClient
+from src.intent_processing import IntentProcessor
+from src.monitoring import Metrics
+from src.workflow_engine import GenerationScheduler, WorkflowOrchestrator
+
+SUBJECTS = ["cat", "lighthouse", "forest", "robot", "city at night", "dragon"]
+STYLES = ["realistic", "anime", "artistic", "abstract"]
+
+
+def generation_messages(count: int, distinct: Optional[int] = None) -> List[str]:
+    """``count`` generation requests drawn from ``distinct`` unique prompts."""
+    distinct = count if distinct is None else max(1, distinct)
+    return [
+        f"draw a {SUBJECTS[i % len(SUBJECTS)]} in {STYLES[i % len(STYLES)]} style"
+        f" #{i % distinct}"
+        for i in range(count)
+    ]
+
+
+class ModelChoosingIntents:
+    """Simulates users picking among ``checkpoints`` models: a message's
+    ``#n`` tag selects ``model_<n % checkpoints>.safetensors``."""
+
+    def __init__(self, processor: IntentProcessor, checkpoints: int) -> None:
+        self.processor = processor
+        self.checkpoints = checkpoints
+
+    async def process(self, message: str) -> Dict[str, Any]:
+        result = await self.processor.process(message)
+        if result["intent"] == "image_generation":
+            tag = int(message.rsplit("#", 1)[1])
+            result["parameters"]["checkpoint"] = (
+                f"model_{tag % self.checkpoints}.safetensors"
+            )
+        return result
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of ``values`` (``q`` in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(q / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def stage_summary(metrics: Metrics) -> Dict[str, Dict[str, float]]:
+    stages: Dict[str, Dict[str, float]] = {}
+    for family in metrics.duration.collect():
+        for sample in family.samples:
+            stage = sample.labels.get("stage")
+            if stage is None:
+                continue
+            if sample.name.endswith("_count"):
+                stages.setdefault(stage, {})["count"] = sample.value
+            elif sample.name.endswith("_sum"):
+                stages.setdefault(stage, {})["total_seconds"] = sample.value
+    for summary in stages.values():
+        if summary.get("count"):
+            summary["mean_ms"] = 1000 * summary["total_seconds"] / summary["count"]
+    return stages
+
+
+async def run_benchmark(
+    requests: int = 100,
+    concurrency: int = 10,
+    max_concurrent_generations: int = 3,
+    distinct: Optional[int] = None,
+    comfyui: Optional[str] = None,
+    fake_options: Optional[Dict[str, Any]] = None,
+    checkpoints: int = 1,
+    affinity_window: int = 0,
+) -> Dict[str, Any]:
+    fake: Optional[FakeComfyUI] = None
+    if comfyui:
+        host, _, port_text = comfyui.rpartition(":")
+        port = int(port_text)
+    else:
+        fake = FakeComfyUI(**(fake_options or {}))
+        host, port = "127.0.0.1", await fake.start()
+
+    metrics = Metrics()
+    client = ComfyUIClient(host=host, port=port, metrics=metrics)
+    if not await client.connect():
+        raise RuntimeError(f"Could not connect to ComfyUI at {host}:{port}")
+
+    orchestrator = WorkflowOrchestrator(client, metrics=metrics)
+    scheduler = GenerationScheduler(
+        orchestrator,
+        max_concurrent=max_concurrent_generations,
+        max_queue_size=requests,
+        max_queued_per_user=requests,
+        affinity_window=affinity_window,
+        swap_cost=float((fake_options or {}).get("swap_delay", 0.0)),
+    )
+    intent_processor: Any = IntentProcessor(metrics=metrics)
+    if checkpoints > 1:
+        intent_processor = ModelChoosingIntents(intent_processor, checkpoints)
+    chat_manager = ChatManager(intent_processor, orchestrator, scheduler)
+
+    gate = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    failures: Dict[str, int] = {}
+
+    async def one(index: int, message: str) -> None:
+        async with gate:
+            started = time.perf_counter()
+            response = await chat_manager.process_message(f"user-{index}", message)
+            elapsed = time.perf_counter() - started
+        if response.get("success") and "error" not in (response.get("data") or {}):
+            latencies.append(elapsed)
+        else:
+            reason = str(
+                response.get("error") or (response.get("data") or {}).get("error")
+            )
+            failures[reason] = failures.get(reason, 0) + 1
+
+    messages = generation_messages(requests, distinct)
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(i, message) for i, message in enumerate(messages)))
+        duration = time.perf_counter() - started
+    finally:
+        await client.disconnect()
+        if fake is not None:
+            await fake.stop()
+
+    report: Dict[str, Any] = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "max_concurrent_generations": max_concurrent_generations,
+        "checkpoints": checkpoints,
+        "checkpoint_swaps": orchestrator.checkpoint_swaps,
+        "succeeded": len(latencies),
+        "failed": sum(failures.values()),
+        "failures": failures,
+        "duration_s": round(duration, 3),
+        "jobs_per_sec": round(len(latencies) / duration, 3) if duration else 0.0,
+        "latency_ms": {
+            name: round(1000 * value, 2)
+            for name, value in (
+                ("p50", percentile(latencies, 50)),
+                ("p95", percentile(latencies, 95)),
+                ("p99", percentile(latencies, 99)),
+                ("mean", sum(latencies) / len(latencies) if latencies else 0.0),
+                ("max", max(latencies, default=0.0)),
+            )
+        },
+        "stages": stage_summary(metrics),
+        "scheduler": scheduler.stats(),
+    }
+    if fake is not None:
+        report["backend"] = fake.stats()
+    return report
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="End-to-end throughput benchmark")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--max-concurrent-generations", type=int, default=3)
+    parser.add_argument(
+        "--distinct", type=int, help="number of distinct prompts (default: all)"
+    )
+    parser.add_argument("--comfyui", help="host:port of a running server")
+    parser.add_argument("--delay", type=float, default=0.2, help="fake seconds/prompt")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--reject-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=1, help="fake GPUs")
+    parser.add_argument(
+        "--checkpoints", type=int, default=1, help="models users choose between"
+    )
+    parser.add_argument("--swap-delay", type=float, default=0.0)
+    parser.add_argument(
+        "--affinity-window", type=int, default=0, help="0 disables reordering"
+    )
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    report = asyncio.run(
+        run_benchmark(
+            requests=args.requests,
+            concurrency=args.concurrency,
+            max_concurrent_generations=args.max_concurrent_generations,
+            distinct=args.distinct,
+            comfyui=args.comfyui,
+            checkpoints=args.checkpoints,
+            affinity_window=args.affinity_window,
+            fake_options={
+                "execution_delay": args.delay,
+                "jitter": args.jitter,
+                "failure_rate": args.failure_rate,
+                "reject_rate": args.reject_rate,
+                "workers": args.workers,
+                "swap_delay": args.swap_delay,
+                "seed": 0,
+            },
+        )
+    )
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+from .job_registry import Job, JobRegistry
+from .server import APIServer, run_workers
+
+__all__ = ["APIServer", "Job", "JobRegistry", "run_workers"]
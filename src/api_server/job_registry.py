@@ -0,0 +1,283 @@
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class Job:
+    __slots__ = (
+        "job_id",
+        "user_id",
+        "intent",
+        "parameters",
+        "status",
+        "position",
+        "progress",
+        "prompt_id",
+        "result",
+        "created_at",
+        "updated_at",
+        "subscribers",
+    )
+
+    def __init__(
+        self, job_id: str, user_id: str, intent: str, parameters: Dict[str, Any]
+    ) -> None:
+        self.job_id = job_id
+        self.user_id = user_id
+        self.intent = intent
+        self.parameters = parameters
+        self.status = QUEUED
+        self.position: Optional[int] = None
+        self.progress = 0
+        self.prompt_id: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.subscribers: List["asyncio.Queue[Dict[str, Any]]"] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (COMPLETED, FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        status: Dict[str, Any] = {
+            "job_id": self.job_id,
+            "prompt_id": self.prompt_id,
+            "status": self.status,
+            "progress": self.progress,
+        }
+        if self.position is not None and not self.finished:
+            status["position"] = self.position
+        if self.result is not None:
+            data = self.result.get("data") or {}
+            if self.status == COMPLETED:
+                status["outputs"] = data.get("outputs", {})
+                if "artifacts" in data:
+                    status["artifacts"] = [
+                        {**artifact, "url": f"/outputs/{Path(artifact['path']).name}"}
+                        for artifact in data["artifacts"]
+                    ]
+                if "renditions" in data:
+                    status["renditions"] = [
+                        {
+                            **rendition,
+                            "url": f"/renditions/{Path(rendition['path']).name}",
+                        }
+                        for rendition in data["renditions"]
+                    ]
+            else:
+                status["error"] = self.result.get("error") or data.get("error")
+        return status
+
+
+class JobRegistry:
+    """Tracks generation jobs started through the API.
+
+    Jobs are looked up by job id or, once ComfyUI accepted the prompt, by
+    prompt id. Finished jobs are kept (bounded, oldest first out) so clients
+    can still poll their result. Events from ``ChatManager.stream_message``
+    are applied with ``apply`` and fanned out to WebSocket subscribers.
+
+    With ``db_path``, each job's status is also written to SQLite (progress
+    at most every ``sync_interval`` seconds), so API workers sharing the
+    database can answer status polls for jobs another worker runs.
+    """
+
+    def __init__(
+        self,
+        max_jobs: int = 10000,
+        db_path: Optional[str] = None,
+        sync_interval: float = 1.0,
+        retention: float = 24 * 3600,
+    ) -> None:
+        self.max_jobs = max_jobs
+        self.sync_interval = sync_interval
+        self.retention = retention
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._by_prompt: Dict[str, str] = {}
+        self._synced: Dict[str, float] = {}
+        self._writes_since_prune = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = self._open_db(db_path)
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def create(self, user_id: str, intent: str, parameters: Dict[str, Any]) -> Job:
+        job = Job(uuid.uuid4().hex, user_id, intent, parameters)
+        self._jobs[job.job_id] = job
+        self._sync(job, force=True)
+        self._prune()
+        return job
+
+    def recover(self, entry: Dict[str, Any], response: Dict[str, Any]) -> Job:
+        """Register a generation resumed from the job journal after a
+        restart, so polling its job or prompt id finds the result."""
+        job = Job(
+            entry["job_id"],
+            entry.get("user_id") or "anonymous",
+            "image_generation",
+            entry.get("parameters") or {},
+        )
+        job.prompt_id = entry.get("prompt_id")
+        self._jobs[job.job_id] = job
+        if job.prompt_id:
+            self._by_prompt[job.prompt_id] = job.job_id
+        self.apply(job, {"type": "completed", **response})
+        self._prune()
+        return job
+
+    def get(self, job_or_prompt_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_or_prompt_id)
+        if job is None:
+            job_id = self._by_prompt.get(job_or_prompt_id)
+            job = self._jobs.get(job_id) if job_id else None
+        return job
+
+    def lookup(self, job_or_prompt_id: str) -> Optional[Dict[str, Any]]:
+        """Status of a job this process or another API worker knows about."""
+        job = self.get(job_or_prompt_id)
+        if job is not None:
+            return job.to_dict()
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT status FROM api_jobs WHERE job_id = ? OR prompt_id = ? "
+                "ORDER BY updated_at DESC LIMIT 1",
+                (job_or_prompt_id, job_or_prompt_id),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading shared job status: {e}")
+            return None
+        status: Optional[Dict[str, Any]] = json.loads(row[0]) if row else None
+        return status
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def apply(self, job: Job, event: Dict[str, Any]) -> None:
+        previous = (job.status, job.prompt_id)
+        event_type = event.get("type")
+        if event_type == "queued":
+            job.position = event.get("position")
+        elif event_type == "submitted":
+            job.prompt_id = event.get("prompt_id")
+            job.position = event.get("position")
+            if job.prompt_id:
+                self._by_prompt[job.prompt_id] = job.job_id
+        elif event_type in ("executing", "progress"):
+            job.status = RUNNING
+            job.position = None
+            if event_type == "progress" and event.get("max"):
+                job.progress = min(99, int(100 * event["value"] / event["max"]))
+        elif event_type == "completed":
+            job.result = {key: value for key, value in event.items() if key != "type"}
+            job.status = COMPLETED if self._succeeded(job.result) else FAILED
+            if job.status == COMPLETED:
+                job.progress = 100
+                prompt_id = (job.result.get("data") or {}).get("prompt_id")
+                if prompt_id and not job.prompt_id:
+                    job.prompt_id = str(prompt_id)
+                    self._by_prompt[job.prompt_id] = job.job_id
+        job.updated_at = time.time()
+        self._sync(job, force=(job.status, job.prompt_id) != previous)
+
+        for subscriber in job.subscribers:
+            subscriber.put_nowait(event)
+
+    def subscribe(self, job: Job) -> "asyncio.Queue[Dict[str, Any]]":
+        subscriber: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        job.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(
+        self, job: Job, subscriber: "asyncio.Queue[Dict[str, Any]]"
+    ) -> None:
+        if subscriber in job.subscribers:
+            job.subscribers.remove(subscriber)
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {QUEUED: 0, RUNNING: 0, COMPLETED: 0, FAILED: 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return {"jobs": len(self._jobs), **counts}
+
+    def _sync(self, job: Job, force: bool = False) -> None:
+        if self._db is None:
+            return
+        now = time.time()
+        if not force and now - self._synced.get(job.job_id, 0.0) < self.sync_interval:
+            return
+        if job.finished:
+            self._synced.pop(job.job_id, None)
+        else:
+            self._synced[job.job_id] = now
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO api_jobs "
+                "(job_id, prompt_id, status, updated_at) VALUES (?, ?, ?, ?)",
+                (
+                    job.job_id,
+                    job.prompt_id,
+                    json.dumps(job.to_dict(), default=str),
+                    now,
+                ),
+            )
+            self._writes_since_prune += 1
+            if self._writes_since_prune >= 100:
+                self._writes_since_prune = 0
+                self._db.execute(
+                    "DELETE FROM api_jobs WHERE updated_at < ?",
+                    (now - self.retention,),
+                )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error writing shared job status: {e}")
+
+    def _open_db(self, db_path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(db_path)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS api_jobs ("
+            "job_id TEXT PRIMARY KEY, prompt_id TEXT, status TEXT NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS api_jobs_prompt ON api_jobs (prompt_id)")
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS api_jobs_updated ON api_jobs (updated_at)"
+        )
+        db.commit()
+        return db
+
+    def _succeeded(self, result: Dict[str, Any]) -> bool:
+        data = result.get("data") or {}
+        return bool(result.get("success")) and "error" not in data
+
+    def _prune(self) -> None:
+        while len(self._jobs) > self.max_jobs:
+            # Evict the oldest finished job; running ones are never dropped.
+            for job_id, job in self._jobs.items():
+                if job.finished:
+                    break
+            else:
+                return
+            del self._jobs[job_id]
+            if job.prompt_id:
+                self._by_prompt.pop(job.prompt_id, None)
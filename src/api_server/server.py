@@ -0,0 +1,363 @@
+import asyncio
+import hmac
+import json
+import multiprocessing
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+from aiohttp import WSMsgType, web
+from loguru import logger
+
+from .job_registry import COMPLETED, Job, JobRegistry
+
+API_PREFIX = "/api/v1"
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+def error_response(
+    status: int, code: str, message: str, details: Optional[Dict[str, Any]] = None
+) -> web.Response:
+    error: Dict[str, Any] = {"code": code, "message": message}
+    if details:
+        error["details"] = details
+    return web.json_response({"success": False, "error": error}, status=status)
+
+
+class APIServer:
+    """aiohttp front end for ``ChatManager``, serving the API.md surface.
+
+    Generation requests return a job id as soon as the intent is parsed;
+    the generation itself runs as a background task that feeds
+    ``ChatManager.stream_message`` events into the ``JobRegistry``, where
+    status polls and WebSocket subscribers pick them up.
+    """
+
+    def __init__(
+        self,
+        chat_manager: Any,
+        comfyui_client: Any,
+        scheduler: Optional[Any] = None,
+        registry: Optional[JobRegistry] = None,
+        api_key: Optional[str] = None,
+        artifact_store: Optional[Any] = None,
+        post_processor: Optional[Any] = None,
+        metrics: Optional[Any] = None,
+    ) -> None:
+        self.chat_manager = chat_manager
+        self.comfyui_client = comfyui_client
+        self.scheduler = scheduler
+        self.registry = registry if registry is not None else JobRegistry()
+        self.api_key = api_key
+        self.artifact_store = artifact_store
+        self.post_processor = post_processor
+        self.metrics = metrics
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+    def create_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._auth_middleware])
+        app.router.add_post(f"{API_PREFIX}/chat/process", self.handle_chat)
+        app.router.add_get(
+            f"{API_PREFIX}/generation/status/{{job_id}}", self.handle_status
+        )
+        app.router.add_get(f"{API_PREFIX}/generation/queue", self.handle_queue)
+        app.router.add_get("/ws", self.handle_websocket)
+        app.router.add_get("/health", self.handle_health)
+        if self.metrics is not None:
+            app.router.add_get("/metrics", self.handle_metrics)
+        if self.artifact_store is not None:
+            app.router.add_get("/outputs/{name}", self.handle_output)
+        if self.post_processor is not None:
+            app.router.add_get("/renditions/{name}", self.handle_rendition)
+        app.on_shutdown.append(self._on_shutdown)
+        return app
+
+    async def start_job(
+        self, user_id: str, message: str, platform: str
+    ) -> Dict[str, Any]:
+        """Parse the message and, for generations, start a background job.
+
+        Returns the chat response for anything that isn't a generation, or
+        ``{"job": Job}`` once a generation has been started.
+        """
+        stream = self.chat_manager.stream_message(user_id, message, platform)
+        first = await stream.__anext__()
+        if first["type"] == "completed":
+            return _without_type(first)
+        if first["intent"] != "image_generation":
+            return _without_type(await stream.__anext__())
+
+        job = self.registry.create(user_id, first["intent"], first["parameters"])
+        task = asyncio.ensure_future(self._drive(job, stream))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return {"job": job}
+
+    async def handle_chat(self, request: web.Request) -> web.Response:
+        try:
+            body = await request.json()
+        except (ValueError, UnicodeDecodeError):
+            return error_response(400, "INVALID_REQUEST", "Body must be JSON")
+        message = body.get("message") if isinstance(body, dict) else None
+        if not isinstance(message, str) or not message.strip():
+            return error_response(400, "INVALID_PROMPT", "A message is required")
+
+        started = await self.start_job(
+            str(body.get("user_id", "anonymous")),
+            message,
+            str(body.get("platform", "api")),
+        )
+        job = started.get("job")
+        if job is None:
+            if started.get("error") == "prompt_rejected":
+                return error_response(
+                    422,
+                    "NSFW_CONTENT_DETECTED",
+                    str(started.get("response", "Prompt rejected")),
+                    started.get("data"),
+                )
+            return web.json_response(started)
+
+        return web.json_response(
+            {
+                "success": True,
+                "response": "Image generation started",
+                "data": {
+                    "job_id": job.job_id,
+                    "intent": job.intent,
+                    "parameters": job.parameters,
+                    "status_url": f"{API_PREFIX}/generation/status/{job.job_id}",
+                },
+            },
+            status=202,
+        )
+
+    async def handle_status(self, request: web.Request) -> web.Response:
+        job_id = request.match_info["job_id"]
+        # The registry also knows jobs other API workers run, when it shares
+        # a database with them.
+        status = self.registry.lookup(job_id)
+        if status is not None:
+            return web.json_response(status)
+
+        # A prompt id from before a restart: ask ComfyUI directly.
+        history = await self.comfyui_client.get_history(job_id)
+        if isinstance(history, dict) and job_id in history:
+            return web.json_response(
+                {
+                    "prompt_id": job_id,
+                    "status": COMPLETED,
+                    "progress": 100,
+                    "outputs": history[job_id].get("outputs", {}),
+                }
+            )
+        return error_response(404, "NOT_FOUND", f"Unknown generation {job_id}")
+
+    async def handle_queue(self, request: web.Request) -> web.Response:
+        status = await self.comfyui_client.get_queue_status()
+        if "error" in status:
+            return error_response(502, "GENERATION_FAILED", str(status["error"]))
+
+        running = status.get("queue_running", [])
+        pending = sorted(status.get("queue_pending", []), key=lambda item: item[0])
+        queue: Dict[str, Any] = {
+            "queue_running": [
+                {"prompt_id": item[1], "position": 0} for item in running
+            ],
+            "queue_pending": [
+                {"prompt_id": item[1], "position": len(running) + index}
+                for index, item in enumerate(pending)
+            ],
+            "jobs": self.registry.stats(),
+        }
+        if self.scheduler is not None:
+            queue["scheduler"] = self.scheduler.stats()
+        return web.json_response(queue)
+
+    async def handle_output(self, request: web.Request) -> web.StreamResponse:
+        # FileResponse uses sendfile, so images never pass through Python.
+        digest = request.match_info["name"].split(".", 1)[0]
+        artifact = (
+            self.artifact_store.get(digest) if self.artifact_store is not None else None
+        )
+        if artifact is None:
+            return error_response(404, "NOT_FOUND", "Unknown output")
+        return web.FileResponse(
+            artifact.path, headers={"Cache-Control": "public, max-age=31536000"}
+        )
+
+    async def handle_rendition(self, request: web.Request) -> web.StreamResponse:
+        path = (
+            self.post_processor.path_for(request.match_info["name"])
+            if self.post_processor is not None
+            else None
+        )
+        if path is None:
+            return error_response(404, "NOT_FOUND", "Unknown rendition")
+        return web.FileResponse(
+            path, headers={"Cache-Control": "public, max-age=31536000"}
+        )
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "jobs": len(self.registry)})
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        if self.metrics is None:
+            return error_response(404, "NOT_FOUND", "Metrics are disabled")
+        response = web.Response(body=self.metrics.render())
+        response.headers["Content-Type"] = self.metrics.content_type
+        return response
+
+    async def handle_websocket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        forwarders: Set["asyncio.Task[None]"] = set()
+
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    message = json.loads(msg.data)
+                except ValueError:
+                    await _send(ws, "error", {"message": "Invalid JSON"})
+                    continue
+                data = message.get("data") or {}
+
+                job: Optional[Job] = None
+                if message.get("type") == "chat_message":
+                    started = await self.start_job(
+                        str(data.get("user_id", "anonymous")),
+                        str(data.get("message", "")),
+                        "websocket",
+                    )
+                    job = started.pop("job", None)
+                    if job is None:
+                        await _send(ws, "chat_response", started)
+                        continue
+                    await _send(
+                        ws,
+                        "chat_response",
+                        {"response": "Image generation started", "job_id": job.job_id},
+                    )
+                elif message.get("type") == "subscribe_generation":
+                    job = self.registry.get(
+                        str(data.get("job_id") or data.get("prompt_id"))
+                    )
+                    if job is None:
+                        await _send(ws, "error", {"message": "Unknown generation"})
+                        continue
+                else:
+                    await _send(ws, "error", {"message": "Unknown message type"})
+                    continue
+
+                forwarder = asyncio.ensure_future(self._forward(ws, job))
+                forwarders.add(forwarder)
+                forwarder.add_done_callback(forwarders.discard)
+        finally:
+            for forwarder in list(forwarders):
+                forwarder.cancel()
+        return ws
+
+    async def _drive(self, job: Job, stream: AsyncIterator[Dict[str, Any]]) -> None:
+        try:
+            async for event in stream:
+                self.registry.apply(job, event)
+        except Exception as e:
+            logger.error(f"Generation job {job.job_id} failed: {e}")
+            self.registry.apply(
+                job, {"type": "completed", "success": False, "error": str(e)}
+            )
+
+    async def _forward(self, ws: web.WebSocketResponse, job: Job) -> None:
+        subscriber = self.registry.subscribe(job)
+        try:
+            if job.finished:
+                await _send_job_event(ws, job, {"type": "completed"})
+                return
+            while True:
+                event = await subscriber.get()
+                await _send_job_event(ws, job, event)
+                if event.get("type") == "completed":
+                    return
+        finally:
+            self.registry.unsubscribe(job, subscriber)
+
+    @web.middleware
+    async def _auth_middleware(
+        self, request: web.Request, handler: Handler
+    ) -> web.StreamResponse:
+        # Everything but /health needs the key: /ws starts generations and
+        # the file routes serve users' images. Browsers can't set headers on
+        # a WebSocket handshake or an <img> request, so ``?token=`` works too.
+        if self.api_key and request.path != "/health":
+            if not self._authorized(request):
+                return error_response(401, "UNAUTHORIZED", "Invalid or missing API key")
+        return await handler(request)
+
+    def _authorized(self, request: web.Request) -> bool:
+        assert self.api_key is not None
+        header = request.headers.get("Authorization", "")
+        token = request.query.get("token", "")
+        return hmac.compare_digest(
+            header, f"Bearer {self.api_key}"
+        ) or hmac.compare_digest(token, self.api_key)
+
+    async def _on_shutdown(self, app: web.Application) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.registry.close()
+
+
+def _without_type(event: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in event.items() if key != "type"}
+
+
+async def _send(ws: web.WebSocketResponse, message_type: str, data: Any) -> None:
+    if not ws.closed:
+        await ws.send_json({"type": message_type, "data": data})
+
+
+async def _send_job_event(
+    ws: web.WebSocketResponse, job: Job, event: Dict[str, Any]
+) -> None:
+    if event.get("type") == "completed":
+        await _send(ws, "generation_complete", job.to_dict())
+    elif event.get("type") in ("progress", "executing"):
+        await _send(
+            ws,
+            "generation_progress",
+            {
+                "job_id": job.job_id,
+                "prompt_id": job.prompt_id,
+                "progress": job.progress,
+                "current_step": event.get("node"),
+            },
+        )
+    else:
+        await _send(ws, "generation_status", job.to_dict())
+
+
+def run_workers(target: Callable[[], None], workers: int) -> None:
+    """Run ``target`` in ``workers`` processes sharing one port.
+
+    Each worker binds with ``reuse_port`` so the kernel spreads connections
+    across them (needs SO_REUSEPORT, i.e. Linux or macOS). Jobs live in the
+    worker that accepted them; status polls for another worker's job fall
+    back to ComfyUI's history by prompt id.
+    """
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=target, name=f"api-worker-{index}")
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
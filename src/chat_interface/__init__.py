@@ -1,3 +1,4 @@
 from .chat_manager import ChatManager
+from .session_store import Session, SessionStore
 
-__all__ = ["ChatManager"]
+__all__ = ["ChatManager", "Session", "SessionStore"]
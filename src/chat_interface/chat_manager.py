@@ -1,48 +1,345 @@
-from typing import Any, Dict
+import asyncio
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
 
 from loguru import logger
 
+from .session_store import SessionStore
+
+BUSY_RESPONSE = "The image generator is busy right now. Please try again in a moment."
+CANCELLED_RESPONSE = "Your image generation was cancelled."
+REJECTED_RESPONSE = "Sorry, I can't generate images for that request."
+
+RecoveryListener = Callable[[Dict[str, Any], Dict[str, Any]], None]
+
 
 class ChatManager:
-    def __init__(self, intent_processor: Any, workflow_orchestrator: Any) -> None:
+    def __init__(
+        self,
+        intent_processor: Any,
+        workflow_orchestrator: Any,
+        scheduler: Optional[Any] = None,
+        session_store: Optional[SessionStore] = None,
+        journal: Optional[Any] = None,
+        prompt_screener: Optional[Any] = None,
+    ) -> None:
         self.intent_processor = intent_processor
         self.workflow_orchestrator = workflow_orchestrator
-        self.active_sessions: Dict[str, Any] = {}
+        self.scheduler = scheduler
+        self.active_sessions = (
+            session_store if session_store is not None else SessionStore()
+        )
+        self.journal = journal
+        self.prompt_screener = prompt_screener
+        self.recovery_listeners: List[RecoveryListener] = []
+        self._recovery_tasks: Set["asyncio.Task[Dict[str, Any]]"] = set()
+        self._generations: Dict[str, Set["asyncio.Task[Dict[str, Any]]"]] = {}
+        self._cancelled: Set["asyncio.Task[Dict[str, Any]]"] = set()
 
     async def start(self) -> None:
         logger.info("Starting chat manager...")
+        if self.journal is not None:
+            self.resume_jobs()
+
+    def resume_jobs(self) -> List["asyncio.Task[Dict[str, Any]]"]:
+        """Reattach to generations a previous run left unfinished.
+
+        Each result is remembered in the user's session and handed to the
+        ``recovery_listeners`` as ``(job, response)`` once it arrives.
+        """
+        assert self.journal is not None
+        jobs = self.journal.unfinished()
+        if jobs:
+            logger.info(f"Resuming {len(jobs)} generations from the job journal")
+        tasks = []
+        for job in jobs:
+            task = asyncio.ensure_future(self._resume(job))
+            self._recovery_tasks.add(task)
+            task.add_done_callback(self._recovery_tasks.discard)
+            tasks.append(task)
+        return tasks
+
+    def cancel_generations(self, user_id: str) -> int:
+        """Cancel every generation ``user_id`` is waiting on; returns how many.
+
+        Queued jobs leave the scheduler, and prompts nobody else waits on are
+        deleted from ComfyUI's queue or interrupted.
+        """
+        tasks = [task for task in self._generations.get(user_id, ()) if not task.done()]
+        for task in tasks:
+            self._cancelled.add(task)
+            task.cancel()
+        if tasks:
+            logger.info(f"Cancelling {len(tasks)} generations for {user_id}")
+        return len(tasks)
 
     async def process_message(
-        self, user_id: str, message: str, platform: str = "default"
+        self,
+        user_id: str,
+        message: str,
+        platform: str = "default",
+        priority: Optional[int] = None,
     ) -> Dict[str, Any]:
         try:
             logger.info(f"Processing message from {user_id} on {platform}: {message}")
 
             intent_result = await self.intent_processor.process(message)
+            intent_result, rejection = self._screen(user_id, message, intent_result)
+            if rejection is not None:
+                return rejection
 
             if intent_result["intent"] == "image_generation":
-                workflow_result = await self.workflow_orchestrator.execute_generation(
-                    intent_result["parameters"]
+                workflow_result = await self._run_generation(
+                    user_id, intent_result["parameters"], priority, platform=platform
                 )
-                return {
-                    "success": True,
-                    "response": "Image generated successfully!",
-                    "data": workflow_result,
-                }
+                self._remember_turn(user_id, message, intent_result, workflow_result)
+                return self._generation_response(workflow_result)
 
-            return {
-                "success": True,
-                "response": (
-                    "I understand your request, but I'm still learning how to "
-                    "handle it."
-                ),
-                "data": intent_result,
-            }
+            self._remember_turn(user_id, message, intent_result)
+            if intent_result["intent"] == "cancel":
+                return self._cancel_response(self.cancel_generations(user_id))
+            return self._intent_response(intent_result)
 
         except Exception as e:
             logger.error(f"Error processing message: {e}")
+            return self._error_response(e)
+
+    async def stream_message(
+        self,
+        user_id: str,
+        message: str,
+        platform: str = "default",
+        priority: Optional[int] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Like ``process_message``, but yields events as the request advances.
+
+        Yields ``intent`` once the message is parsed (unless the prompt is
+        rejected), then ``queued``,
+        ``submitted`` and ``progress`` events while an image is generated,
+        and always ends with a ``completed`` event carrying the same dict
+        ``process_message`` would have returned.
+        """
+        logger.info(f"Streaming message from {user_id} on {platform}: {message}")
+        try:
+            intent_result = await self.intent_processor.process(message)
+            intent_result, rejection = self._screen(user_id, message, intent_result)
+        except Exception as e:
+            logger.error(f"Error processing message: {e}")
+            yield {"type": "completed", **self._error_response(e)}
+            return
+        if rejection is not None:
+            yield {"type": "completed", **rejection}
+            return
+
+        yield {
+            "type": "intent",
+            "intent": intent_result["intent"],
+            "parameters": intent_result.get("parameters", {}),
+        }
+        if intent_result["intent"] != "image_generation":
+            self._remember_turn(user_id, message, intent_result)
+            if intent_result["intent"] == "cancel":
+                response = self._cancel_response(self.cancel_generations(user_id))
+            else:
+                response = self._intent_response(intent_result)
+            yield {"type": "completed", **response}
+            return
+
+        events: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        generation = asyncio.ensure_future(
+            self._run_generation(
+                user_id,
+                intent_result["parameters"],
+                priority,
+                on_event=events.put_nowait,
+                platform=platform,
+            )
+        )
+        try:
+            while not generation.done():
+                next_event = asyncio.ensure_future(events.get())
+                await asyncio.wait(
+                    {next_event, generation}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if next_event.done():
+                    yield next_event.result()
+                else:
+                    next_event.cancel()
+            while not events.empty():
+                yield events.get_nowait()
+
+            try:
+                workflow_result = generation.result()
+                self._remember_turn(user_id, message, intent_result, workflow_result)
+                response = self._generation_response(workflow_result)
+            except Exception as e:
+                logger.error(f"Error processing message: {e}")
+                response = self._error_response(e)
+            yield {"type": "completed", **response}
+        finally:
+            if not generation.done():
+                generation.cancel()
+
+    def _screen(
+        self, user_id: str, message: str, intent_result: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """Screen an image request before anything is queued for the GPU.
+
+        Returns the intent result, with the NSFW filter forced on when the
+        screener asks for it, and the response to send instead of
+        generating when the prompt is blocked.
+        """
+        if (
+            self.prompt_screener is None
+            or intent_result["intent"] != "image_generation"
+        ):
+            return intent_result, None
+        verdict = self.prompt_screener.screen(message)
+        if verdict.blocked:
+            logger.warning(f"Rejected prompt from {user_id}: {verdict.to_dict()}")
+            self._remember_turn(user_id, message, intent_result)
+            return intent_result, {
+                "success": False,
+                "response": REJECTED_RESPONSE,
+                "error": "prompt_rejected",
+                "data": {"screening": verdict.to_dict()},
+            }
+        if verdict.action == "filter":
+            parameters = {**intent_result["parameters"], "nsfw_filter": "True"}
+            return {**intent_result, "parameters": parameters}, None
+        return intent_result, None
+
+    def _remember_turn(
+        self,
+        user_id: str,
+        message: str,
+        intent_result: Dict[str, Any],
+        workflow_result: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        parameters = intent_result.get("parameters", {})
+        slots = {
+            name: parameters[name]
+            for name in ("style", "nsfw_filter")
+            if name in parameters
+        }
+        output = None
+        if workflow_result and workflow_result.get("success"):
+            output = workflow_result.get("prompt_id")
+        self.active_sessions.record_turn(
+            user_id, message, intent_result["intent"], slots=slots, output=output
+        )
+
+    async def _resume(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        workflow_result = await self.workflow_orchestrator.reattach(job)
+        parameters = job["parameters"]
+        if job.get("user_id"):
+            self._remember_turn(
+                job["user_id"],
+                str(parameters.get("prompt", "")),
+                {"intent": "image_generation", "parameters": parameters},
+                workflow_result,
+            )
+        response = self._generation_response(workflow_result)
+        for listener in self.recovery_listeners:
+            try:
+                listener(job, response)
+            except Exception as e:
+                logger.error(f"Error delivering resumed generation: {e}")
+        return response
+
+    def _generation_response(self, workflow_result: Dict[str, Any]) -> Dict[str, Any]:
+        if workflow_result.get("busy"):
+            return {"success": False, "response": BUSY_RESPONSE, "error": "busy"}
+        if workflow_result.get("cancelled"):
             return {
                 "success": False,
-                "response": "Sorry, I encountered an error processing your request.",
-                "error": str(e),
+                "response": CANCELLED_RESPONSE,
+                "error": "cancelled",
             }
+        return {
+            "success": True,
+            "response": "Image generated successfully!",
+            "data": workflow_result,
+        }
+
+    def _cancel_response(self, cancelled: int) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "response": (
+                f"Cancelled {cancelled} image generation{'s' if cancelled > 1 else ''}."
+                if cancelled
+                else "There is no image generation to cancel."
+            ),
+            "data": {"cancelled": cancelled},
+        }
+
+    def _intent_response(self, intent_result: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "response": (
+                "I understand your request, but I'm still learning how to handle it."
+            ),
+            "data": intent_result,
+        }
+
+    def _error_response(self, error: Exception) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "response": "Sorry, I encountered an error processing your request.",
+            "error": str(error),
+        }
+
+    async def _run_generation(
+        self,
+        user_id: str,
+        parameters: Dict[str, Any],
+        priority: Optional[int],
+        on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+        platform: str = "default",
+    ) -> Dict[str, Any]:
+        # The generation runs in its own task so a "cancel" message can stop
+        # it without cancelling the caller.
+        task = asyncio.ensure_future(
+            self._dispatch_generation(user_id, parameters, priority, on_event, platform)
+        )
+        tasks = self._generations.setdefault(user_id, set())
+        tasks.add(task)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if task not in self._cancelled:
+                raise
+            return {"error": "Generation cancelled", "cancelled": True}
+        finally:
+            self._cancelled.discard(task)
+            tasks.discard(task)
+            if not tasks and self._generations.get(user_id) is tasks:
+                del self._generations[user_id]
+
+    async def _dispatch_generation(
+        self,
+        user_id: str,
+        parameters: Dict[str, Any],
+        priority: Optional[int],
+        on_event: Optional[Callable[[Dict[str, Any]], None]],
+        platform: str,
+    ) -> Dict[str, Any]:
+        options: Dict[str, Any] = {}
+        if on_event is not None:
+            options["on_event"] = on_event
+        if self.journal is not None:
+            options["origin"] = {"user_id": user_id, "platform": platform}
+
+        if self.scheduler is None:
+            result = await self.workflow_orchestrator.execute_generation(
+                parameters, **options
+            )
+        elif priority is None:
+            result = await self.scheduler.submit(user_id, parameters, **options)
+        else:
+            result = await self.scheduler.submit(
+                user_id, parameters, priority=priority, **options
+            )
+
+        if result.get("busy"):
+            logger.warning(f"Generation queue full, turning away {user_id}")
+        return dict(result)
@@ -0,0 +1,271 @@
+import json
+import sqlite3
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+SESSION_OVERHEAD_BYTES = 256
+
+
+class Session:
+    """Compact per-user chat state: a few slots, the last turns and the last
+    generated output."""
+
+    __slots__ = ("user_id", "slots", "turns", "last_output", "last_seen", "size")
+
+    def __init__(self, user_id: str, max_turns: int, last_seen: float) -> None:
+        self.user_id = user_id
+        self.slots: Dict[str, Any] = {}
+        self.turns: Deque[Tuple[str, str]] = deque(maxlen=max_turns)
+        self.last_output: Optional[str] = None
+        self.last_seen = last_seen
+        self.size = SESSION_OVERHEAD_BYTES
+
+    def estimate_size(self) -> int:
+        self.size = (
+            SESSION_OVERHEAD_BYTES
+            + len(self.user_id)
+            + sum(len(message) + len(intent) for message, intent in self.turns)
+            + sum(len(key) + len(str(value)) for key, value in self.slots.items())
+            + len(self.last_output or "")
+        )
+        return self.size
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "slots": self.slots,
+                "turns": list(self.turns),
+                "last_output": self.last_output,
+            }
+        )
+
+    @classmethod
+    def from_json(
+        cls, user_id: str, data: str, max_turns: int, last_seen: float
+    ) -> "Session":
+        fields = json.loads(data)
+        session = cls(user_id, max_turns, last_seen)
+        session.slots = dict(fields.get("slots", {}))
+        session.turns.extend(
+            (str(message), str(intent)) for message, intent in fields.get("turns", [])
+        )
+        session.last_output = fields.get("last_output")
+        session.estimate_size()
+        return session
+
+
+def sqlite_path_from_url(url: str) -> Optional[str]:
+    """Return the file path of a ``sqlite:///path`` URL, or None."""
+    prefix = "sqlite:///"
+    if not url.startswith(prefix):
+        if url:
+            logger.warning(f"Session spill only supports SQLite, ignoring {url}")
+        return None
+    return url[len(prefix) :] or None
+
+
+class SessionStore:
+    """Bounded store for per-user chat sessions.
+
+    Sessions live in an LRU ordered by last activity, so the least recently
+    used session is always at the head: idle-TTL expiry, the session cap and
+    the memory budget all evict from there in O(1). When ``db_path`` is
+    given, evicted sessions spill to SQLite in batched writes and are
+    promoted back on the user's next message.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        idle_ttl: float = 3600.0,
+        memory_budget: int = 64 * 1024 * 1024,
+        max_turns: int = 10,
+        db_path: Optional[str] = None,
+        disk_ttl: float = 30 * 24 * 3600,
+        write_batch_size: int = 100,
+    ) -> None:
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.memory_budget = memory_budget
+        self.max_turns = max_turns
+        self.disk_ttl = disk_ttl
+        self.write_batch_size = write_batch_size
+        self.memory_used = 0
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._pending_writes: Dict[str, Tuple[str, float]] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._counters = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evicted": 0,
+            "expired": 0,
+            "spilled": 0,
+        }
+        if db_path:
+            self._db = self._open_db(db_path)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, user_id: object) -> bool:
+        return user_id in self._sessions
+
+    def get(self, user_id: str) -> Optional[Session]:
+        now = time.time()
+        self._expire_idle(now)
+        session = self._sessions.get(user_id)
+        if session is not None:
+            self._counters["hits"] += 1
+            session.last_seen = now
+            self._sessions.move_to_end(user_id)
+            return session
+
+        session = self._load(user_id, now)
+        if session is not None:
+            self._counters["disk_hits"] += 1
+            self._insert(session)
+            return session
+
+        self._counters["misses"] += 1
+        return None
+
+    def get_or_create(self, user_id: str) -> Session:
+        session = self.get(user_id)
+        if session is None:
+            session = Session(user_id, self.max_turns, time.time())
+            self._insert(session)
+        return session
+
+    def record_turn(
+        self,
+        user_id: str,
+        message: str,
+        intent: str,
+        slots: Optional[Dict[str, Any]] = None,
+        output: Optional[str] = None,
+    ) -> Session:
+        session = self.get_or_create(user_id)
+        session.turns.append((message, intent))
+        if slots:
+            session.slots.update(slots)
+        if output is not None:
+            session.last_output = output
+
+        self.memory_used -= session.size
+        self.memory_used += session.estimate_size()
+        self._evict_over_budget()
+        return session
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "memory_used": self.memory_used,
+            "pending_writes": len(self._pending_writes),
+            **self._counters,
+        }
+
+    def flush(self) -> None:
+        if self._db is None or not self._pending_writes:
+            return
+        rows = [
+            (user_id, data, last_seen)
+            for user_id, (data, last_seen) in self._pending_writes.items()
+        ]
+        self._pending_writes.clear()
+        try:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chat_sessions (user_id, data, last_seen) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+            self._db.execute(
+                "DELETE FROM chat_sessions WHERE last_seen < ?",
+                (time.time() - self.disk_ttl,),
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error writing chat sessions: {e}")
+
+    def close(self) -> None:
+        if self._db is None:
+            return
+        for session in self._sessions.values():
+            self._spill(session)
+        self.flush()
+        self._db.close()
+        self._db = None
+
+    def _insert(self, session: Session) -> None:
+        self._sessions[session.user_id] = session
+        self._sessions.move_to_end(session.user_id)
+        self.memory_used += session.size
+        self._evict_over_budget()
+
+    def _evict_over_budget(self) -> None:
+        # Never evict the session that was just touched.
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions
+            or self.memory_used > self.memory_budget
+        ):
+            self._counters["evicted"] += 1
+            self._evict_oldest()
+
+    def _expire_idle(self, now: float) -> None:
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_seen <= self.idle_ttl:
+                return
+            self._counters["expired"] += 1
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        _, session = self._sessions.popitem(last=False)
+        self.memory_used -= session.size
+        self._spill(session)
+
+    def _spill(self, session: Session) -> None:
+        if self._db is None:
+            return
+        self._counters["spilled"] += 1
+        self._pending_writes[session.user_id] = (session.to_json(), session.last_seen)
+        if len(self._pending_writes) >= self.write_batch_size:
+            self.flush()
+
+    def _load(self, user_id: str, now: float) -> Optional[Session]:
+        if self._db is None:
+            return None
+
+        pending = self._pending_writes.pop(user_id, None)
+        row: Optional[List[Any]] = list(pending) if pending else None
+        if row is None:
+            try:
+                found = self._db.execute(
+                    "SELECT data, last_seen FROM chat_sessions WHERE user_id = ?",
+                    (user_id,),
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.error(f"Error reading chat session: {e}")
+                return None
+            row = list(found) if found else None
+        if row is None or now - row[1] > self.disk_ttl:
+            return None
+        return Session.from_json(user_id, row[0], self.max_turns, now)
+
+    def _open_db(self, db_path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(db_path)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS chat_sessions ("
+            "user_id TEXT PRIMARY KEY, data TEXT NOT NULL, last_seen REAL NOT NULL)"
+        )
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS chat_sessions_last_seen "
+            "ON chat_sessions (last_seen)"
+        )
+        db.commit()
+        return db
@@ -1,3 +1,18 @@
+from .artifact_store import Artifact, ArtifactStore
 from .comfyui_client import ComfyUIClient
+from .comfyui_pool import ComfyUIPool, parse_endpoints
+from .http_session import HTTPSessionConfig, SessionManager
+from .resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
 
-__all__ = ["ComfyUIClient"]
+__all__ = [
+    "Artifact",
+    "ArtifactStore",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "ComfyUIClient",
+    "ComfyUIPool",
+    "HTTPSessionConfig",
+    "RetryPolicy",
+    "SessionManager",
+    "parse_endpoints",
+]
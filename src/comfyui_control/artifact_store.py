@@ -0,0 +1,142 @@
+import hashlib
+import mmap
+import os
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiofiles
+import aiofiles.os
+from loguru import logger
+
+
+class Artifact:
+    __slots__ = ("digest", "path", "size")
+
+    def __init__(self, digest: str, path: Path, size: int) -> None:
+        self.digest = digest
+        self.path = path
+        self.size = size
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"digest": self.digest, "path": str(self.path), "size": self.size}
+
+
+class ArtifactStore:
+    """Content-addressed store for generated images.
+
+    Files are streamed to a temporary file while being hashed, then renamed
+    to ``<root>/<sha256[:2]>/<sha256><suffix>``; an image that is already
+    stored is kept once. Least recently used files are deleted once the
+    store grows past ``max_bytes``. Stored files are meant to be served by
+    path (``sendfile``) or ``mmap`` rather than read back into Python.
+    """
+
+    def __init__(
+        self,
+        root: str = "outputs",
+        max_bytes: int = 10 * 1024**3,
+        chunk_size: int = 64 * 1024,
+    ) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.total_bytes = 0
+        self._artifacts: "OrderedDict[str, Artifact]" = OrderedDict()
+        self._counters = {"stored": 0, "deduplicated": 0, "evicted": 0}
+        self._tmp_dir = self.root / ".tmp"
+        self._tmp_dir.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    def __contains__(self, digest: object) -> bool:
+        return digest in self._artifacts
+
+    def get(self, digest: str) -> Optional[Artifact]:
+        artifact = self._artifacts.get(digest)
+        if artifact is not None:
+            self._artifacts.move_to_end(digest)
+        return artifact
+
+    def open_mmap(self, digest: str) -> Optional[mmap.mmap]:
+        artifact = self.get(digest)
+        if artifact is None:
+            return None
+        with open(artifact.path, "rb") as file:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    async def store_stream(
+        self, chunks: AsyncIterator[bytes], suffix: str = ""
+    ) -> Artifact:
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = self._tmp_dir / f"{uuid.uuid4().hex}.part"
+        try:
+            async with aiofiles.open(tmp_path, "wb") as file:
+                async for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await file.write(chunk)
+        except BaseException:
+            await _remove(tmp_path)
+            raise
+
+        key = digest.hexdigest()
+        existing = self.get(key)
+        if existing is not None:
+            self._counters["deduplicated"] += 1
+            await _remove(tmp_path)
+            return existing
+
+        path = self.root / key[:2] / f"{key}{suffix}"
+        await aiofiles.os.makedirs(path.parent, exist_ok=True)
+        await aiofiles.os.replace(tmp_path, path)
+        artifact = Artifact(key, path, size)
+        self._add(artifact)
+        self._counters["stored"] += 1
+        self._evict()
+        return artifact
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "artifacts": len(self._artifacts),
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            **self._counters,
+        }
+
+    def _add(self, artifact: Artifact) -> None:
+        self._artifacts[artifact.digest] = artifact
+        self._artifacts.move_to_end(artifact.digest)
+        self.total_bytes += artifact.size
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and len(self._artifacts) > 1:
+            _, artifact = self._artifacts.popitem(last=False)
+            self.total_bytes -= artifact.size
+            self._counters["evicted"] += 1
+            try:
+                os.remove(artifact.path)
+            except OSError as e:
+                logger.warning(f"Could not remove artifact {artifact.path}: {e}")
+
+    def _load_index(self) -> None:
+        found = []
+        for path in self.root.glob("??/*"):
+            digest = path.name.split(".", 1)[0]
+            if len(digest) != 64 or not path.is_file():
+                continue
+            stat = path.stat()
+            found.append((stat.st_mtime, Artifact(digest, path, stat.st_size)))
+        for _, artifact in sorted(found, key=lambda item: item[0]):
+            self._add(artifact)
+        for stale in self._tmp_dir.glob("*.part"):
+            stale.unlink()
+        self._evict()
+
+
+async def _remove(path: Path) -> None:
+    try:
+        await aiofiles.os.remove(path)
+    except FileNotFoundError:
+        pass
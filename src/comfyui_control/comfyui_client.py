@@ -1,93 +1,458 @@
-from typing import Any, Dict, Optional
+import asyncio
+import contextlib
+import os
+import uuid
+from typing import Any, Awaitable, Callable, ContextManager, Dict, Optional, Tuple
 
 import aiohttp
 from loguru import logger
 
+from .artifact_store import Artifact, ArtifactStore
+from .completion_tracker import CompletionTracker, ProgressListener, parse_event
+from .http_session import HTTPSessionConfig, SessionManager
+from .resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+
 
 class ComfyUIClient:
-    def __init__(self, host: str = "localhost", port: int = 8188) -> None:
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 8188,
+        http_config: Optional[HTTPSessionConfig] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        metrics: Optional[Any] = None,
+    ) -> None:
         self.host = host
         self.port = port
         self.base_url = f"http://{host}:{port}"
         self.ws_url = f"ws://{host}:{port}/ws"
-        self.session: Optional[aiohttp.ClientSession] = None
-        self.websocket = None
+        self.client_id = f"my-chat-ai-comfyui-{uuid.uuid4().hex}"
+        self.http = SessionManager(http_config)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = CircuitBreaker(failure_threshold, recovery_timeout)
+        self.retry_counts: Dict[str, int] = {}
+        self.metrics = metrics
+        self.websocket: Any = None
+        self.completion_tracker = CompletionTracker()
+        self.ws_reconnect_delay = 1.0
+        self.ws_max_reconnect_delay = 30.0
+        self._websocket_session: Optional[aiohttp.ClientSession] = None
+        self._listener_task: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def session(self) -> Optional[aiohttp.ClientSession]:
+        return self.http.session
+
+    @session.setter
+    def session(self, session: Optional[aiohttp.ClientSession]) -> None:
+        self.http.session = session
 
     async def connect(self) -> bool:
+        connected = False
         try:
-            self.session = aiohttp.ClientSession()
+            session = await self.http.open()
             logger.info(f"Connecting to ComfyUI at {self.base_url}")
 
-            response = await self.session.get(f"{self.base_url}/system_stats")
-            if response.status == 200:
+            async with session.get(
+                f"{self.base_url}/system_stats",
+                timeout=self.http.timeout("system_stats"),
+            ) as response:
+                status = response.status
+            if status == 200:
                 logger.success("Successfully connected to ComfyUI")
-                return True
+                connected = True
             else:
-                logger.error(f"Failed to connect to ComfyUI: {response.status}")
-                return False
+                logger.error(f"Failed to connect to ComfyUI: {status}")
 
         except Exception as e:
             logger.error(f"Error connecting to ComfyUI: {e}")
-            return False
+
+        # The listener keeps retrying, so a ComfyUI that is still starting
+        # up gets its event stream once it answers.
+        await self.start_event_listener()
+        return connected
 
     async def disconnect(self) -> None:
+        if self._listener_task:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
         if self.websocket:
             await self.websocket.close()
-        if self.session:
-            await self.session.close()
+            self.websocket = None
+        await self._release_websocket_session()
+        self.completion_tracker.set_connected(False)
+        await self.http.close()
+
+    async def health_check(self) -> bool:
+        async with self.http.lease() as session:
+            if not session:
+                return False
+
+            try:
+                async with session.get(
+                    f"{self.base_url}/system_stats",
+                    timeout=self.http.timeout("system_stats"),
+                ) as response:
+                    healthy = response.status == 200
+                self.http.record_success()
+            except Exception as e:
+                self.http.record_failure(e)
+                logger.debug(f"Health check failed for {self.base_url}: {e}")
+                return False
+        if healthy:
+            # Restarts a listener that died, e.g. on a closed session.
+            await self.start_event_listener()
+        return healthy
+
+    async def start_event_listener(self) -> bool:
+        """Start the WebSocket listener unless it is running, and report
+        whether its socket is attached. It keeps reconnecting until
+        ``disconnect``."""
+        if self._listener_task and not self._listener_task.done():
+            return self.websocket is not None
+        opened = await self._open_websocket()
+        self._listener_task = asyncio.create_task(self._listen())
+        return opened
+
+    async def wait_for_prompt(self, prompt_id: str, timeout: float) -> Dict[str, Any]:
+        return await self.completion_tracker.wait(prompt_id, timeout)
+
+    def add_progress_listener(self, prompt_id: str, listener: ProgressListener) -> None:
+        self.completion_tracker.add_listener(prompt_id, listener)
+
+    def remove_progress_listener(
+        self, prompt_id: str, listener: ProgressListener
+    ) -> None:
+        self.completion_tracker.remove_listener(prompt_id, listener)
+
+    async def _open_websocket(self) -> bool:
+        await self._release_websocket_session()
+        session = await self.http.acquire()
+        if not session:
+            return False
+        # The socket outlives any one request, so it holds its session open
+        # across a session reset until the socket itself closes.
+        self.http.hold(session)
+        try:
+            self.websocket = await session.ws_connect(
+                f"{self.ws_url}?clientId={self.client_id}", heartbeat=30
+            )
+        except Exception as e:
+            await self.http.release(session)
+            logger.warning(f"ComfyUI WebSocket unavailable, using polling: {e}")
+            self.websocket = None
+            return False
+        self._websocket_session = session
+        self.completion_tracker.set_connected(True)
+        return True
+
+    async def _listen(self) -> None:
+        delay = self.ws_reconnect_delay
+        while True:
+            websocket = self.websocket
+            if websocket is not None:
+                async for msg in websocket:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        event = parse_event(msg.data)
+                        if event is not None:
+                            self.completion_tracker.handle_message(event)
+                    elif msg.type == aiohttp.WSMsgType.ERROR:
+                        break
+
+                logger.warning("ComfyUI WebSocket closed, reconnecting...")
+                self.completion_tracker.set_connected(False)
+                await self._release_websocket_session()
+                self.websocket = None
+                delay = self.ws_reconnect_delay
+
+            await asyncio.sleep(delay)
+            if not await self._open_websocket():
+                # Back off while ComfyUI is down.
+                delay = min(delay * 2, self.ws_max_reconnect_delay)
+
+    async def _release_websocket_session(self) -> None:
+        session, self._websocket_session = self._websocket_session, None
+        if session is not None:
+            await self.http.release(session)
+
+    def _stage(self, stage: str) -> ContextManager[Any]:
+        if self.metrics is None:
+            return contextlib.nullcontext()
+        timer: ContextManager[Any] = self.metrics.stage(stage)
+        return timer
+
+    def _record_error(self, stage: str, error_type: str) -> None:
+        if self.metrics is not None:
+            self.metrics.record_error(stage, error_type)
 
     async def queue_prompt(self, workflow: Dict[str, Any]) -> Optional[str]:
         if not self.session:
             logger.error("Client not connected")
+            self._record_error("queue_prompt", "not_connected")
             return None
 
-        try:
-            prompt_data = {"prompt": workflow, "client_id": "my-chat-ai-comfyui"}
+        with self._stage("queue_prompt"):
+            try:
+                # A client-side prompt_id makes the POST safe to retry: before
+                # each retry we check whether the previous attempt landed.
+                requested_id = str(uuid.uuid4())
+                prompt_data = {
+                    "prompt": workflow,
+                    "client_id": self.client_id,
+                    "prompt_id": requested_id,
+                }
 
-            async with self.session.post(
-                f"{self.base_url}/prompt", json=prompt_data
-            ) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    prompt_id = result.get("prompt_id")
+                status, result = await self._request(
+                    "prompt",
+                    "POST",
+                    "/prompt",
+                    payload=prompt_data,
+                    recover=lambda: self._recover_prompt(requested_id),
+                )
+                if status == 200:
+                    prompt_id = (result or {}).get("prompt_id")
                     logger.info(f"Queued prompt with ID: {prompt_id}")
                     return str(prompt_id) if prompt_id else None
                 else:
-                    logger.error(f"Failed to queue prompt: {response.status}")
+                    logger.error(f"Failed to queue prompt: {status}")
+                    self._record_error("queue_prompt", f"http_{status}")
                     return None
 
-        except Exception as e:
-            logger.error(f"Error queuing prompt: {e}")
-            return None
+            except Exception as e:
+                logger.error(f"Error queuing prompt: {e}")
+                self._record_error("queue_prompt", type(e).__name__)
+                return None
 
     async def get_queue_status(self) -> Dict[str, Any]:
         if not self.session:
             return {"error": "Client not connected"}
 
         try:
-            async with self.session.get(f"{self.base_url}/queue") as response:
-                if response.status == 200:
-                    result = await response.json()
-                    return dict(result) if result else {}
-                else:
-                    return {"error": f"HTTP {response.status}"}
+            status, result = await self._request("queue", "GET", "/queue")
+            if status == 200:
+                return dict(result) if result else {}
+            else:
+                return {"error": f"HTTP {status}"}
         except Exception as e:
             logger.error(f"Error getting queue status: {e}")
             return {"error": str(e)}
 
+    async def cancel_prompt(self, prompt_id: str) -> bool:
+        """Delete ``prompt_id`` from ComfyUI's pending queue. A prompt that
+        already started is left alone; see ``interrupt``."""
+        return await self._post_control(
+            "queue", "/queue", {"delete": [prompt_id]}, prompt_id
+        )
+
+    async def interrupt(self, prompt_id: Optional[str] = None) -> bool:
+        """Interrupt the running prompt. With ``prompt_id``, ComfyUI only
+        interrupts if that prompt is the one running (older servers ignore
+        it and interrupt whatever runs)."""
+        payload = {"prompt_id": prompt_id} if prompt_id else {}
+        return await self._post_control("interrupt", "/interrupt", payload, prompt_id)
+
+    async def _post_control(
+        self,
+        endpoint: str,
+        path: str,
+        payload: Dict[str, Any],
+        prompt_id: Optional[str],
+    ) -> bool:
+        if not self.session:
+            self._record_error(endpoint, "not_connected")
+            return False
+
+        try:
+            status, _ = await self._request(endpoint, "POST", path, payload=payload)
+        except Exception as e:
+            logger.error(f"Error calling {path} for {prompt_id}: {e}")
+            self._record_error(endpoint, type(e).__name__)
+            return False
+        if status != 200:
+            logger.error(f"Failed to call {path} for {prompt_id}: {status}")
+            self._record_error(endpoint, f"http_{status}")
+            return False
+        return True
+
     async def get_history(self, prompt_id: str) -> Dict[str, Any]:
         if not self.session:
+            self._record_error("get_history", "not_connected")
             return {"error": "Client not connected"}
 
-        try:
-            async with self.session.get(
-                f"{self.base_url}/history/{prompt_id}"
-            ) as response:
-                if response.status == 200:
-                    result = await response.json()
+        with self._stage("get_history"):
+            try:
+                status, result = await self._request(
+                    "history", "GET", f"/history/{prompt_id}"
+                )
+                if status == 200:
                     return dict(result) if result else {}
                 else:
-                    return {"error": f"HTTP {response.status}"}
-        except Exception as e:
-            logger.error(f"Error getting history: {e}")
-            return {"error": str(e)}
+                    self._record_error("get_history", f"http_{status}")
+                    return {"error": f"HTTP {status}"}
+            except Exception as e:
+                logger.error(f"Error getting history: {e}")
+                self._record_error("get_history", type(e).__name__)
+                return {"error": str(e)}
+
+    async def download_image(
+        self,
+        image: Dict[str, Any],
+        store: ArtifactStore,
+        prompt_id: Optional[str] = None,
+    ) -> Optional[Artifact]:
+        """Stream one output image from ``/view`` into ``store``."""
+        filename = image.get("filename")
+        if not filename:
+            return None
+        if not self.breaker.allow_request():
+            logger.warning(f"Skipping download of {filename}: ComfyUI unavailable")
+            return None
+        params = {
+            "filename": str(filename),
+            "subfolder": str(image.get("subfolder", "")),
+            "type": str(image.get("type", "output")),
+        }
+        async with self.http.lease() as session:
+            if not session:
+                return None
+            try:
+                async with session.get(
+                    f"{self.base_url}/view",
+                    params=params,
+                    timeout=self.http.timeout("view"),
+                ) as response:
+                    if response.status != 200:
+                        logger.error(
+                            f"Failed to download {filename}: {response.status}"
+                        )
+                        self.breaker.record_success()
+                        return None
+                    artifact = await store.store_stream(
+                        response.content.iter_chunked(store.chunk_size),
+                        suffix=os.path.splitext(str(filename))[1],
+                    )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.http.record_failure(e)
+                self.breaker.record_failure()
+                logger.error(f"Error downloading {filename}: {e}")
+                return None
+        self.http.record_success()
+        self.breaker.record_success()
+        return artifact
+
+    def resilience_stats(self) -> Dict[str, Any]:
+        return {
+            "breaker": self.breaker.stats(),
+            "retries": dict(self.retry_counts),
+            "session_recreated": self.http.recreated,
+        }
+
+    async def _request(
+        self,
+        endpoint: str,
+        method: str,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        recover: Optional[Callable[[], Awaitable[Optional[Tuple[int, Any]]]]] = None,
+    ) -> Tuple[int, Any]:
+        attempt = 1
+        while True:
+            if not self.breaker.allow_request():
+                raise CircuitOpenError(f"ComfyUI at {self.base_url} is unavailable")
+
+            error: Optional[BaseException] = None
+            status = 0
+            result: Any = None
+            try:
+                status, result = await self._send(endpoint, method, path, payload)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = e
+            except asyncio.CancelledError:
+                self.breaker.release_probe()
+                raise
+            except BaseException:
+                self.breaker.record_failure()
+                raise
+
+            if error is None and status not in self.retry_policy.retry_statuses:
+                if status >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                return status, result
+
+            self.breaker.record_failure()
+            if attempt >= self.retry_policy.max_attempts:
+                if error is not None:
+                    raise error
+                return status, result
+
+            self.retry_counts[endpoint] = self.retry_counts.get(endpoint, 0) + 1
+            logger.warning(
+                f"Retrying {method} {path} after {error or f'HTTP {status}'} "
+                f"(attempt {attempt})"
+            )
+            await asyncio.sleep(self.retry_policy.delay(attempt))
+            attempt += 1
+
+            if recover is not None:
+                recovered = await recover()
+                if recovered is not None:
+                    return recovered
+
+    async def _send(
+        self,
+        endpoint: str,
+        method: str,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[int, Any]:
+        async with self.http.lease() as session:
+            if not session:
+                raise aiohttp.ClientConnectionError("Client not connected")
+
+            request = session.post if method == "POST" else session.get
+            try:
+                async with request(
+                    f"{self.base_url}{path}",
+                    json=payload,
+                    timeout=self.http.timeout(endpoint),
+                ) as response:
+                    status = response.status
+                    # Control endpoints (/queue, /interrupt) answer with an
+                    # empty body that isn't typed as JSON.
+                    result = (
+                        await response.json(content_type=None)
+                        if status == 200
+                        else None
+                    )
+            except Exception as e:
+                self.http.record_failure(e)
+                raise
+        self.http.record_success()
+        return status, result
+
+    async def _recover_prompt(self, prompt_id: str) -> Optional[Tuple[int, Any]]:
+        try:
+            status, history = await self._send(
+                "history", "GET", f"/history/{prompt_id}"
+            )
+            if status == 200 and history and prompt_id in history:
+                return 200, {"prompt_id": prompt_id}
+
+            status, queue = await self._send("queue", "GET", "/queue")
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+
+        if status == 200 and queue:
+            for item in queue.get("queue_running", []) + queue.get("queue_pending", []):
+                if len(item) > 1 and item[1] == prompt_id:
+                    logger.info(f"Prompt {prompt_id} was already queued")
+                    return 200, {"prompt_id": prompt_id}
+        return None
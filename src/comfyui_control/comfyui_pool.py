@@ -0,0 +1,307 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from .comfyui_client import ComfyUIClient
+
+
+def parse_endpoints(value: str, default_port: int = 8188) -> List[Tuple[str, int]]:
+    endpoints = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.rpartition(":")
+        if not host:
+            host, port = item, ""
+        endpoints.append((host, int(port) if port else default_port))
+    return endpoints
+
+
+class _Backend:
+    def __init__(self, client: Any) -> None:
+        self.client = client
+        self.healthy = False
+        self.queue_depth = 0
+        self.queue_checked_at = float("-inf")
+        self.submitted_since_check = 0
+        self.failures = 0
+
+    @property
+    def name(self) -> str:
+        return str(getattr(self.client, "base_url", id(self.client)))
+
+    @property
+    def load(self) -> int:
+        return self.queue_depth + self.submitted_since_check
+
+
+class ComfyUIPool:
+    """Spreads prompts over several ComfyUI backends.
+
+    Exposes the same coroutine surface as ``ComfyUIClient`` so the
+    orchestrator can use either. New prompts go to the healthy backend with
+    the shortest ``/queue``; history and completion waits stay pinned to the
+    backend that accepted the prompt. A backend is only ejected after
+    ``unhealthy_threshold`` probes in a row fail, so one slow answer doesn't
+    take it out of rotation.
+    """
+
+    def __init__(
+        self,
+        clients: Sequence[Any],
+        health_check_interval: float = 10.0,
+        probe_timeout: float = 2.0,
+        queue_status_ttl: float = 0.5,
+        max_tracked_prompts: int = 10000,
+        unhealthy_threshold: int = 3,
+    ) -> None:
+        if not clients:
+            raise ValueError("ComfyUIPool needs at least one backend")
+        self.backends = [_Backend(client) for client in clients]
+        self.health_check_interval = health_check_interval
+        self.probe_timeout = probe_timeout
+        self.queue_status_ttl = queue_status_ttl
+        self.max_tracked_prompts = max_tracked_prompts
+        self.unhealthy_threshold = max(1, unhealthy_threshold)
+        self._owners: "OrderedDict[str, _Backend]" = OrderedDict()
+        self._health_task: Optional["asyncio.Task[None]"] = None
+
+    @classmethod
+    def from_endpoints(
+        cls,
+        endpoints: Sequence[Tuple[str, int]],
+        client_options: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> "ComfyUIPool":
+        clients = [
+            ComfyUIClient(host=host, port=port, **(client_options or {}))
+            for host, port in endpoints
+        ]
+        return cls(clients, **kwargs)
+
+    async def connect(self) -> bool:
+        results = await asyncio.gather(
+            *(backend.client.connect() for backend in self.backends),
+            return_exceptions=True,
+        )
+        for backend, result in zip(self.backends, results):
+            backend.healthy = result is True
+            if not backend.healthy:
+                logger.warning(f"ComfyUI backend {backend.name} is unavailable")
+
+        if self._health_task is None and self.health_check_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+        healthy = sum(backend.healthy for backend in self.backends)
+        logger.info(f"ComfyUI pool connected: {healthy}/{len(self.backends)} healthy")
+        return healthy > 0
+
+    async def disconnect(self) -> None:
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        await asyncio.gather(
+            *(backend.client.disconnect() for backend in self.backends),
+            return_exceptions=True,
+        )
+
+    async def queue_prompt(self, workflow: Dict[str, Any]) -> Optional[str]:
+        for backend in await self._rank_backends():
+            backend.submitted_since_check += 1
+            prompt_id = await backend.client.queue_prompt(workflow)
+            if prompt_id:
+                self._track(prompt_id, backend)
+                return str(prompt_id)
+            backend.submitted_since_check -= 1
+            logger.warning(f"Backend {backend.name} rejected prompt, trying next")
+
+        logger.error("No ComfyUI backend accepted the prompt")
+        return None
+
+    async def get_history(self, prompt_id: str) -> Dict[str, Any]:
+        backend = self._owners.get(prompt_id)
+        if backend is not None:
+            return dict(await backend.client.get_history(prompt_id))
+
+        # Unknown prompt (e.g. queued before a restart): ask every live backend.
+        for backend in self._healthy_backends():
+            history = await backend.client.get_history(prompt_id)
+            if prompt_id in history:
+                self._track(prompt_id, backend)
+                return dict(history)
+        return {}
+
+    async def wait_for_prompt(self, prompt_id: str, timeout: float) -> Dict[str, Any]:
+        backend = self._owners.get(prompt_id)
+        wait = getattr(backend.client, "wait_for_prompt", None) if backend else None
+        if not asyncio.iscoroutinefunction(wait):
+            return {"status": "unavailable"}
+        return dict(await wait(prompt_id, timeout))
+
+    async def cancel_prompt(self, prompt_id: str) -> bool:
+        backend = self._owners.get(prompt_id)
+        candidates = [backend] if backend else self._healthy_backends()
+        results = await asyncio.gather(
+            *(candidate.client.cancel_prompt(prompt_id) for candidate in candidates),
+            return_exceptions=True,
+        )
+        return any(result is True for result in results)
+
+    async def interrupt(self, prompt_id: Optional[str] = None) -> bool:
+        # Only the backend running the prompt may be interrupted: an older
+        # ComfyUI would stop whatever it happens to be running.
+        backend = self._owners.get(prompt_id) if prompt_id else None
+        if backend is None:
+            return False
+        return bool(await backend.client.interrupt(prompt_id))
+
+    async def download_image(
+        self, image: Dict[str, Any], store: Any, prompt_id: Optional[str] = None
+    ) -> Optional[Any]:
+        # Output files only exist on the backend that ran the prompt.
+        backend = self._owners.get(prompt_id) if prompt_id else None
+        candidates = [backend] if backend else self._healthy_backends()
+        for candidate in candidates:
+            artifact = await candidate.client.download_image(image, store, prompt_id)
+            if artifact is not None:
+                return artifact
+        return None
+
+    def add_progress_listener(
+        self, prompt_id: str, listener: Callable[[Dict[str, Any]], None]
+    ) -> None:
+        backend = self._owners.get(prompt_id)
+        if backend is not None and hasattr(backend.client, "add_progress_listener"):
+            backend.client.add_progress_listener(prompt_id, listener)
+
+    def remove_progress_listener(
+        self, prompt_id: str, listener: Callable[[Dict[str, Any]], None]
+    ) -> None:
+        backend = self._owners.get(prompt_id)
+        if backend is not None and hasattr(backend.client, "remove_progress_listener"):
+            backend.client.remove_progress_listener(prompt_id, listener)
+
+    async def get_queue_status(self) -> Dict[str, Any]:
+        statuses = await asyncio.gather(
+            *(self._probe_queue(backend) for backend in self._healthy_backends())
+        )
+        running: List[Any] = []
+        pending: List[Any] = []
+        for status in statuses:
+            if status:
+                running.extend(status.get("queue_running", []))
+                pending.extend(status.get("queue_pending", []))
+        return {
+            "queue_running": running,
+            "queue_pending": pending,
+            "backends": self.stats()["backends"],
+        }
+
+    def owner_of(self, prompt_id: str) -> Optional[Any]:
+        backend = self._owners.get(prompt_id)
+        return backend.client if backend else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "healthy": sum(backend.healthy for backend in self.backends),
+            "total": len(self.backends),
+            "backends": [
+                {
+                    "name": backend.name,
+                    "healthy": backend.healthy,
+                    "queue_depth": backend.queue_depth,
+                    "load": backend.load,
+                }
+                for backend in self.backends
+            ],
+        }
+
+    async def check_health(self) -> None:
+        results = await asyncio.gather(
+            *(self._probe_health(backend) for backend in self.backends)
+        )
+        for backend, healthy in zip(self.backends, results):
+            if not healthy:
+                self._record_probe_failure(backend)
+                continue
+            backend.failures = 0
+            if not backend.healthy:
+                logger.warning(f"ComfyUI backend {backend.name} is now healthy")
+                backend.healthy = True
+                start_listener = getattr(backend.client, "start_event_listener", None)
+                if asyncio.iscoroutinefunction(start_listener):
+                    await start_listener()
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.error(f"Error checking ComfyUI backend health: {e}")
+
+    async def _probe_health(self, backend: _Backend) -> bool:
+        try:
+            return bool(
+                await asyncio.wait_for(
+                    backend.client.health_check(), self.probe_timeout
+                )
+            )
+        except Exception:
+            return False
+
+    async def _probe_queue(self, backend: _Backend) -> Optional[Dict[str, Any]]:
+        try:
+            status = await asyncio.wait_for(
+                backend.client.get_queue_status(), self.probe_timeout
+            )
+        except Exception as e:
+            logger.warning(f"Queue probe failed for {backend.name}: {e}")
+            status = {"error": str(e)}
+
+        if "error" in status:
+            self._record_probe_failure(backend)
+            return None
+
+        backend.failures = 0
+        backend.queue_depth = len(status.get("queue_running", [])) + len(
+            status.get("queue_pending", [])
+        )
+        backend.queue_checked_at = asyncio.get_running_loop().time()
+        backend.submitted_since_check = 0
+        return dict(status)
+
+    async def _rank_backends(self) -> List[_Backend]:
+        now = asyncio.get_running_loop().time()
+        stale = [
+            backend
+            for backend in self._healthy_backends()
+            if now - backend.queue_checked_at > self.queue_status_ttl
+        ]
+        if stale:
+            await asyncio.gather(*(self._probe_queue(backend) for backend in stale))
+        healthy = self._healthy_backends()
+        # Backends whose last probe failed go last until they answer again.
+        return sorted(healthy, key=lambda backend: (backend.failures > 0, backend.load))
+
+    def _record_probe_failure(self, backend: _Backend) -> None:
+        backend.failures += 1
+        if backend.healthy and backend.failures >= self.unhealthy_threshold:
+            logger.warning(f"ComfyUI backend {backend.name} is now unhealthy")
+            backend.healthy = False
+
+    def _healthy_backends(self) -> List[_Backend]:
+        return [backend for backend in self.backends if backend.healthy]
+
+    def _track(self, prompt_id: str, backend: _Backend) -> None:
+        self._owners[prompt_id] = backend
+        self._owners.move_to_end(prompt_id)
+        while len(self._owners) > self.max_tracked_prompts:
+            self._owners.popitem(last=False)
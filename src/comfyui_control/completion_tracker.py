@@ -0,0 +1,155 @@
+import asyncio
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+COMPLETED = "completed"
+ERROR = "error"
+INTERRUPTED = "interrupted"
+TIMEOUT = "timeout"
+UNAVAILABLE = "unavailable"
+
+ProgressListener = Callable[[Dict[str, Any]], None]
+
+
+class CompletionTracker:
+    """Routes ComfyUI WebSocket events to per-prompt completion futures.
+
+    A single listener feeds every message through ``handle_message`` and
+    callers await ``wait`` for their prompt_id. Terminal states that arrive
+    are remembered (bounded) so a job that finishes before anyone waits on it
+    still resolves immediately. The first terminal state wins: ComfyUI sends
+    ``executing`` with no node after an error or interrupt too. ``progress``
+    and ``executing`` events are forwarded to any listeners registered for
+    the prompt.
+    """
+
+    def __init__(self, max_finished: int = 1024) -> None:
+        self.max_finished = max_finished
+        self.connected = False
+        self._waiters: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+        self._waiter_counts: Dict[str, int] = {}
+        self._finished: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._listeners: Dict[str, List[ProgressListener]] = {}
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._waiters)
+
+    def handle_message(self, message: Dict[str, Any]) -> None:
+        message_type = message.get("type")
+        data = message.get("data") or {}
+        prompt_id = data.get("prompt_id")
+        if not prompt_id:
+            return
+
+        if message_type == "progress":
+            self._notify(
+                str(prompt_id),
+                {
+                    "type": "progress",
+                    "prompt_id": str(prompt_id),
+                    "node": data.get("node"),
+                    "value": data.get("value"),
+                    "max": data.get("max"),
+                },
+            )
+        elif message_type == "executing" and data.get("node") is not None:
+            self._notify(
+                str(prompt_id),
+                {
+                    "type": "executing",
+                    "prompt_id": str(prompt_id),
+                    "node": data.get("node"),
+                },
+            )
+        elif message_type == "executing":
+            self._finish(str(prompt_id), {"status": COMPLETED})
+        elif message_type == "execution_success":
+            self._finish(str(prompt_id), {"status": COMPLETED})
+        elif message_type == "execution_error":
+            self._finish(
+                str(prompt_id),
+                {
+                    "status": ERROR,
+                    "error": data.get("exception_message", "Execution error"),
+                    "node_id": data.get("node_id"),
+                },
+            )
+        elif message_type == "execution_interrupted":
+            self._finish(str(prompt_id), {"status": INTERRUPTED})
+
+    async def wait(self, prompt_id: str, timeout: float) -> Dict[str, Any]:
+        finished = self._finished.get(prompt_id)
+        if finished is not None:
+            return finished
+        if not self.connected:
+            return {"status": UNAVAILABLE}
+
+        future = self._waiters.get(prompt_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters[prompt_id] = future
+        self._waiter_counts[prompt_id] = self._waiter_counts.get(prompt_id, 0) + 1
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return {"status": TIMEOUT}
+        finally:
+            remaining = self._waiter_counts.pop(prompt_id, 1) - 1
+            if remaining > 0:
+                self._waiter_counts[prompt_id] = remaining
+            elif self._waiters.get(prompt_id) is future:
+                del self._waiters[prompt_id]
+
+    def add_listener(self, prompt_id: str, listener: ProgressListener) -> None:
+        self._listeners.setdefault(prompt_id, []).append(listener)
+
+    def remove_listener(self, prompt_id: str, listener: ProgressListener) -> None:
+        listeners = self._listeners.get(prompt_id)
+        if listeners and listener in listeners:
+            listeners.remove(listener)
+            if not listeners:
+                del self._listeners[prompt_id]
+
+    def set_connected(self, connected: bool) -> None:
+        self.connected = connected
+        if not connected:
+            self.fail_pending()
+
+    def fail_pending(self, status: str = UNAVAILABLE) -> None:
+        waiters, self._waiters = self._waiters, {}
+        for future in waiters.values():
+            if not future.done():
+                future.set_result({"status": status})
+
+    def _notify(self, prompt_id: str, event: Dict[str, Any]) -> None:
+        for listener in list(self._listeners.get(prompt_id, ())):
+            try:
+                listener(event)
+            except Exception as e:
+                logger.warning(f"Progress listener for {prompt_id} failed: {e}")
+
+    def _finish(self, prompt_id: str, result: Dict[str, Any]) -> None:
+        if prompt_id in self._finished:
+            return
+        logger.debug(f"Prompt {prompt_id} finished: {result['status']}")
+        future = self._waiters.pop(prompt_id, None)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+        self._finished[prompt_id] = result
+        self._finished.move_to_end(prompt_id)
+        while len(self._finished) > self.max_finished:
+            self._finished.popitem(last=False)
+
+
+def parse_event(raw: str) -> Optional[Dict[str, Any]]:
+    try:
+        message = json.loads(raw)
+    except ValueError:
+        return None
+    return message if isinstance(message, dict) else None
@@ -0,0 +1,166 @@
+import asyncio
+import contextlib
+from typing import AsyncIterator, Dict, List, Optional
+
+import aiohttp
+from loguru import logger
+
+DEFAULT_READ_TIMEOUTS: Dict[str, float] = {
+    "system_stats": 5.0,
+    "prompt": 30.0,
+    "queue": 10.0,
+    "history": 10.0,
+    "view": 120.0,
+    "interrupt": 10.0,
+}
+
+# aiohttp < 3.10 raises a plain ServerTimeoutError for connect timeouts too.
+_CONNECT_TIMEOUT_ERRORS = getattr(aiohttp, "ConnectionTimeoutError", ())
+
+
+class HTTPSessionConfig:
+    def __init__(
+        self,
+        pool_size: int = 100,
+        per_host_limit: int = 0,
+        keepalive_timeout: float = 30.0,
+        dns_cache_ttl: int = 300,
+        connect_timeout: float = 5.0,
+        read_timeouts: Optional[Dict[str, float]] = None,
+        default_read_timeout: float = 30.0,
+        max_consecutive_failures: int = 3,
+    ) -> None:
+        self.pool_size = pool_size
+        self.per_host_limit = per_host_limit
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.connect_timeout = connect_timeout
+        self.read_timeouts = {**DEFAULT_READ_TIMEOUTS, **(read_timeouts or {})}
+        self.default_read_timeout = default_read_timeout
+        self.max_consecutive_failures = max_consecutive_failures
+
+
+class SessionManager:
+    """Owns the pooled ``aiohttp.ClientSession`` used to talk to ComfyUI.
+
+    The session keeps connections alive and caches DNS. Each endpoint gets
+    its own connect/read timeout, and after ``max_consecutive_failures``
+    connection-level errors a new session replaces it on next use, so a
+    wedged pool cannot poison every later request. Requests still running
+    on the old session (a ``/view`` stream, the event WebSocket) hold a
+    lease on it, and it is only closed once the last one is released.
+    """
+
+    def __init__(self, config: Optional[HTTPSessionConfig] = None) -> None:
+        self.config = config or HTTPSessionConfig()
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.consecutive_failures = 0
+        self.recreated = 0
+        self._needs_reset = False
+        self._timeouts: Dict[str, aiohttp.ClientTimeout] = {}
+        self._leases: Dict[aiohttp.ClientSession, int] = {}
+        self._draining: List[aiohttp.ClientSession] = []
+
+    async def open(self) -> aiohttp.ClientSession:
+        await self.close()
+        self.session = self._new_session()
+        return self.session
+
+    async def acquire(self) -> Optional[aiohttp.ClientSession]:
+        if self.session is None:
+            return None
+        if self._needs_reset or self.session.closed:
+            logger.warning("Recreating ComfyUI HTTP session after failures")
+            self.recreated += 1
+            previous, self.session = self.session, self._new_session()
+            await self._retire(previous)
+        return self.session
+
+    @contextlib.asynccontextmanager
+    async def lease(self) -> AsyncIterator[Optional[aiohttp.ClientSession]]:
+        """The current session, kept open until the block exits even if it
+        is replaced meanwhile."""
+        session = await self.acquire()
+        if session is None:
+            yield None
+            return
+        self.hold(session)
+        try:
+            yield session
+        finally:
+            await self.release(session)
+
+    def hold(self, session: aiohttp.ClientSession) -> None:
+        self._leases[session] = self._leases.get(session, 0) + 1
+
+    async def release(self, session: aiohttp.ClientSession) -> None:
+        count = self._leases.get(session, 0) - 1
+        if count > 0:
+            self._leases[session] = count
+            return
+        self._leases.pop(session, None)
+        if session in self._draining:
+            self._draining.remove(session)
+            await session.close()
+
+    def timeout(self, endpoint: str) -> aiohttp.ClientTimeout:
+        timeout = self._timeouts.get(endpoint)
+        if timeout is None:
+            read_timeout = self.config.read_timeouts.get(
+                endpoint, self.config.default_read_timeout
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=None,
+                connect=self.config.connect_timeout,
+                sock_connect=self.config.connect_timeout,
+                sock_read=read_timeout,
+            )
+            self._timeouts[endpoint] = timeout
+        return timeout
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+
+    def record_failure(self, error: BaseException) -> None:
+        """Count connection-level errors toward a reset. Read timeouts don't
+        count: a slow prompt or image says nothing about the pool."""
+        if not isinstance(error, aiohttp.ClientConnectionError):
+            return
+        if isinstance(error, asyncio.TimeoutError) and not isinstance(
+            error, _CONNECT_TIMEOUT_ERRORS
+        ):
+            return
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.config.max_consecutive_failures:
+            self._needs_reset = True
+
+    async def close(self) -> None:
+        sessions = [self.session, *self._draining]
+        self.session = None
+        self._draining = []
+        self._leases.clear()
+        for session in sessions:
+            if session is not None and not session.closed:
+                await session.close()
+
+    def _new_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.config.pool_size,
+            limit_per_host=self.config.per_host_limit,
+            ttl_dns_cache=self.config.dns_cache_ttl,
+            use_dns_cache=True,
+            keepalive_timeout=self.config.keepalive_timeout,
+        )
+        self.consecutive_failures = 0
+        self._needs_reset = False
+        return aiohttp.ClientSession(
+            connector=connector, timeout=self.timeout("default")
+        )
+
+    async def _retire(self, session: aiohttp.ClientSession) -> None:
+        if session.closed:
+            return
+        if self._leases.get(session):
+            self._draining.append(session)
+        else:
+            await session.close()
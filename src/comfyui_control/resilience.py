@@ -0,0 +1,109 @@
+import random
+import time
+from typing import Any, Dict, FrozenSet
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for transient ComfyUI failures."""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.25,
+        max_delay: float = 5.0,
+        retry_statuses: FrozenSet[int] = frozenset({429, 502, 503, 504}),
+    ) -> None:
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = retry_statuses
+
+    def delay(self, attempt: int) -> float:
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """Fails fast while ComfyUI keeps failing, then probes it to recover.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    rejects calls for ``recovery_timeout`` seconds. It then lets a single
+    probe through (half-open): success closes it, failure re-opens it. A
+    probe that never reports back expires after ``recovery_timeout``.
+    """
+
+    def __init__(
+        self, failure_threshold: int = 5, recovery_timeout: float = 30.0
+    ) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self.consecutive_failures = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        self._counters = {"opened": 0, "rejected": 0, "failures": 0, "successes": 0}
+
+    @property
+    def state(self) -> str:
+        if (
+            self._state == OPEN
+            and time.monotonic() - self._opened_at >= self.recovery_timeout
+        ):
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and (
+            not self._probe_in_flight
+            or time.monotonic() - self._probe_started >= self.recovery_timeout
+        ):
+            self._probe_in_flight = True
+            self._probe_started = time.monotonic()
+            return True
+        self._counters["rejected"] += 1
+        return False
+
+    def record_success(self) -> None:
+        self._counters["successes"] += 1
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        self._state = CLOSED
+
+    def record_failure(self) -> None:
+        self._counters["failures"] += 1
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self._state == HALF_OPEN or (
+            self._state == CLOSED
+            and self.consecutive_failures >= self.failure_threshold
+        ):
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+            self._counters["opened"] += 1
+
+    def release_probe(self) -> None:
+        """A call ended without a verdict (e.g. it was cancelled). If it was
+        the half-open probe, count it as a failure so another probe follows
+        after ``recovery_timeout``."""
+        if self._state == HALF_OPEN and self._probe_in_flight:
+            self.record_failure()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            **self._counters,
+        }
@@ -1,3 +1,18 @@
+from .embedding_classifier import EmbeddingIntentClassifier, HashedNgramFeaturizer
 from .intent_processor import IntentProcessor
+from .prompt_screener import (
+    SCREENING_EXAMPLES,
+    PromptScreener,
+    ScreeningVerdict,
+    normalize_prompt,
+)
 
-__all__ = ["IntentProcessor"]
+__all__ = [
+    "EmbeddingIntentClassifier",
+    "HashedNgramFeaturizer",
+    "IntentProcessor",
+    "PromptScreener",
+    "SCREENING_EXAMPLES",
+    "ScreeningVerdict",
+    "normalize_prompt",
+]
@@ -0,0 +1,163 @@
+import zlib
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_EXAMPLES: Dict[str, List[str]] = {
+    "image_generation": [
+        "generate an image of a sunset over the ocean",
+        "create a picture of a cat wearing a hat",
+        "make a photo of a mountain lake",
+        "draw a dragon flying over a castle",
+        "paint a portrait of an old sailor",
+        "render a futuristic city at night",
+        "can you show me a forest in autumn",
+        "i want a wallpaper with neon lights",
+        "give me an illustration of a robot",
+        "sketch a cozy coffee shop",
+        "design a logo with a fox",
+        "visualize a spaceship landing on mars",
+    ],
+    "image_modification": [
+        "modify the image to be brighter",
+        "change the picture background to blue",
+        "edit the photo and remove the person",
+        "adjust the colors of the last image",
+        "alter the lighting to look like sunset",
+        "make the previous picture darker",
+        "tweak the image so the sky is purple",
+        "fix the colours in that photo",
+        "replace the background with a beach",
+        "crop and enhance the last result",
+    ],
+    "nsfw_filter": [
+        "keep it safe for work",
+        "filter nsfw content please",
+        "censor anything inappropriate",
+        "make it family friendly",
+        "only clean and appropriate images",
+        "turn on the content filter",
+        "no explicit content please",
+    ],
+    "general": [
+        "hello",
+        "hi there how are you",
+        "what can you do",
+        "thanks that was great",
+        "help",
+        "who are you",
+        "good morning",
+        "what time is it",
+        "tell me a joke",
+        "how does this bot work",
+    ],
+}
+
+
+class HashedNgramFeaturizer:
+    """Maps text to L2-normalised hashed character n-gram count vectors.
+
+    Needs no model download, so it runs in a no-network CI. Hashing uses
+    crc32 rather than ``hash`` so vectors are stable across processes.
+    """
+
+    def __init__(
+        self,
+        dim: int = 4096,
+        ngram_range: Tuple[int, int] = (2, 4),
+        max_cached_ngrams: int = 100000,
+    ) -> None:
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.max_cached_ngrams = max_cached_ngrams
+        self._buckets: Dict[str, int] = {}
+
+    def transform(self, texts: Sequence[str]) -> np.ndarray:
+        rows: List[int] = []
+        columns: List[int] = []
+        for row, text in enumerate(texts):
+            for ngram in self._ngrams(text):
+                rows.append(row)
+                columns.append(self._bucket(ngram))
+
+        features = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(features, (rows, columns), 1.0)
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        np.divide(features, norms, out=features, where=norms > 0)
+        return features
+
+    def _ngrams(self, text: str) -> List[str]:
+        padded = f" {' '.join(text.lower().split())} "
+        low, high = self.ngram_range
+        return [
+            padded[start : start + size]
+            for size in range(low, high + 1)
+            for start in range(len(padded) - size + 1)
+        ]
+
+    def _bucket(self, ngram: str) -> int:
+        bucket = self._buckets.get(ngram)
+        if bucket is None:
+            if len(self._buckets) >= self.max_cached_ngrams:
+                self._buckets.clear()
+            bucket = zlib.crc32(ngram.encode("utf-8")) % self.dim
+            self._buckets[ngram] = bucket
+        return bucket
+
+
+class EmbeddingIntentClassifier:
+    """Scores messages against per-intent centroid vectors.
+
+    Centroids are precomputed once into a ``(intents, dim)`` matrix, so a
+    whole batch of messages is scored with a single matrix multiply. The
+    cosine similarities go through a temperature softmax to give a
+    confidence for each intent.
+    """
+
+    def __init__(
+        self,
+        examples: Optional[Mapping[str, Sequence[str]]] = None,
+        featurizer: Optional[HashedNgramFeaturizer] = None,
+        temperature: float = 0.05,
+        min_confidence: float = 0.5,
+    ) -> None:
+        examples = examples if examples is not None else DEFAULT_EXAMPLES
+        if not examples:
+            raise ValueError("EmbeddingIntentClassifier needs at least one intent")
+        self.featurizer = featurizer or HashedNgramFeaturizer()
+        self.temperature = temperature
+        self.min_confidence = min_confidence
+        self.intents = list(examples)
+
+        centroids = np.stack(
+            [
+                self.featurizer.transform(list(examples[intent])).mean(axis=0)
+                for intent in self.intents
+            ]
+        )
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self.centroids = centroids / np.where(norms > 0, norms, 1.0)
+
+    def score(self, messages: Sequence[str]) -> np.ndarray:
+        """Return a ``(len(messages), len(intents))`` matrix of confidences."""
+        if not messages:
+            return np.zeros((0, len(self.intents)), dtype=np.float32)
+        similarities: np.ndarray = (
+            self.featurizer.transform(messages) @ self.centroids.T
+        )
+        logits = similarities / self.temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities: np.ndarray = np.exp(logits)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        return probabilities
+
+    def classify(self, message: str) -> Tuple[str, float]:
+        return self.classify_batch([message])[0]
+
+    def classify_batch(self, messages: Sequence[str]) -> List[Tuple[str, float]]:
+        probabilities = self.score(messages)
+        best = probabilities.argmax(axis=1)
+        return [
+            (self.intents[index], float(probabilities[row, index]))
+            for row, index in enumerate(best)
+        ]
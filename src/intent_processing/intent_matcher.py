@@ -0,0 +1,204 @@
+import re
+import sys
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Any, Dict, List, Mapping, Optional, Pattern, Sequence, Tuple, Union
+
+REGEX_METACHARACTERS = frozenset(".^$*+?{}[]|()\\\n")
+
+# One entry per intent, in priority order. Each pattern is either a chain of
+# literals that must appear in order on one line (``draw.*image``), or a
+# compiled regex for anything the literal scan can't express.
+Chain = Tuple[str, ...]
+CompiledPatterns = Tuple[Tuple[str, Tuple[Union[Chain, Pattern[str]], ...]], ...]
+KeywordGroups = Tuple[Tuple[str, Tuple[str, ...]], ...]
+
+
+def split_literal_pattern(pattern: str) -> Optional[Chain]:
+    """Split ``a.*b.*`` into ``("a", "b")``, or None if it isn't that simple."""
+    segments = tuple(segment for segment in pattern.split(".*") if segment)
+    if not segments or any(
+        char in REGEX_METACHARACTERS for segment in segments for char in segment
+    ):
+        return None
+    return segments
+
+
+class IntentMatcher:
+    """Classifies intent and finds style, safety and modification keywords
+    in a single scan of the message.
+
+    Every literal used by any pattern or keyword table goes into one
+    lookahead alternation, so one ``finditer`` pass records where each of
+    them occurs. Results are then read off those positions in the same order
+    the original ``re.search``/``in`` checks ran, so tie-breaking is
+    unchanged.
+    """
+
+    def __init__(
+        self,
+        intent_patterns: Mapping[str, Sequence[str]],
+        style_keywords: Mapping[str, Sequence[str]],
+        safe_indicators: Sequence[str],
+        modification_keywords: Mapping[str, Sequence[str]],
+        default_intent: str = "general",
+        default_style: str = "default",
+        default_modification: str = "general_modification",
+    ) -> None:
+        self.default_intent = default_intent
+        self.default_style = default_style
+        self.default_modification = default_modification
+
+        literals = set(safe_indicators)
+        compiled = []
+        for intent, patterns in intent_patterns.items():
+            entries: List[Union[Chain, Pattern[str]]] = []
+            for pattern in patterns:
+                chain = split_literal_pattern(pattern)
+                if chain is None:
+                    entries.append(re.compile(pattern))
+                else:
+                    entries.append(chain)
+                    literals.update(chain)
+            compiled.append((intent, tuple(entries)))
+        self.intent_patterns: CompiledPatterns = tuple(compiled)
+
+        self.style_keywords = _keyword_groups(style_keywords)
+        self.modification_keywords = _keyword_groups(modification_keywords)
+        self.safe_indicators = tuple(safe_indicators)
+        for _, keywords in self.style_keywords + self.modification_keywords:
+            literals.update(keywords)
+        literals.discard("")
+
+        # Longest first so the alternation reports the longest literal at a
+        # position; shorter literals that are its prefixes are implied.
+        ordered = sorted(literals, key=lambda literal: (-len(literal), literal))
+        self._prefixes = {
+            literal: [
+                other
+                for other in ordered
+                if other != literal and literal.startswith(other)
+            ]
+            for literal in ordered
+        }
+        alternatives = "|".join(re.escape(literal) for literal in ordered)
+        self._scanner = re.compile(
+            f"(?=({alternatives}|\n))" if alternatives else "(?=(\n))"
+        )
+
+    def match(self, message: str) -> Dict[str, Any]:
+        hits, newlines = self._scan(message)
+        return {
+            "intent": self._classify(message, hits, newlines),
+            "style": _first_group(hits, self.style_keywords, self.default_style),
+            "nsfw_filter": any(
+                not keyword or keyword in hits for keyword in self.safe_indicators
+            ),
+            "modification_type": _first_group(
+                hits, self.modification_keywords, self.default_modification
+            ),
+        }
+
+    def classify(self, message: str) -> str:
+        hits, newlines = self._scan(message)
+        return self._classify(message, hits, newlines)
+
+    def _scan(self, message: str) -> Tuple[Dict[str, List[int]], List[int]]:
+        hits: Dict[str, List[int]] = {}
+        newlines: List[int] = []
+        for found in self._scanner.finditer(message):
+            literal = found.group(1)
+            start = found.start()
+            if literal == "\n":
+                newlines.append(start)
+                continue
+            hits.setdefault(literal, []).append(start)
+            for prefix in self._prefixes[literal]:
+                hits.setdefault(prefix, []).append(start)
+        return hits, newlines
+
+    def _classify(
+        self, message: str, hits: Dict[str, List[int]], newlines: List[int]
+    ) -> str:
+        for intent, patterns in self.intent_patterns:
+            for pattern in patterns:
+                if isinstance(pattern, tuple):
+                    if _chain_matches(pattern, hits, newlines):
+                        return intent
+                elif pattern.search(message):
+                    return intent
+        return self.default_intent
+
+
+@lru_cache(maxsize=16)
+def _cached_matcher(
+    intent_patterns: Tuple[Tuple[str, Tuple[str, ...]], ...],
+    style_keywords: KeywordGroups,
+    safe_indicators: Tuple[str, ...],
+    modification_keywords: KeywordGroups,
+) -> IntentMatcher:
+    return IntentMatcher(
+        dict(intent_patterns),
+        dict(style_keywords),
+        safe_indicators,
+        dict(modification_keywords),
+    )
+
+
+def compile_matcher(
+    intent_patterns: Mapping[str, Sequence[str]],
+    style_keywords: Mapping[str, Sequence[str]],
+    safe_indicators: Sequence[str],
+    modification_keywords: Mapping[str, Sequence[str]],
+) -> IntentMatcher:
+    """Return a matcher for these tables, compiling it once per process."""
+    return _cached_matcher(
+        _keyword_groups(intent_patterns),
+        _keyword_groups(style_keywords),
+        tuple(safe_indicators),
+        _keyword_groups(modification_keywords),
+    )
+
+
+def _keyword_groups(groups: Mapping[str, Sequence[str]]) -> KeywordGroups:
+    return tuple((name, tuple(keywords)) for name, keywords in groups.items())
+
+
+def _first_group(
+    hits: Dict[str, List[int]], groups: KeywordGroups, default: str
+) -> str:
+    for name, keywords in groups:
+        if any(not keyword or keyword in hits for keyword in keywords):
+            return name
+    return default
+
+
+def _chain_matches(
+    chain: Chain, hits: Dict[str, List[int]], newlines: List[int]
+) -> bool:
+    first = hits.get(chain[0])
+    if not first:
+        return False
+    if len(chain) == 1:
+        return True
+
+    line_end = -1
+    for start in first:
+        # Only the earliest occurrence on each line needs to be tried.
+        if start < line_end:
+            continue
+        line = bisect_right(newlines, start)
+        line_end = newlines[line] if line < len(newlines) else sys.maxsize
+
+        position = start + len(chain[0])
+        for literal in chain[1:]:
+            occurrences = hits.get(literal)
+            if not occurrences:
+                return False
+            index = bisect_left(occurrences, position)
+            if index == len(occurrences) or occurrences[index] >= line_end:
+                break
+            position = occurrences[index] + len(literal)
+        else:
+            return True
+    return False
@@ -1,12 +1,48 @@
-import re
-from typing import Any, Dict
+import contextlib
+from typing import Any, ContextManager, Dict, List, Optional, Sequence, Tuple
 
 from loguru import logger
 
+from .embedding_classifier import EmbeddingIntentClassifier
+from .intent_matcher import IntentMatcher, compile_matcher
+
+STYLE_KEYWORDS = {
+    "artistic": ["artistic", "art", "painting"],
+    "realistic": ["realistic", "photo", "photograph"],
+    "anime": ["anime", "manga", "cartoon"],
+    "abstract": ["abstract", "surreal"],
+}
+
+SAFE_INDICATORS = ["safe", "work", "family", "clean", "appropriate"]
+
+MODIFICATION_KEYWORDS = {
+    "color_adjustment": ["color", "colour"],
+    "brightness_adjustment": ["bright", "dark"],
+    "background_change": ["background"],
+}
+
+
+DEFAULT_CONFIDENCE = 0.8
+
 
 class IntentProcessor:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        classifier: Optional[EmbeddingIntentClassifier] = None,
+        metrics: Optional[Any] = None,
+    ) -> None:
+        self.classifier = classifier
+        self.metrics = metrics
         self.intent_patterns = {
+            # Checked first, and only for a bare command, so prompts such as
+            # "stop sign at dusk" still read as a generation.
+            "cancel": [
+                r"^\s*(?:please\s+)?(?:cancel|stop|abort)"
+                r"(?:\s+(?:it|that|this|generating|(?:the\s+)?"
+                r"(?:generation|image|job|request)))?"
+                r"(?:\s+please)?\s*[.!]*\s*$",
+                r"^\s*never\s*mind\s*[.!]*\s*$",
+            ],
             "image_generation": [
                 r"generate.*image",
                 r"create.*picture",
@@ -29,40 +65,91 @@ class IntentProcessor:
                 r"family.*friendly",
             ],
         }
+        self._matcher: Optional[IntentMatcher] = None
+
+    @property
+    def matcher(self) -> IntentMatcher:
+        if self._matcher is None:
+            self._matcher = compile_matcher(
+                self.intent_patterns,
+                STYLE_KEYWORDS,
+                SAFE_INDICATORS,
+                MODIFICATION_KEYWORDS,
+            )
+        return self._matcher
 
     async def process(self, message: str) -> Dict[str, Any]:
-        message_lower = message.lower()
-
-        intent = self._classify_intent(message_lower)
-        parameters = self._extract_parameters(message_lower, intent)
-
-        return {
-            "intent": intent,
-            "parameters": parameters,
-            "original_message": message,
-            "confidence": 0.8,
-        }
+        return (await self.process_batch([message]))[0]
+
+    async def process_batch(self, messages: Sequence[str]) -> List[Dict[str, Any]]:
+        with self._stage("intent"):
+            return self._process_batch(messages)
+
+    def _stage(self, stage: str) -> ContextManager[Any]:
+        if self.metrics is None:
+            return contextlib.nullcontext()
+        timer: ContextManager[Any] = self.metrics.stage(stage)
+        return timer
+
+    def _process_batch(self, messages: Sequence[str]) -> List[Dict[str, Any]]:
+        lowered = [message.lower() for message in messages]
+        scores = self.classifier.score(lowered) if self.classifier else None
+
+        results = []
+        for row, (message, message_lower) in enumerate(zip(messages, lowered)):
+            match = self.matcher.match(message_lower)
+            intent, confidence = self._resolve_intent(
+                match["intent"], scores[row] if scores is not None else None
+            )
+            logger.debug(f"Classified intent as: {intent} ({confidence:.2f})")
+            results.append(
+                {
+                    "intent": intent,
+                    "parameters": self._extract_parameters(
+                        message_lower, intent, match
+                    ),
+                    "original_message": message,
+                    "confidence": confidence,
+                }
+            )
+        return results
+
+    def _resolve_intent(
+        self, matched_intent: str, scores: Optional[Sequence[float]]
+    ) -> Tuple[str, float]:
+        # Pattern matches win; the classifier only rescues messages the
+        # patterns fell through on, and reports how sure it is either way.
+        if self.classifier is None or scores is None:
+            return matched_intent, DEFAULT_CONFIDENCE
+
+        intents = self.classifier.intents
+        if matched_intent == "general":
+            best = max(range(len(intents)), key=lambda index: scores[index])
+            if scores[best] >= self.classifier.min_confidence:
+                return intents[best], float(scores[best])
+        if matched_intent in intents:
+            return matched_intent, float(scores[intents.index(matched_intent)])
+        return matched_intent, DEFAULT_CONFIDENCE
 
     def _classify_intent(self, message: str) -> str:
-        for intent, patterns in self.intent_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, message):
-                    logger.info(f"Classified intent as: {intent}")
-                    return intent
-
-        logger.info("No specific intent classified, defaulting to general")
-        return "general"
+        intent = self.matcher.classify(message)
+        logger.debug(f"Classified intent as: {intent}")
+        return intent
 
-    def _extract_parameters(self, message: str, intent: str) -> Dict[str, Any]:
+    def _extract_parameters(
+        self, message: str, intent: str, match: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         parameters = {}
+        if match is None:
+            match = self.matcher.match(message)
 
         if intent == "image_generation":
             parameters["prompt"] = self._extract_prompt(message)
-            parameters["style"] = self._extract_style(message)
-            parameters["nsfw_filter"] = str(self._should_apply_nsfw_filter(message))
+            parameters["style"] = match["style"]
+            parameters["nsfw_filter"] = str(match["nsfw_filter"])
 
         elif intent == "image_modification":
-            parameters["modification_type"] = self._extract_modification_type(message)
+            parameters["modification_type"] = match["modification_type"]
             parameters["prompt"] = self._extract_prompt(message)
 
         return parameters
@@ -79,30 +166,10 @@ class IntentProcessor:
         return message.strip()
 
     def _extract_style(self, message: str) -> str:
-        style_keywords = {
-            "artistic": ["artistic", "art", "painting"],
-            "realistic": ["realistic", "photo", "photograph"],
-            "anime": ["anime", "manga", "cartoon"],
-            "abstract": ["abstract", "surreal"],
-        }
-
-        for style, keywords in style_keywords.items():
-            for keyword in keywords:
-                if keyword in message:
-                    return style
-
-        return "default"
+        return str(self.matcher.match(message)["style"])
 
     def _should_apply_nsfw_filter(self, message: str) -> bool:
-        safe_indicators = ["safe", "work", "family", "clean", "appropriate"]
-        return any(indicator in message for indicator in safe_indicators)
+        return bool(self.matcher.match(message)["nsfw_filter"])
 
     def _extract_modification_type(self, message: str) -> str:
-        if "color" in message or "colour" in message:
-            return "color_adjustment"
-        elif "bright" in message or "dark" in message:
-            return "brightness_adjustment"
-        elif "background" in message:
-            return "background_change"
-        else:
-            return "general_modification"
+        return str(self.matcher.match(message)["modification_type"])
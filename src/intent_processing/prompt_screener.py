@@ -0,0 +1,261 @@
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+ALLOW = "allow"
+FILTER = "filter"
+BLOCK = "block"
+
+# Weight of each term: the chance, on its own, that a prompt using it asks
+# for sexual content. Plurals are matched too.
+SEXUAL_TERMS: Dict[str, float] = {
+    "porn": 0.95,
+    "porno": 0.95,
+    "pornographic": 0.95,
+    "pornography": 0.95,
+    "hentai": 0.95,
+    "xxx": 0.95,
+    "genitals": 0.95,
+    "genitalia": 0.95,
+    "sex act": 0.95,
+    "intercourse": 0.9,
+    "sex": 0.85,
+    "sexual": 0.8,
+    "erotica": 0.8,
+    "nude": 0.75,
+    "naked": 0.75,
+    "nudity": 0.75,
+    "topless": 0.75,
+    "erotic": 0.75,
+    "lewd": 0.75,
+    "nsfw": 0.75,
+    "fetish": 0.7,
+    "undressed": 0.7,
+    "explicit": 0.6,
+    "sexy": 0.5,
+    "seductive": 0.4,
+    "lingerie": 0.4,
+}
+
+# Any of these next to a sexual term is refused whatever the thresholds.
+MINOR_TERMS = (
+    "child",
+    "children",
+    "kid",
+    "minor",
+    "underage",
+    "preteen",
+    "teen",
+    "teenage",
+    "teenager",
+    "schoolgirl",
+    "schoolboy",
+    "toddler",
+    "infant",
+    "baby",
+    "loli",
+    "lolita",
+    "shota",
+    "young girl",
+    "young boy",
+    "little girl",
+    "little boy",
+)
+
+# "no nudity", "without nsfw": asking for less, not more.
+NEGATIONS = frozenset(["no", "not", "non", "without", "never", "avoid", "anti"])
+
+SCREENING_EXAMPLES: Dict[str, List[str]] = {
+    "explicit": [
+        "explicit adult content",
+        "pornographic scene",
+        "naked woman on a bed",
+        "nude body full frontal",
+        "erotic photo shoot",
+        "sexual scene between two people",
+        "topless model posing",
+        "lewd anime girl",
+        "uncensored adult art",
+        "strip tease photo",
+    ],
+    "safe": [
+        "a cat sitting on a windowsill",
+        "mountain landscape at sunset",
+        "portrait of an old sailor",
+        "a futuristic city at night",
+        "a bowl of fruit on a table",
+        "a dragon flying over a castle",
+        "a family having a picnic in the park",
+        "a woman in a summer dress walking on the beach",
+        "anime girl with a sword",
+        "a logo with a fox",
+    ],
+}
+
+_LEET = str.maketrans(
+    {"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "@": "a", "$": "s"}
+)
+_INVISIBLE = dict.fromkeys(map(ord, "\u00ad\u200b\u200c\u200d\u2060\ufeff"))
+_SEPARATORS = re.compile(r"[\W_]+")
+_SPACED_LETTERS = re.compile(r"\b(?:\w ){2,}\w\b")
+
+
+def normalize_prompt(text: str) -> str:
+    """Fold a prompt to the form the term lists are written in.
+
+    Unicode compatibility forms, accents, invisible characters, case,
+    common digit/symbol substitutions and punctuation are folded away.
+    Spelled-out words (``n.u.d.e``, ``n u d e``) are appended joined back
+    together.
+    """
+    decomposed = unicodedata.normalize("NFKD", text).translate(_INVISIBLE)
+    folded = "".join(
+        char for char in decomposed if not unicodedata.combining(char)
+    ).casefold()
+    words = _SEPARATORS.sub(" ", folded.translate(_LEET)).strip()
+    spelled = []
+    for found in _SPACED_LETTERS.finditer(words):
+        letters = found.group(0).split()
+        spelled.append("".join(letters))
+        # "draw a n u d e": the article isn't part of the word.
+        if letters[0] in ("a", "i"):
+            spelled.append("".join(letters[1:]))
+    return " ".join([words, *spelled])
+
+
+class ScreeningVerdict:
+    """What to do with a prompt: ``allow`` it, ``filter`` it (run the NSFW
+    filtered workflow) or ``block`` it, with the score and the terms that
+    decided it."""
+
+    __slots__ = ("action", "score", "terms", "reason")
+
+    def __init__(
+        self,
+        action: str,
+        score: float,
+        terms: Tuple[str, ...] = (),
+        reason: Optional[str] = None,
+    ) -> None:
+        self.action = action
+        self.score = score
+        self.terms = terms
+        self.reason = reason
+
+    @property
+    def blocked(self) -> bool:
+        return self.action == BLOCK
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "action": self.action,
+            "score": round(self.score, 3),
+            "terms": list(self.terms),
+            "reason": self.reason,
+        }
+
+
+class PromptScreener:
+    """Cheap CPU screening of generation prompts before they are queued.
+
+    The normalised prompt is scanned once with a single compiled
+    alternation of every term; the weights of the terms found (ignoring
+    negated ones) combine into a score, ``1 - prod(1 - weight)``. A score of
+    ``block_threshold`` or more blocks the prompt, ``filter_threshold`` or
+    more routes it through the NSFW filtered workflow, and a minor together
+    with any sexual term is always blocked.
+
+    The optional ``classifier`` (an ``EmbeddingIntentClassifier`` trained on
+    examples with an ``explicit`` label, e.g. ``SCREENING_EXAMPLES``) catches
+    wording the term lists miss. It can only ask for the filter, never block
+    on its own. Verdicts are kept in an LRU cache of ``cache_size`` prompts.
+    """
+
+    def __init__(
+        self,
+        filter_threshold: float = 0.7,
+        block_threshold: float = 0.9,
+        classifier: Optional[Any] = None,
+        cache_size: int = 4096,
+        terms: Optional[Mapping[str, float]] = None,
+        minor_terms: Sequence[str] = MINOR_TERMS,
+    ) -> None:
+        self.filter_threshold = filter_threshold
+        self.block_threshold = block_threshold
+        self.classifier = classifier
+        self.cache_size = cache_size
+        self.terms = dict(terms if terms is not None else SEXUAL_TERMS)
+        self.minor_terms = frozenset(minor_terms)
+        self._explicit_index = (
+            classifier.intents.index("explicit")
+            if classifier is not None and "explicit" in classifier.intents
+            else None
+        )
+        # Longest first, so "sex act" wins over "sex" at the same position.
+        ordered = sorted(
+            {*self.terms, *self.minor_terms}, key=lambda term: (-len(term), term)
+        )
+        self._scanner = re.compile(
+            r"\b(" + "|".join(re.escape(term) for term in ordered) + r")(?:e?s)?\b"
+        )
+        self._cache: "OrderedDict[str, ScreeningVerdict]" = OrderedDict()
+        self._counters = {
+            "screened": 0,
+            "cache_hits": 0,
+            "allowed": 0,
+            "filtered": 0,
+            "blocked": 0,
+        }
+
+    def screen(self, prompt: str) -> ScreeningVerdict:
+        self._counters["screened"] += 1
+        verdict = self._cache.get(prompt)
+        if verdict is not None:
+            self._cache.move_to_end(prompt)
+            self._counters["cache_hits"] += 1
+        else:
+            verdict = self._screen(prompt)
+            self._cache[prompt] = verdict
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        self._counters[
+            {ALLOW: "allowed", FILTER: "filtered", BLOCK: "blocked"}[verdict.action]
+        ] += 1
+        return verdict
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cached": len(self._cache), **self._counters}
+
+    def _screen(self, prompt: str) -> ScreeningVerdict:
+        text = normalize_prompt(prompt)
+        found = self._find_terms(text)
+        sexual = tuple(term for term in found if term in self.terms)
+
+        if sexual and any(term in self.minor_terms for term in found):
+            return ScreeningVerdict(BLOCK, 1.0, found, "minor")
+
+        remaining = 1.0
+        for term in sexual:
+            remaining *= 1.0 - self.terms[term]
+        score = 1.0 - remaining
+        if score >= self.block_threshold:
+            return ScreeningVerdict(BLOCK, score, sexual, "terms")
+        if score >= self.filter_threshold:
+            return ScreeningVerdict(FILTER, score, sexual, "terms")
+
+        if self._explicit_index is not None:
+            assert self.classifier is not None
+            explicit = float(self.classifier.score([text])[0][self._explicit_index])
+            if explicit >= self.filter_threshold:
+                return ScreeningVerdict(FILTER, explicit, sexual, "classifier")
+        return ScreeningVerdict(ALLOW, score, sexual)
+
+    def _find_terms(self, text: str) -> Tuple[str, ...]:
+        found: Dict[str, None] = {}
+        for match in self._scanner.finditer(text):
+            previous = text[: match.start()].rsplit(None, 2)[-2:]
+            if any(word in NEGATIONS for word in previous):
+                continue
+            found[match.group(1)] = None
+        return tuple(found)
@@ -0,0 +1,15 @@
+from .broker import InMemoryBroker, broker_from_url, new_job
+from .generation_worker import GenerationWorker
+from .redis_broker import RedisBroker
+from .remote_orchestrator import RemoteOrchestrator
+from .sqlite_broker import SQLiteBroker
+
+__all__ = [
+    "GenerationWorker",
+    "InMemoryBroker",
+    "RedisBroker",
+    "RemoteOrchestrator",
+    "SQLiteBroker",
+    "broker_from_url",
+    "new_job",
+]
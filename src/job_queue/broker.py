@@ -0,0 +1,162 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Set
+
+from loguru import logger
+
+EVENT = "event"
+RESULT = "result"
+
+
+def new_job(
+    parameters: Dict[str, Any],
+    reply_to: str,
+    origin: Optional[Dict[str, Any]] = None,
+    stream: bool = False,
+) -> Dict[str, Any]:
+    """A generation job as it travels through a broker (JSON-serialisable)."""
+    return {
+        "job_id": uuid.uuid4().hex,
+        "reply_to": reply_to,
+        "parameters": parameters,
+        "origin": origin,
+        "stream": stream,
+        "created_at": time.time(),
+    }
+
+
+def broker_from_url(url: str, **options: Any) -> Any:
+    """Build a broker from ``memory://``, ``sqlite:///path`` or ``redis://``."""
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        from .redis_broker import RedisBroker
+
+        return RedisBroker.from_url(url, **options)
+    if url.startswith("sqlite:///"):
+        from .sqlite_broker import SQLiteBroker
+
+        return SQLiteBroker(url[len("sqlite:///") :], **options)
+    if url in ("", "memory://"):
+        return InMemoryBroker(**options)
+    raise ValueError(f"Unsupported broker URL: {url}")
+
+
+class InMemoryBroker:
+    """Job queue and reply channels for front-ends and workers in one process.
+
+    The reference for the broker interface the SQLite and Redis brokers
+    share: front-ends ``push`` jobs and read their ``replies``; workers
+    ``claim`` jobs under a lease of ``lease`` seconds, renew it with
+    ``heartbeat`` and ``finish`` them, which sends the result to the job's
+    reply channel. A job whose lease runs out (its worker died) is handed to
+    the next ``claim``. ``push`` refuses jobs once ``max_pending`` wait.
+    """
+
+    def __init__(self, lease: float = 60.0, max_pending: Optional[int] = None) -> None:
+        self.lease = lease
+        self.max_pending = max_pending
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._claimed: Dict[str, Dict[str, Any]] = {}
+        self._leases: Dict[str, float] = {}
+        self._cancelled: Set[str] = set()
+        self._replies: Dict[str, List[Dict[str, Any]]] = {}
+        self._changed: Optional[asyncio.Condition] = None
+        self._counters = {"pushed": 0, "claimed": 0, "finished": 0, "requeued": 0}
+
+    async def push(self, job: Dict[str, Any]) -> bool:
+        if self.max_pending is not None and len(self._pending) >= self.max_pending:
+            return False
+        self._pending.append(job)
+        self._counters["pushed"] += 1
+        await self._notify()
+        return True
+
+    async def claim(self, worker_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        changed = self._condition()
+        async with changed:
+            try:
+                await asyncio.wait_for(
+                    changed.wait_for(lambda: self._requeue_expired() or self._pending),
+                    timeout,
+                )
+            except asyncio.TimeoutError:
+                return None
+            job = self._pending.popleft()
+        self._claimed[job["job_id"]] = job
+        self._leases[job["job_id"]] = time.monotonic() + self.lease
+        self._counters["claimed"] += 1
+        return job
+
+    async def heartbeat(self, worker_id: str, job_ids: Sequence[str]) -> Set[str]:
+        deadline = time.monotonic() + self.lease
+        for job_id in job_ids:
+            if job_id in self._leases:
+                self._leases[job_id] = deadline
+        return {job_id for job_id in job_ids if job_id in self._cancelled}
+
+    async def reply(self, reply_to: str, message: Dict[str, Any]) -> None:
+        self._replies.setdefault(reply_to, []).append(message)
+        await self._notify()
+
+    async def finish(self, job: Dict[str, Any], result: Dict[str, Any]) -> None:
+        job_id = job["job_id"]
+        self._claimed.pop(job_id, None)
+        self._leases.pop(job_id, None)
+        self._cancelled.discard(job_id)
+        self._counters["finished"] += 1
+        await self.reply(
+            job["reply_to"], {"job_id": job_id, "type": RESULT, "data": result}
+        )
+
+    async def replies(self, reply_to: str, timeout: float) -> List[Dict[str, Any]]:
+        changed = self._condition()
+        async with changed:
+            try:
+                await asyncio.wait_for(
+                    changed.wait_for(lambda: bool(self._replies.get(reply_to))),
+                    timeout,
+                )
+            except asyncio.TimeoutError:
+                return []
+            return self._replies.pop(reply_to)
+
+    async def cancel(self, job_id: str) -> None:
+        """Drop a waiting job, or ask the worker running it to stop."""
+        for job in self._pending:
+            if job["job_id"] == job_id:
+                self._pending.remove(job)
+                return
+        if job_id in self._claimed:
+            self._cancelled.add(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "claimed": len(self._claimed),
+            **self._counters,
+        }
+
+    async def close(self) -> None:
+        pass
+
+    def _condition(self) -> asyncio.Condition:
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    async def _notify(self) -> None:
+        changed = self._condition()
+        async with changed:
+            changed.notify_all()
+
+    def _requeue_expired(self) -> bool:
+        now = time.monotonic()
+        expired = [job_id for job_id, until in self._leases.items() if until < now]
+        for job_id in expired:
+            del self._leases[job_id]
+            self._cancelled.discard(job_id)
+            self._pending.appendleft(self._claimed.pop(job_id))
+            self._counters["requeued"] += 1
+            logger.warning(f"Lease on job {job_id} expired, requeueing it")
+        return bool(expired)
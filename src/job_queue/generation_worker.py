@@ -0,0 +1,160 @@
+import asyncio
+import uuid
+from functools import partial
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from .broker import EVENT
+
+
+class GenerationWorker:
+    """Runs generation jobs claimed from a broker on a local orchestrator.
+
+    At most ``concurrency`` jobs run at once; a worker only claims a job when
+    it has a free slot, so a busy worker leaves work for idle ones. Every
+    ``heartbeat_interval`` seconds the leases of running jobs are renewed,
+    and jobs their front-end cancelled meanwhile are stopped.
+    """
+
+    def __init__(
+        self,
+        broker: Any,
+        orchestrator: Any,
+        concurrency: int = 3,
+        claim_timeout: float = 1.0,
+        heartbeat_interval: float = 10.0,
+    ) -> None:
+        self.broker = broker
+        self.orchestrator = orchestrator
+        self.concurrency = max(1, concurrency)
+        self.claim_timeout = claim_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_id = uuid.uuid4().hex
+        self._running: Dict[str, "asyncio.Task[None]"] = {}
+        self._stopping = False
+        self._counters = {"completed": 0, "failed": 0, "cancelled": 0}
+
+    async def run(self) -> None:
+        """Claim and run jobs until ``stop`` is called."""
+        logger.info(
+            f"Generation worker {self.worker_id} started "
+            f"(concurrency {self.concurrency})"
+        )
+        slots = asyncio.Semaphore(self.concurrency)
+        heartbeat = asyncio.ensure_future(self._heartbeat())
+        try:
+            while not self._stopping:
+                await slots.acquire()
+                try:
+                    job = await self.broker.claim(self.worker_id, self.claim_timeout)
+                except Exception as e:
+                    logger.error(f"Error claiming generation job: {e}")
+                    job = None
+                    await asyncio.sleep(self.claim_timeout)
+                if job is None or self._stopping:
+                    slots.release()
+                    continue
+                task = asyncio.ensure_future(self._run_job(job))
+                self._running[job["job_id"]] = task
+                task.add_done_callback(partial(self._done, job["job_id"], slots))
+        finally:
+            heartbeat.cancel()
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Stop claiming and give running jobs ``timeout`` seconds to finish.
+
+        Jobs still running after that are abandoned to their lease, so
+        another worker picks them up.
+        """
+        self._stopping = True
+        tasks = list(self._running.values())
+        if not tasks:
+            return
+        _, unfinished = await asyncio.wait(tasks, timeout=timeout)
+        for task in unfinished:
+            task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "running": len(self._running),
+            "concurrency": self.concurrency,
+            **self._counters,
+        }
+
+    async def _run_job(self, job: Dict[str, Any]) -> None:
+        events: Optional["asyncio.Queue[Dict[str, Any]]"] = None
+        forwarder: Optional["asyncio.Task[None]"] = None
+        options: Dict[str, Any] = {}
+        if job.get("stream"):
+            events = asyncio.Queue()
+            forwarder = asyncio.ensure_future(self._forward_events(job, events))
+            options["on_event"] = events.put_nowait
+        if job.get("origin"):
+            options["origin"] = job["origin"]
+
+        try:
+            result = await self.orchestrator.execute_generation(
+                job["parameters"], **options
+            )
+        except asyncio.CancelledError:
+            if self._stopping:
+                if forwarder is not None:
+                    forwarder.cancel()
+                raise
+            # Cancelled by its front-end: nobody reads the result.
+            self._counters["cancelled"] += 1
+            result = {"error": "Generation cancelled", "cancelled": True}
+        except Exception as e:
+            logger.error(f"Generation job {job['job_id']} failed: {e}")
+            result = {"error": str(e)}
+
+        if events is not None and forwarder is not None:
+            # Progress goes out before the result.
+            await events.join()
+            forwarder.cancel()
+        self._counters["failed" if "error" in result else "completed"] += 1
+        try:
+            await self.broker.finish(job, result)
+        except Exception as e:
+            logger.error(f"Error returning result of job {job['job_id']}: {e}")
+
+    async def _forward_events(
+        self, job: Dict[str, Any], events: "asyncio.Queue[Dict[str, Any]]"
+    ) -> None:
+        while True:
+            event = await events.get()
+            try:
+                await self.broker.reply(
+                    job["reply_to"],
+                    {"job_id": job["job_id"], "type": EVENT, "data": event},
+                )
+            except Exception as e:
+                logger.debug(f"Dropped event for job {job['job_id']}: {e}")
+            finally:
+                events.task_done()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if not self._running:
+                continue
+            try:
+                cancelled = await self.broker.heartbeat(
+                    self.worker_id, list(self._running)
+                )
+            except Exception as e:
+                logger.error(f"Error renewing generation job leases: {e}")
+                continue
+            for job_id in cancelled:
+                task = self._running.get(job_id)
+                if task is not None:
+                    logger.info(f"Job {job_id} was cancelled by its front-end")
+                    task.cancel()
+
+    def _done(
+        self, job_id: str, slots: asyncio.Semaphore, task: "asyncio.Task[None]"
+    ) -> None:
+        self._running.pop(job_id, None)
+        slots.release()
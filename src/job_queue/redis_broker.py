@@ -0,0 +1,198 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from loguru import logger
+
+from .broker import RESULT
+
+# Move a job from the processing list back to the queue, unless it already
+# left the processing list (finished meanwhile).
+REQUEUE_SCRIPT = """
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) > 0 then
+    redis.call('RPUSH', KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+
+class RedisBroker:
+    """Broker on Redis, for front-ends and workers spread over several hosts.
+
+    Job ids wait in a list next to their payloads. Claiming moves the id
+    atomically into a processing list (``BLMOVE``, Redis 6.2+), and its lease
+    deadline then goes into a sorted set. Before it claims, any worker leases
+    processing jobs that have no lease yet (their worker died right after
+    the move) and requeues the ones whose lease ran out, so no job is lost
+    between the two steps. Each front-end reads its replies from its own
+    list with ``BLPOP``, so results come back without polling.
+    """
+
+    def __init__(
+        self,
+        redis: Any,
+        prefix: str = "chat_ai",
+        lease: float = 60.0,
+        max_pending: Optional[int] = None,
+        reply_ttl: float = 3600.0,
+        job_ttl: float = 24 * 3600.0,
+    ) -> None:
+        self.redis = redis
+        self.prefix = prefix
+        self.lease = lease
+        self.max_pending = max_pending
+        self.reply_ttl = reply_ttl
+        self.job_ttl = job_ttl
+        self._queue = f"{prefix}:queue"
+        self._processing = f"{prefix}:processing"
+        self._leases = f"{prefix}:leases"
+        self._cancelled = f"{prefix}:cancelled"
+        self._counters = {"pushed": 0, "claimed": 0, "finished": 0, "requeued": 0}
+        self._requeue = redis.register_script(REQUEUE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str, **options: Any) -> "RedisBroker":
+        import redis.asyncio
+
+        return cls(redis.asyncio.Redis.from_url(url, decode_responses=True), **options)
+
+    async def push(self, job: Dict[str, Any]) -> bool:
+        if self.max_pending is not None:
+            if await self.redis.llen(self._queue) >= self.max_pending:
+                return False
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(
+                self._job_key(job["job_id"]),
+                json.dumps(job, default=str),
+                ex=int(self.job_ttl),
+            )
+            pipe.lpush(self._queue, job["job_id"])
+            await pipe.execute()
+        self._counters["pushed"] += 1
+        return True
+
+    async def claim(self, worker_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        await self._requeue_expired()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            job_id = await self.redis.blmove(
+                self._queue, self._processing, remaining, src="RIGHT", dest="LEFT"
+            )
+            if job_id is None:
+                return None
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.zadd(self._leases, {job_id: time.time() + self.lease})
+                pipe.get(self._job_key(job_id))
+                _, payload = await pipe.execute()
+            if payload is None:
+                # Expired while it waited.
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.zrem(self._leases, job_id)
+                    pipe.lrem(self._processing, 1, job_id)
+                    await pipe.execute()
+                continue
+            self._counters["claimed"] += 1
+            job: Dict[str, Any] = json.loads(payload)
+            return job
+
+    async def heartbeat(self, worker_id: str, job_ids: Sequence[str]) -> Set[str]:
+        if not job_ids:
+            return set()
+        deadline = time.time() + self.lease
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(self._leases, {job_id: deadline for job_id in job_ids}, xx=True)
+            for job_id in job_ids:
+                pipe.sismember(self._cancelled, job_id)
+            results = await pipe.execute()
+        return {job_id for job_id, hit in zip(job_ids, results[1:]) if hit}
+
+    async def reply(self, reply_to: str, message: Dict[str, Any]) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            self._queue_reply(pipe, reply_to, message)
+            await pipe.execute()
+
+    async def finish(self, job: Dict[str, Any], result: Dict[str, Any]) -> None:
+        job_id = job["job_id"]
+        async with self.redis.pipeline(transaction=True) as pipe:
+            self._queue_reply(
+                pipe,
+                job["reply_to"],
+                {"job_id": job_id, "type": RESULT, "data": result},
+            )
+            pipe.zrem(self._leases, job_id)
+            pipe.lrem(self._processing, 1, job_id)
+            pipe.srem(self._cancelled, job_id)
+            pipe.delete(self._job_key(job_id))
+            await pipe.execute()
+        self._counters["finished"] += 1
+
+    async def replies(self, reply_to: str, timeout: float) -> List[Dict[str, Any]]:
+        key = self._reply_key(reply_to)
+        popped = await self.redis.blpop([key], timeout=max(timeout, 0.01))
+        if popped is None:
+            return []
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrange(key, 0, -1)
+            pipe.delete(key)
+            rest, _ = await pipe.execute()
+        return [json.loads(message) for message in [popped[1], *rest]]
+
+    async def cancel(self, job_id: str) -> None:
+        """Drop a waiting job, or ask the worker running it to stop."""
+        if await self.redis.lrem(self._queue, 0, job_id):
+            await self.redis.delete(self._job_key(job_id))
+            return
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.sadd(self._cancelled, job_id)
+            pipe.expire(self._cancelled, int(self.job_ttl))
+            await pipe.execute()
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._counters)
+
+    async def close(self) -> None:
+        # redis-py 5 renamed close() to aclose().
+        close = getattr(self.redis, "aclose", None) or self.redis.close
+        await close()
+
+    async def _requeue_expired(self) -> None:
+        processing = await self.redis.lrange(self._processing, 0, -1)
+        if processing:
+            # Jobs whose worker died between BLMOVE and ZADD have no lease
+            # yet: give them one, so they expire like any other.
+            await self.redis.zadd(
+                self._leases,
+                {job_id: time.time() + self.lease for job_id in processing},
+                nx=True,
+            )
+        expired = await self.redis.zrangebyscore(self._leases, "-inf", time.time())
+        for job_id in expired:
+            # Only the worker whose ZREM succeeds requeues the job.
+            if not await self.redis.zrem(self._leases, job_id):
+                continue
+            if await self.redis.srem(self._cancelled, job_id):
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.lrem(self._processing, 1, job_id)
+                    pipe.delete(self._job_key(job_id))
+                    await pipe.execute()
+                continue
+            if await self._requeue(keys=[self._processing, self._queue], args=[job_id]):
+                self._counters["requeued"] += 1
+                logger.warning(f"Lease on job {job_id} expired, requeueing it")
+
+    def _queue_reply(self, pipe: Any, reply_to: str, message: Dict[str, Any]) -> None:
+        key = self._reply_key(reply_to)
+        pipe.rpush(key, json.dumps(message, default=str))
+        pipe.expire(key, int(self.reply_ttl))
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}:job:{job_id}"
+
+    def _reply_key(self, reply_to: str) -> str:
+        return f"{self.prefix}:reply:{reply_to}"
@@ -0,0 +1,110 @@
+import asyncio
+import uuid
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from loguru import logger
+
+from .broker import EVENT, RESULT, new_job
+
+EventCallback = Callable[[Dict[str, Any]], None]
+
+
+class RemoteOrchestrator:
+    """Stands in for ``WorkflowOrchestrator`` in a front-end process.
+
+    ``execute_generation`` pushes the job to ``broker`` and waits for a
+    ``GenerationWorker`` to send the result back on this process's reply
+    channel; progress events travel the same way when ``on_event`` is given.
+    Cancelling the caller cancels the job in the broker, and a job without a
+    result after ``result_timeout`` seconds is cancelled and reported as
+    timed out.
+    """
+
+    def __init__(
+        self,
+        broker: Any,
+        result_timeout: float = 900.0,
+        poll_timeout: float = 1.0,
+    ) -> None:
+        self.broker = broker
+        self.result_timeout = result_timeout
+        self.poll_timeout = poll_timeout
+        self.reply_to = uuid.uuid4().hex
+        self._waiters: Dict[
+            str, Tuple["asyncio.Future[Dict[str, Any]]", Optional[EventCallback]]
+        ] = {}
+        self._reader: Optional["asyncio.Task[None]"] = None
+        self._cancellations: Set["asyncio.Task[None]"] = set()
+        self._counters = {"submitted": 0, "rejected": 0, "timed_out": 0}
+
+    async def execute_generation(
+        self,
+        parameters: Dict[str, Any],
+        on_event: Optional[EventCallback] = None,
+        origin: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        job = new_job(parameters, self.reply_to, origin, stream=on_event is not None)
+        job_id = job["job_id"]
+        future: "asyncio.Future[Dict[str, Any]]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        self._waiters[job_id] = (future, on_event)
+        self._start_reader()
+        try:
+            if not await self.broker.push(job):
+                self._counters["rejected"] += 1
+                return {"error": "Generation queue is full", "busy": True}
+            self._counters["submitted"] += 1
+            return await asyncio.wait_for(future, self.result_timeout)
+        except asyncio.TimeoutError:
+            self._counters["timed_out"] += 1
+            logger.error(f"No result for job {job_id} after {self.result_timeout}s")
+            await self.broker.cancel(job_id)
+            return {"error": "Timeout waiting for a generation worker", "timeout": True}
+        except asyncio.CancelledError:
+            # Don't await the broker in a task that is being cancelled.
+            task = asyncio.ensure_future(self.broker.cancel(job_id))
+            self._cancellations.add(task)
+            task.add_done_callback(self._cancellations.discard)
+            raise
+        finally:
+            self._waiters.pop(job_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"waiting": len(self._waiters), **self._counters}
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+
+    def _start_reader(self) -> None:
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.ensure_future(self._read_replies())
+
+    async def _read_replies(self) -> None:
+        while True:
+            try:
+                messages = await self.broker.replies(self.reply_to, self.poll_timeout)
+            except Exception as e:
+                logger.error(f"Error reading generation replies: {e}")
+                await asyncio.sleep(self.poll_timeout)
+                continue
+            for message in messages:
+                self._dispatch(message)
+
+    def _dispatch(self, message: Dict[str, Any]) -> None:
+        waiter = self._waiters.get(message.get("job_id", ""))
+        if waiter is None:
+            # The caller gave up on this job.
+            return
+        future, on_event = waiter
+        if message.get("type") == RESULT:
+            if not future.done():
+                future.set_result(dict(message["data"]))
+        elif message.get("type") == EVENT and on_event is not None:
+            try:
+                on_event(message["data"])
+            except Exception as e:
+                logger.error(f"Error forwarding generation event: {e}")
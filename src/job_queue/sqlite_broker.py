@@ -0,0 +1,265 @@
+import asyncio
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set
+
+from loguru import logger
+
+from .broker import RESULT
+
+PENDING = "pending"
+CLAIMED = "claimed"
+CANCELLED = "cancelled"
+
+
+class SQLiteBroker:
+    """Broker backed by a SQLite file, for front-ends and workers on one host.
+
+    Jobs and replies are rows in the same WAL-mode database; ``claim`` and
+    ``replies`` poll every ``poll_interval`` seconds. A claim runs in a
+    ``BEGIN IMMEDIATE`` transaction, so two workers never take the same job.
+    Replies nobody collected within ``reply_ttl`` seconds (their front-end
+    went away) are pruned.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        lease: float = 60.0,
+        max_pending: Optional[int] = None,
+        poll_interval: float = 0.05,
+        reply_ttl: float = 3600.0,
+    ) -> None:
+        self.lease = lease
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.reply_ttl = reply_ttl
+        self._counters = {"pushed": 0, "claimed": 0, "finished": 0, "requeued": 0}
+        self._db: Optional[sqlite3.Connection] = self._open_db(db_path)
+
+    async def push(self, job: Dict[str, Any]) -> bool:
+        db = self._connection()
+        with _transaction(db):
+            if self.max_pending is not None:
+                (pending,) = db.execute(
+                    "SELECT COUNT(*) FROM broker_jobs WHERE state = ?", (PENDING,)
+                ).fetchone()
+                if pending >= self.max_pending:
+                    return False
+            db.execute(
+                "INSERT INTO broker_jobs (job_id, payload, state, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    job["job_id"],
+                    json.dumps(job, default=str),
+                    PENDING,
+                    job.get("created_at", time.time()),
+                ),
+            )
+            db.execute(
+                "DELETE FROM broker_replies WHERE created_at < ?",
+                (time.time() - self.reply_ttl,),
+            )
+        self._counters["pushed"] += 1
+        return True
+
+    async def claim(self, worker_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            job = self._claim_one(worker_id)
+            if job is not None:
+                return job
+            if loop.time() >= deadline:
+                return None
+            await asyncio.sleep(self.poll_interval)
+
+    async def heartbeat(self, worker_id: str, job_ids: Sequence[str]) -> Set[str]:
+        if not job_ids:
+            return set()
+        db = self._connection()
+        placeholders = ", ".join("?" for _ in job_ids)
+        with _transaction(db):
+            db.execute(
+                f"UPDATE broker_jobs SET lease_until = ? "
+                f"WHERE worker = ? AND job_id IN ({placeholders})",
+                (time.time() + self.lease, worker_id, *job_ids),
+            )
+            rows = db.execute(
+                f"SELECT job_id FROM broker_jobs "
+                f"WHERE state = ? AND job_id IN ({placeholders})",
+                (CANCELLED, *job_ids),
+            ).fetchall()
+        return {job_id for (job_id,) in rows}
+
+    async def reply(self, reply_to: str, message: Dict[str, Any]) -> None:
+        db = self._connection()
+        with _transaction(db):
+            self._insert_reply(db, reply_to, message)
+
+    async def finish(self, job: Dict[str, Any], result: Dict[str, Any]) -> None:
+        db = self._connection()
+        with _transaction(db):
+            db.execute("DELETE FROM broker_jobs WHERE job_id = ?", (job["job_id"],))
+            self._insert_reply(
+                db,
+                job["reply_to"],
+                {"job_id": job["job_id"], "type": RESULT, "data": result},
+            )
+        self._counters["finished"] += 1
+
+    async def replies(self, reply_to: str, timeout: float) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            messages = self._take_replies(reply_to)
+            if messages or loop.time() >= deadline:
+                return messages
+            await asyncio.sleep(self.poll_interval)
+
+    async def cancel(self, job_id: str) -> None:
+        """Drop a waiting job, or ask the worker running it to stop."""
+        db = self._connection()
+        with _transaction(db):
+            deleted = db.execute(
+                "DELETE FROM broker_jobs WHERE job_id = ? AND state = ?",
+                (job_id, PENDING),
+            ).rowcount
+            if not deleted:
+                db.execute(
+                    "UPDATE broker_jobs SET state = ? WHERE job_id = ? AND state = ?",
+                    (CANCELLED, job_id, CLAIMED),
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {PENDING: 0, CLAIMED: 0}
+        if self._db is not None:
+            try:
+                counts.update(
+                    self._db.execute(
+                        "SELECT state, COUNT(*) FROM broker_jobs GROUP BY state"
+                    ).fetchall()
+                )
+            except sqlite3.Error as e:
+                logger.error(f"Error reading broker stats: {e}")
+        return {
+            "pending": counts[PENDING],
+            "claimed": counts[CLAIMED],
+            **self._counters,
+        }
+
+    async def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _claim_one(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        db = self._connection()
+        now = time.time()
+        # Idle polls only read, so they never contend for the write lock.
+        if not db.execute(
+            "SELECT 1 FROM broker_jobs WHERE state = ? OR lease_until < ? LIMIT 1",
+            (PENDING, now),
+        ).fetchone():
+            return None
+        with _transaction(db):
+            # Jobs whose worker died: run them again, unless they were
+            # cancelled meanwhile.
+            db.execute(
+                "DELETE FROM broker_jobs WHERE state = ? AND lease_until < ?",
+                (CANCELLED, now),
+            )
+            requeued = db.execute(
+                "UPDATE broker_jobs SET state = ?, worker = NULL, lease_until = NULL "
+                "WHERE state = ? AND lease_until < ?",
+                (PENDING, CLAIMED, now),
+            ).rowcount
+            row = db.execute(
+                "SELECT job_id, payload FROM broker_jobs WHERE state = ? "
+                "ORDER BY rowid LIMIT 1",
+                (PENDING,),
+            ).fetchone()
+            if row is not None:
+                db.execute(
+                    "UPDATE broker_jobs SET state = ?, worker = ?, lease_until = ? "
+                    "WHERE job_id = ?",
+                    (CLAIMED, worker_id, now + self.lease, row[0]),
+                )
+        if requeued:
+            self._counters["requeued"] += requeued
+            logger.warning(f"Requeued {requeued} jobs whose lease expired")
+        if row is None:
+            return None
+        self._counters["claimed"] += 1
+        job: Dict[str, Any] = json.loads(row[1])
+        return job
+
+    def _take_replies(self, reply_to: str) -> List[Dict[str, Any]]:
+        # Each reply channel has a single reader, so reading outside a
+        # transaction and deleting up to the last id read loses nothing.
+        db = self._connection()
+        rows = db.execute(
+            "SELECT id, message FROM broker_replies WHERE reply_to = ? ORDER BY id",
+            (reply_to,),
+        ).fetchall()
+        if rows:
+            with _transaction(db):
+                db.execute(
+                    "DELETE FROM broker_replies WHERE reply_to = ? AND id <= ?",
+                    (reply_to, rows[-1][0]),
+                )
+        return [json.loads(message) for _, message in rows]
+
+    def _insert_reply(
+        self, db: sqlite3.Connection, reply_to: str, message: Dict[str, Any]
+    ) -> None:
+        db.execute(
+            "INSERT INTO broker_replies (reply_to, message, created_at) "
+            "VALUES (?, ?, ?)",
+            (reply_to, json.dumps(message, default=str), time.time()),
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            raise RuntimeError("Broker is closed")
+        return self._db
+
+    def _open_db(self, db_path: str) -> sqlite3.Connection:
+        # Autocommit mode: transactions are opened explicitly with
+        # BEGIN IMMEDIATE, which takes the write lock up front.
+        db = sqlite3.connect(db_path, timeout=10, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS broker_jobs ("
+            "job_id TEXT PRIMARY KEY, payload TEXT NOT NULL, state TEXT NOT NULL, "
+            "worker TEXT, lease_until REAL, created_at REAL NOT NULL)"
+        )
+        # Index entries carry the rowid, so pending jobs come out in push
+        # order.
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS broker_jobs_state ON broker_jobs (state)"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS broker_replies ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, reply_to TEXT NOT NULL, "
+            "message TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS broker_replies_reply_to "
+            "ON broker_replies (reply_to, id)"
+        )
+        return db
+
+
+@contextmanager
+def _transaction(db: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        yield db
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    db.execute("COMMIT")
@@ -3,15 +3,40 @@
 import asyncio
 import os
 import sys
-from typing import Optional
+from typing import Any, Optional, Union
 
+from aiohttp import web
 from dotenv import load_dotenv
 from loguru import logger
 
-from chat_interface import ChatManager
-from comfyui_control import ComfyUIClient
-from intent_processing import IntentProcessor
-from workflow_engine import WorkflowOrchestrator
+from api_server import APIServer, JobRegistry, run_workers
+from chat_interface import ChatManager, SessionStore
+from chat_interface.session_store import sqlite_path_from_url
+from comfyui_control import (
+    ArtifactStore,
+    ComfyUIClient,
+    ComfyUIPool,
+    HTTPSessionConfig,
+    RetryPolicy,
+    parse_endpoints,
+)
+from intent_processing import (
+    SCREENING_EXAMPLES,
+    EmbeddingIntentClassifier,
+    IntentProcessor,
+    PromptScreener,
+)
+from job_queue import GenerationWorker, RemoteOrchestrator, broker_from_url
+from monitoring import Metrics
+from workflow_engine import (
+    GenerationCache,
+    GenerationScheduler,
+    JobJournal,
+    PostProcessor,
+    TemplateRegistry,
+    WorkflowOrchestrator,
+    parse_renditions,
+)
 
 load_dotenv()
 
@@ -42,24 +67,196 @@ def setup_logging() -> None:
 
 class ChatAIComfyUIApp:
     def __init__(self) -> None:
-        self.comfyui_client: Optional[ComfyUIClient] = None
+        self.comfyui_client: Optional[Union[ComfyUIClient, ComfyUIPool]] = None
         self.chat_manager: Optional[ChatManager] = None
         self.intent_processor: Optional[IntentProcessor] = None
+        self.prompt_screener: Optional[PromptScreener] = None
         self.workflow_orchestrator: Optional[WorkflowOrchestrator] = None
+        self.scheduler: Optional[GenerationScheduler] = None
+        self.result_cache: Optional[GenerationCache] = None
+        self.session_store: Optional[SessionStore] = None
+        self.api_runner: Optional[web.AppRunner] = None
+        self.artifact_store: Optional[ArtifactStore] = None
+        self.post_processor: Optional[PostProcessor] = None
+        self.metrics: Optional[Metrics] = None
+        self.journal: Optional[JobJournal] = None
+        self.broker: Optional[Any] = None
+        self.remote_orchestrator: Optional[RemoteOrchestrator] = None
+        self.generation_worker: Optional[GenerationWorker] = None
 
     async def initialize(self) -> None:
-        logger.info("Initializing Chat AI ComfyUI application...")
+        mode = app_mode()
+        logger.info(f"Initializing Chat AI ComfyUI application ({mode} mode)...")
+
+        if os.getenv("METRICS_ENABLED", "true").lower() == "true":
+            self.metrics = Metrics()
 
         comfyui_host = os.getenv("COMFYUI_HOST", "localhost")
         comfyui_port = int(os.getenv("COMFYUI_PORT", "8188"))
+        comfyui_endpoints = parse_endpoints(os.getenv("COMFYUI_ENDPOINTS", ""))
+        client_options = {
+            "http_config": HTTPSessionConfig(
+                pool_size=int(os.getenv("COMFYUI_HTTP_POOL_SIZE", "100")),
+                keepalive_timeout=float(os.getenv("COMFYUI_HTTP_KEEPALIVE", "30")),
+                connect_timeout=float(os.getenv("COMFYUI_CONNECT_TIMEOUT", "5")),
+                default_read_timeout=float(os.getenv("COMFYUI_READ_TIMEOUT", "30")),
+            ),
+            "retry_policy": RetryPolicy(
+                max_attempts=int(os.getenv("COMFYUI_RETRY_ATTEMPTS", "3"))
+            ),
+            "failure_threshold": int(os.getenv("COMFYUI_BREAKER_THRESHOLD", "5")),
+            "recovery_timeout": float(os.getenv("COMFYUI_BREAKER_RECOVERY", "30")),
+            "metrics": self.metrics,
+        }
 
-        self.comfyui_client = ComfyUIClient(host=comfyui_host, port=comfyui_port)
+        if len(comfyui_endpoints) > 1:
+            self.comfyui_client = ComfyUIPool.from_endpoints(
+                comfyui_endpoints,
+                client_options=client_options,
+                health_check_interval=float(
+                    os.getenv("COMFYUI_HEALTH_CHECK_INTERVAL", "10")
+                ),
+                unhealthy_threshold=int(os.getenv("COMFYUI_UNHEALTHY_THRESHOLD", "3")),
+            )
+        else:
+            host, port = (
+                comfyui_endpoints[0]
+                if comfyui_endpoints
+                else (comfyui_host, comfyui_port)
+            )
+            self.comfyui_client = ComfyUIClient(host=host, port=port, **client_options)
         await self.comfyui_client.connect()
 
-        self.intent_processor = IntentProcessor()
-        self.workflow_orchestrator = WorkflowOrchestrator(self.comfyui_client)
+        self.result_cache = GenerationCache(
+            max_entries=int(os.getenv("GENERATION_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("GENERATION_CACHE_TTL", "86400")),
+            db_path=os.getenv("GENERATION_CACHE_DB") or None,
+        )
+        template_registry = TemplateRegistry(
+            os.getenv("WORKFLOWS_DIR", "workflows"),
+            reload_interval=float(os.getenv("WORKFLOW_RELOAD_INTERVAL", "2")),
+        )
+        database_path = sqlite_path_from_url(os.getenv("DATABASE_URL", ""))
+        # Broker leases take over from the journal when generations run in
+        # worker processes.
+        if (
+            mode == "all"
+            and database_path
+            and os.getenv("JOB_JOURNAL_ENABLED", "true").lower() == "true"
+        ):
+            self.journal = JobJournal(
+                database_path,
+                batch_size=int(os.getenv("JOB_JOURNAL_BATCH_SIZE", "100")),
+                flush_interval=float(os.getenv("JOB_JOURNAL_FLUSH_MS", "500")) / 1000,
+                lease=float(os.getenv("JOB_JOURNAL_LEASE_SECONDS", "30")),
+            )
+        artifact_dir = os.getenv("ARTIFACT_DIR", "outputs")
+        if artifact_dir:
+            self.artifact_store = ArtifactStore(
+                artifact_dir,
+                max_bytes=int(os.getenv("ARTIFACT_MAX_MB", "10240")) * 1024 * 1024,
+            )
+            renditions = parse_renditions(
+                os.getenv("RENDITIONS", "thumbnail:256,preview:1024"),
+                default_format=os.getenv("OUTPUT_FORMAT", "png"),
+                quality=int(os.getenv("QUALITY", "95")),
+            )
+            if renditions:
+                self.post_processor = PostProcessor(
+                    os.path.join(artifact_dir, "renditions"),
+                    renditions,
+                    max_workers=int(os.getenv("POST_PROCESS_WORKERS", "2")),
+                    max_bytes=int(os.getenv("RENDITION_MAX_MB", "2048")) * 1024 * 1024,
+                )
+        if mode != "frontend":
+            self.workflow_orchestrator = WorkflowOrchestrator(
+                self.comfyui_client,
+                result_cache=self.result_cache,
+                template_registry=template_registry,
+                batch_window=float(os.getenv("GENERATION_BATCH_WINDOW_MS", "0")) / 1000,
+                max_batch_size=int(os.getenv("GENERATION_BATCH_MAX", "4")),
+                generation_timeout=float(os.getenv("GENERATION_TIMEOUT", "300")),
+                artifact_store=self.artifact_store,
+                post_processor=self.post_processor,
+                metrics=self.metrics,
+                journal=self.journal,
+            )
+        if mode != "all":
+            broker_url = os.getenv("BROKER_URL") or (
+                f"sqlite:///{database_path}" if database_path else ""
+            )
+            if not broker_url:
+                raise ValueError(f"APP_MODE={mode} needs BROKER_URL or DATABASE_URL")
+            max_pending = int(os.getenv("BROKER_MAX_PENDING", "0"))
+            self.broker = broker_from_url(
+                broker_url,
+                lease=float(os.getenv("BROKER_LEASE_SECONDS", "60")),
+                max_pending=max_pending or None,
+            )
+        if mode == "worker":
+            self.generation_worker = GenerationWorker(
+                self.broker,
+                self.workflow_orchestrator,
+                concurrency=int(os.getenv("MAX_CONCURRENT_GENERATIONS", "3")),
+            )
+            logger.success("Generation worker initialized successfully")
+            return
+
+        classifier = (
+            EmbeddingIntentClassifier(
+                min_confidence=float(os.getenv("INTENT_CLASSIFIER_THRESHOLD", "0.5"))
+            )
+            if os.getenv("INTENT_CLASSIFIER", "").lower() == "embedding"
+            else None
+        )
+        self.intent_processor = IntentProcessor(classifier, metrics=self.metrics)
+        self.prompt_screener = (
+            PromptScreener(
+                filter_threshold=float(
+                    os.getenv("PROMPT_SCREEN_FILTER_THRESHOLD", "0.7")
+                ),
+                block_threshold=float(
+                    os.getenv("PROMPT_SCREEN_BLOCK_THRESHOLD", "0.9")
+                ),
+                classifier=(
+                    EmbeddingIntentClassifier(examples=SCREENING_EXAMPLES)
+                    if os.getenv("NSFW_CLASSIFIER", "").lower() == "embedding"
+                    else None
+                ),
+                cache_size=int(os.getenv("NSFW_SCREEN_CACHE_SIZE", "4096")),
+            )
+            if os.getenv("NSFW_DETECTION_ENABLED", "true").lower() == "true"
+            else None
+        )
+        generator: Any = self.workflow_orchestrator
+        if mode == "frontend":
+            self.remote_orchestrator = generator = RemoteOrchestrator(
+                self.broker,
+                result_timeout=float(os.getenv("BROKER_RESULT_TIMEOUT", "900")),
+            )
+        self.scheduler = GenerationScheduler(
+            generator,
+            max_concurrent=int(os.getenv("MAX_CONCURRENT_GENERATIONS", "3")),
+            max_queue_size=int(os.getenv("MAX_QUEUED_GENERATIONS", "50")),
+            max_queued_per_user=int(os.getenv("MAX_QUEUED_PER_USER", "5")),
+            affinity_window=int(os.getenv("CHECKPOINT_AFFINITY_WINDOW", "8")),
+            max_affinity_skips=int(os.getenv("CHECKPOINT_AFFINITY_MAX_SKIPS", "4")),
+            swap_cost=float(os.getenv("CHECKPOINT_SWAP_SECONDS", "10")),
+        )
+        self.session_store = SessionStore(
+            max_sessions=int(os.getenv("SESSION_MAX_ACTIVE", "10000")),
+            idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "3600")),
+            memory_budget=int(os.getenv("SESSION_MEMORY_MB", "64")) * 1024 * 1024,
+            max_turns=int(os.getenv("SESSION_MAX_TURNS", "10")),
+            db_path=database_path,
+        )
         self.chat_manager = ChatManager(
-            self.intent_processor, self.workflow_orchestrator
+            self.intent_processor,
+            generator,
+            self.scheduler,
+            session_store=self.session_store,
+            journal=self.journal,
+            prompt_screener=self.prompt_screener,
         )
 
         logger.success("Application initialized successfully")
@@ -68,6 +265,13 @@ class ChatAIComfyUIApp:
         logger.info("Starting Chat AI ComfyUI service...")
 
         try:
+            if self.generation_worker:
+                await self.generation_worker.run()
+                return
+
+            # The API server listens for resumed generations, so it starts
+            # before the chat manager resumes the job journal.
+            await self.start_api_server()
             if self.chat_manager:
                 await self.chat_manager.start()
             logger.info("Chat AI service is running. Press Ctrl+C to stop.")
@@ -82,12 +286,80 @@ class ChatAIComfyUIApp:
         finally:
             await self.cleanup()
 
+    async def start_api_server(self) -> None:
+        host = os.getenv("API_HOST", "0.0.0.0")
+        port = int(os.getenv("API_PORT", "8080"))
+        server = APIServer(
+            self.chat_manager,
+            self.comfyui_client,
+            scheduler=self.scheduler,
+            # Shared, so any API worker can answer a status poll.
+            registry=JobRegistry(
+                db_path=sqlite_path_from_url(os.getenv("DATABASE_URL", ""))
+            ),
+            api_key=os.getenv("API_KEY") or None,
+            artifact_store=self.artifact_store,
+            post_processor=self.post_processor,
+            metrics=self.metrics,
+        )
+        if self.chat_manager:
+            self.chat_manager.recovery_listeners.append(server.registry.recover)
+        self.api_runner = web.AppRunner(server.create_app(), access_log=None)
+        await self.api_runner.setup()
+        site = web.TCPSite(self.api_runner, host, port, reuse_port=api_workers() > 1)
+        await site.start()
+        logger.info(f"API server listening on http://{host}:{port}/api/v1")
+
     async def cleanup(self) -> None:
+        # Jobs a worker can't finish in time go back to the broker once their
+        # lease runs out, so their prompts are cancelled like any other.
+        if self.generation_worker:
+            await self.generation_worker.stop(
+                timeout=float(os.getenv("WORKER_DRAIN_SECONDS", "30"))
+            )
+        # Prompts still running belong to the job journal now; don't cancel
+        # them in ComfyUI while the in-flight requests are torn down.
+        if self.workflow_orchestrator:
+            self.workflow_orchestrator.shutdown()
+        if self.api_runner:
+            await self.api_runner.cleanup()
+        if self.remote_orchestrator:
+            await self.remote_orchestrator.close()
+        if self.broker:
+            await self.broker.close()
         if self.comfyui_client:
             await self.comfyui_client.disconnect()
+        if self.result_cache:
+            self.result_cache.close()
+        if self.session_store:
+            self.session_store.close()
+        if self.journal:
+            self.journal.close()
+        if self.post_processor:
+            self.post_processor.close()
         logger.info("Application shutdown complete")
 
 
+def api_workers() -> int:
+    return max(1, int(os.getenv("API_WORKERS", "1")))
+
+
+def app_mode() -> str:
+    """``all`` (one process does everything), ``frontend`` (chat and API,
+    generations pushed to the broker) or ``worker`` (runs brokered
+    generations)."""
+    mode = os.getenv("APP_MODE", "all").lower()
+    if mode not in ("all", "frontend", "worker"):
+        raise ValueError(f"Unknown APP_MODE: {mode}")
+    return mode
+
+
+def process_count() -> int:
+    if app_mode() == "worker":
+        return max(1, int(os.getenv("GENERATION_WORKERS", "1")))
+    return api_workers()
+
+
 async def main() -> None:
     setup_logging()
 
@@ -96,5 +368,12 @@ async def main() -> None:
     await app.run()
 
 
-if __name__ == "__main__":
+def run_worker() -> None:
     asyncio.run(main())
+
+
+if __name__ == "__main__":
+    if process_count() > 1:
+        run_workers(run_worker, process_count())
+    else:
+        run_worker()
@@ -0,0 +1,127 @@
+import time
+from types import TracebackType
+from typing import Dict, Optional, Sequence, Tuple, Type
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+# Intent parsing sits in the sub-millisecond range, a generation in the
+# tens of seconds: the buckets cover both ends.
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+)
+
+
+class StageTimer:
+    """Times one pass through a stage; use as a (sync) context manager."""
+
+    __slots__ = ("_metrics", "_stage", "_children", "_start")
+
+    def __init__(
+        self, metrics: "Metrics", stage: str, children: Tuple[Histogram, Gauge]
+    ) -> None:
+        self._metrics = metrics
+        self._stage = stage
+        self._children = children
+        self._start = 0.0
+
+    def __enter__(self) -> "StageTimer":
+        self._children[1].inc()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        histogram, in_flight = self._children
+        histogram.observe(time.perf_counter() - self._start)
+        in_flight.dec()
+        if exc_type is not None:
+            self._metrics.record_error(self._stage, exc_type.__name__)
+
+
+class Metrics:
+    """Prometheus instruments for the request pipeline.
+
+    Every stage gets a latency histogram, an in-flight gauge and an error
+    counter labelled by error type. Label children are resolved once per
+    stage, so timing a stage costs two gauge updates and one observation.
+    With several API workers each process exports its own registry.
+    """
+
+    def __init__(
+        self,
+        registry: Optional[CollectorRegistry] = None,
+        namespace: str = "chat_ai",
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.registry = registry if registry is not None else CollectorRegistry()
+        self.duration = Histogram(
+            "stage_duration_seconds",
+            "Time spent in each pipeline stage",
+            ["stage"],
+            namespace=namespace,
+            buckets=buckets,
+            registry=self.registry,
+        )
+        self.in_flight = Gauge(
+            "stage_in_flight",
+            "Calls currently inside each pipeline stage",
+            ["stage"],
+            namespace=namespace,
+            registry=self.registry,
+        )
+        self.errors = Counter(
+            "stage_errors",
+            "Failed calls per pipeline stage and error type",
+            ["stage", "error_type"],
+            namespace=namespace,
+            registry=self.registry,
+        )
+        self._stages: Dict[str, Tuple[Histogram, Gauge]] = {}
+        self._errors: Dict[Tuple[str, str], Counter] = {}
+
+    @property
+    def content_type(self) -> str:
+        return str(CONTENT_TYPE_LATEST)
+
+    def stage(self, stage: str) -> StageTimer:
+        children = self._stages.get(stage)
+        if children is None:
+            children = (self.duration.labels(stage), self.in_flight.labels(stage))
+            self._stages[stage] = children
+        return StageTimer(self, stage, children)
+
+    def record_error(self, stage: str, error_type: str) -> None:
+        key = (stage, error_type)
+        counter = self._errors.get(key)
+        if counter is None:
+            counter = self._errors[key] = self.errors.labels(stage, error_type)
+        counter.inc()
+
+    def render(self) -> bytes:
+        return bytes(generate_latest(self.registry))
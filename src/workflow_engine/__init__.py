@@ -1,3 +1,28 @@
+from .generation_batcher import GenerationBatcher
+from .generation_scheduler import (
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+    GenerationScheduler,
+)
+from .job_journal import JobJournal
+from .post_processor import PostProcessor, RenditionSpec, parse_renditions
+from .result_cache import GenerationCache
+from .template_registry import TemplateRegistry, TemplateValidationError
 from .workflow_orchestrator import WorkflowOrchestrator
 
-__all__ = ["WorkflowOrchestrator"]
+__all__ = [
+    "GenerationBatcher",
+    "GenerationCache",
+    "GenerationScheduler",
+    "JobJournal",
+    "PostProcessor",
+    "PRIORITY_HIGH",
+    "PRIORITY_LOW",
+    "PRIORITY_NORMAL",
+    "RenditionSpec",
+    "TemplateRegistry",
+    "TemplateValidationError",
+    "WorkflowOrchestrator",
+    "parse_renditions",
+]
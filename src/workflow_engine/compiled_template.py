@@ -0,0 +1,100 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_PROMPT = "a beautiful landscape"
+
+PLACEHOLDER_PATTERN = re.compile(r"\{(prompt|negative)\}")
+
+# Parameters that overwrite a literal input, by the node class that owns it.
+VALUE_SLOTS: Dict[str, Tuple[str, str]] = {
+    "checkpoint": ("CheckpointLoaderSimple", "ckpt_name"),
+    "seed": ("KSampler", "seed"),
+    "steps": ("KSampler", "steps"),
+    "cfg": ("KSampler", "cfg"),
+    "width": ("EmptyLatentImage", "width"),
+    "height": ("EmptyLatentImage", "height"),
+    "batch_size": ("EmptyLatentImage", "batch_size"),
+}
+
+
+class CompiledTemplate:
+    """A workflow template with its parameter slots located up front.
+
+    ``render`` copies only the nodes that hold a slot and shares every other
+    node with the template, so rendered workflows must be treated as
+    read-only; copy a node before changing it.
+    """
+
+    def __init__(self, name: str, graph: Dict[str, Any]) -> None:
+        self.name = name
+        self.graph = graph
+        self.text_slots: List[Tuple[str, str, str]] = []
+        self.value_slots: Dict[str, List[Tuple[str, str, Any]]] = {}
+
+        for node_id, node in graph.items():
+            class_type = node.get("class_type")
+            for input_name, value in node.get("inputs", {}).items():
+                if isinstance(value, str) and PLACEHOLDER_PATTERN.search(value):
+                    self.text_slots.append((node_id, input_name, value))
+                for parameter, slot in VALUE_SLOTS.items():
+                    if slot == (class_type, input_name):
+                        self.value_slots.setdefault(parameter, []).append(
+                            (node_id, input_name, value)
+                        )
+
+    @property
+    def checkpoint(self) -> Optional[str]:
+        """The checkpoint the template loads when none is requested."""
+        slots = self.value_slots.get("checkpoint")
+        return str(slots[0][2]) if slots else None
+
+    @property
+    def slot_count(self) -> int:
+        return len(self.text_slots) + sum(map(len, self.value_slots.values()))
+
+    def render(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        workflow = dict(self.graph)
+        copied_inputs: Dict[str, Dict[str, Any]] = {}
+
+        def inputs_of(node_id: str) -> Dict[str, Any]:
+            inputs = copied_inputs.get(node_id)
+            if inputs is None:
+                original = self.graph[node_id]
+                inputs = copied_inputs[node_id] = dict(original["inputs"])
+                workflow[node_id] = {**original, "inputs": inputs}
+            return inputs
+
+        if self.text_slots:
+            texts = {
+                "prompt": str(parameters.get("prompt", DEFAULT_PROMPT)),
+                "negative": str(parameters.get("negative_prompt", "")),
+            }
+            for node_id, input_name, text in self.text_slots:
+                inputs_of(node_id)[input_name] = PLACEHOLDER_PATTERN.sub(
+                    lambda match: texts[match.group(1)], text
+                )
+
+        for parameter, slots in self.value_slots.items():
+            if parameters.get(parameter) is None:
+                continue
+            for node_id, input_name, default in slots:
+                inputs_of(node_id)[input_name] = _coerce(parameters[parameter], default)
+
+        return workflow
+
+
+def workflow_checkpoint(workflow: Dict[str, Any]) -> Optional[str]:
+    """The checkpoint a rendered workflow loads, if any."""
+    class_type, input_name = VALUE_SLOTS["checkpoint"]
+    for node in workflow.values():
+        if isinstance(node, dict) and node.get("class_type") == class_type:
+            value = node.get("inputs", {}).get(input_name)
+            if isinstance(value, str):
+                return value
+    return None
+
+
+def _coerce(value: Any, default: Any) -> Any:
+    if isinstance(default, bool) or not isinstance(default, (int, float)):
+        return value
+    return type(default)(value)
@@ -0,0 +1,10 @@
+import hashlib
+import json
+from typing import Any, Dict
+
+
+def workflow_fingerprint(workflow: Dict[str, Any]) -> str:
+    canonical = json.dumps(
+        workflow, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
@@ -0,0 +1,283 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+Submit = Callable[..., Awaitable[Dict[str, Any]]]
+EventCallback = Callable[[Dict[str, Any]], None]
+SubmittedCallback = Callable[[str, Optional[Dict[str, str]]], None]
+PendingItem = Tuple[
+    Dict[str, Any],
+    "asyncio.Future[Dict[str, Any]]",
+    Optional[EventCallback],
+    Optional[SubmittedCallback],
+]
+
+
+def batch_key(workflow: Dict[str, Any]) -> Optional[str]:
+    """What two workflows must share to run as one latent batch: everything
+    but the KSampler seed. Only single-image workflows with one sampler and
+    one empty latent qualify."""
+    samplers = [
+        node for node in workflow.values() if node.get("class_type") == "KSampler"
+    ]
+    latents = [
+        node
+        for node in workflow.values()
+        if node.get("class_type") == "EmptyLatentImage"
+    ]
+    if len(samplers) != 1 or len(latents) != 1:
+        return None
+    if latents[0].get("inputs", {}).get("batch_size", 1) != 1:
+        return None
+    unseeded = {
+        node_id: (
+            {
+                **node,
+                "inputs": {
+                    name: value
+                    for name, value in node.get("inputs", {}).items()
+                    if name != "seed"
+                },
+            }
+            if node is samplers[0]
+            else node
+        )
+        for node_id, node in workflow.items()
+    }
+    return json.dumps(unseeded, sort_keys=True, default=str)
+
+
+def fold_workflows(
+    workflows: List[Dict[str, Any]],
+) -> Tuple[Dict[str, Any], List[Dict[str, str]]]:
+    """Fold workflows with the same ``batch_key`` into one prompt whose empty
+    latent holds one image per workflow.
+
+    The batch samples with the first workflow's seed. Returns the folded
+    graph and, per workflow, a node map for ``split_outputs``
+    (``"<node_id>#<image index>"``).
+    """
+    folded = {
+        node_id: (
+            {
+                **node,
+                "inputs": {**node.get("inputs", {}), "batch_size": len(workflows)},
+            }
+            if node.get("class_type") == "EmptyLatentImage"
+            else node
+        )
+        for node_id, node in workflows[0].items()
+    }
+    node_maps = [
+        {node_id: f"{node_id}#{index}" for node_id in workflow}
+        for index, workflow in enumerate(workflows)
+    ]
+    return folded, node_maps
+
+
+def split_outputs(outputs: Dict[str, Any], node_map: Dict[str, str]) -> Dict[str, Any]:
+    """One workflow's outputs out of a batched prompt's, by its node map.
+
+    A ``"<node_id>#<index>"`` target keeps only that image of the node's
+    output; a plain node id takes the whole output.
+    """
+    split = {}
+    for node_id, target in node_map.items():
+        batch_id, _, index = target.partition("#")
+        if batch_id not in outputs:
+            continue
+        output = outputs[batch_id]
+        if (
+            index
+            and isinstance(output, dict)
+            and isinstance(output.get("images"), list)
+        ):
+            position = int(index)
+            output = {**output, "images": output["images"][position : position + 1]}
+        split[node_id] = output
+    return split
+
+
+class _PendingBatch:
+    def __init__(self) -> None:
+        self.items: List[PendingItem] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.task: Optional["asyncio.Task[None]"] = None
+
+
+class GenerationBatcher:
+    """Collects generations that differ only in their seed for a short
+    window and samples them as one latent batch.
+
+    The GPU denoises the whole batch in a single KSampler pass, and each
+    request gets its image back by index. Stock KSampler can't apply a
+    different conditioning to each latent, so requests with other prompts
+    or settings are never held back: they are submitted on their own at
+    once.
+    """
+
+    def __init__(
+        self, submit: Submit, window: float = 0.03, max_batch_size: int = 4
+    ) -> None:
+        self.submit = submit
+        self.window = window
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending: Dict[str, _PendingBatch] = {}
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self._counters = {"requests": 0, "submissions": 0, "batched_requests": 0}
+
+    async def run(
+        self,
+        workflow: Dict[str, Any],
+        on_event: Optional[EventCallback] = None,
+        on_submitted: Optional[SubmittedCallback] = None,
+    ) -> Dict[str, Any]:
+        """Run ``workflow``, possibly batched with others. ``on_submitted``
+        gets the prompt_id and, for a batched prompt, the node map to pass to
+        ``split_outputs``."""
+        self._counters["requests"] += 1
+        key = batch_key(workflow)
+        if key is None or self.max_batch_size == 1:
+            self._counters["submissions"] += 1
+            return await self._submit(workflow, [(on_event, on_submitted, None)])
+
+        future: "asyncio.Future[Dict[str, Any]]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _PendingBatch()
+            batch.timer = asyncio.get_running_loop().call_later(
+                self.window, self._flush, key
+            )
+        batch.items.append((workflow, future, on_event, on_submitted))
+        if len(batch.items) >= self.max_batch_size:
+            self._flush(key)
+
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            future.cancel()
+            self._abandon(key, batch)
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        submissions = self._counters["submissions"]
+        return {
+            **self._counters,
+            "pending": sum(len(batch.items) for batch in self._pending.values()),
+            "avg_batch_size": (
+                self._counters["requests"] / submissions if submissions else 0.0
+            ),
+        }
+
+    def _flush(self, key: str) -> None:
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = batch.task = asyncio.ensure_future(self._execute(batch.items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _abandon(self, key: str, batch: _PendingBatch) -> None:
+        """Drop a batch once every caller in it has gone away, so its prompt
+        is never queued, or is cancelled if it already was."""
+        if not all(future.cancelled() for _, future, _, _ in batch.items):
+            return
+        if batch.task is not None:
+            batch.task.cancel()
+        elif self._pending.get(key) is batch:
+            del self._pending[key]
+            if batch.timer is not None:
+                batch.timer.cancel()
+
+    async def _execute(self, items: List[PendingItem]) -> None:
+        # Callers that went away during the window aren't submitted.
+        items = [item for item in items if not item[1].cancelled()]
+        if not items:
+            return
+        self._counters["submissions"] += 1
+        try:
+            if len(items) == 1:
+                workflow, _, on_event, on_submitted = items[0]
+                results = [
+                    await self._submit(workflow, [(on_event, on_submitted, None)])
+                ]
+            else:
+                self._counters["batched_requests"] += len(items)
+                folded, node_maps = fold_workflows(
+                    [workflow for workflow, _, _, _ in items]
+                )
+                logger.info(f"Sampling {len(items)} generations as one batch")
+                result = await self._submit(
+                    folded,
+                    [
+                        (on_event, on_submitted, node_map)
+                        for (_, _, on_event, on_submitted), node_map in zip(
+                            items, node_maps
+                        )
+                    ],
+                )
+                results = [
+                    _split(result, node_map, len(items)) for node_map in node_maps
+                ]
+        except Exception as e:
+            logger.error(f"Error executing generation batch: {e}")
+            results = [{"error": str(e)}] * len(items)
+
+        for (_, future, _, _), item_result in zip(items, results):
+            if not future.done():
+                future.set_result(dict(item_result))
+
+    async def _submit(
+        self,
+        workflow: Dict[str, Any],
+        listeners: List[
+            Tuple[
+                Optional[EventCallback],
+                Optional[SubmittedCallback],
+                Optional[Dict[str, str]],
+            ]
+        ],
+    ) -> Dict[str, Any]:
+        callbacks = [on_event for on_event, _, _ in listeners if on_event is not None]
+        submitted = [
+            (on_submitted, id_map)
+            for _, on_submitted, id_map in listeners
+            if on_submitted is not None
+        ]
+        options: Dict[str, Any] = {}
+        if submitted:
+
+            def on_submitted(
+                prompt_id: str, node_map: Optional[Dict[str, str]]
+            ) -> None:
+                for callback, id_map in submitted:
+                    callback(prompt_id, id_map)
+
+            options["on_submitted"] = on_submitted
+        if not callbacks:
+            return await self.submit(workflow, **options)
+
+        # Everyone in the batch shares one prompt, so they share its progress.
+        def on_event(event: Dict[str, Any]) -> None:
+            for callback in callbacks:
+                callback(event)
+
+        return await self.submit(workflow, on_event, **options)
+
+
+def _split(
+    result: Dict[str, Any], node_map: Dict[str, str], batch_size: int
+) -> Dict[str, Any]:
+    if not result.get("success"):
+        return result
+    return {
+        **result,
+        "outputs": split_outputs(result.get("outputs", {}), node_map),
+        "batch_size": batch_size,
+    }
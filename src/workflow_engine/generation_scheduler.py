@@ -0,0 +1,285 @@
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from loguru import logger
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+
+class _Job:
+    __slots__ = (
+        "user_id",
+        "parameters",
+        "priority",
+        "granted",
+        "enqueued_at",
+        "checkpoint",
+        "skips",
+    )
+
+    def __init__(
+        self,
+        user_id: str,
+        parameters: Dict[str, Any],
+        priority: int,
+        granted: "asyncio.Future[None]",
+        enqueued_at: float,
+        checkpoint: Optional[str] = None,
+    ) -> None:
+        self.user_id = user_id
+        self.parameters = parameters
+        self.priority = priority
+        self.granted = granted
+        self.enqueued_at = enqueued_at
+        self.checkpoint = checkpoint
+        self.skips = 0
+
+
+class GenerationScheduler:
+    """Admission control in front of ``WorkflowOrchestrator.execute_generation``.
+
+    At most ``max_concurrent`` generations run at once. Waiting jobs sit in
+    priority lanes (lower number first); inside a lane users are served
+    round-robin so one chatty user cannot starve the rest. When the queue is
+    full, ``submit`` returns a ``busy`` error at once instead of piling on.
+
+    With ``affinity_window`` > 0, the next job is taken from the first
+    ``affinity_window`` users in line that want the checkpoint dispatched
+    last, so ComfyUI doesn't reload multi-GB weights between jobs. A job is
+    passed over at most ``max_affinity_skips`` times before it runs anyway.
+    """
+
+    def __init__(
+        self,
+        orchestrator: Any,
+        max_concurrent: int = 3,
+        max_queue_size: int = 50,
+        max_queued_per_user: Optional[int] = None,
+        priority_levels: int = 3,
+        stats_window: int = 1024,
+        affinity_window: int = 0,
+        max_affinity_skips: int = 4,
+        swap_cost: float = 10.0,
+    ) -> None:
+        self.orchestrator = orchestrator
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue_size = max_queue_size
+        self.max_queued_per_user = max_queued_per_user
+        self._lanes: List["OrderedDict[str, Deque[_Job]]"] = [
+            OrderedDict() for _ in range(max(1, priority_levels))
+        ]
+        self._running = 0
+        self._queued = 0
+        self._queued_per_user: Dict[str, int] = {}
+        self._wait_times: Deque[float] = deque(maxlen=stats_window)
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self.affinity_window = affinity_window
+        self.max_affinity_skips = max_affinity_skips
+        self.swap_cost = swap_cost
+        self._hot_checkpoint: Optional[str] = None
+        self._reordered = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    async def submit(
+        self,
+        user_id: str,
+        parameters: Dict[str, Any],
+        priority: int = PRIORITY_NORMAL,
+        on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+        origin: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        priority = min(max(priority, 0), len(self._lanes) - 1)
+        job = _Job(
+            user_id,
+            parameters,
+            priority,
+            loop.create_future(),
+            loop.time(),
+            self._checkpoint_for(parameters),
+        )
+
+        if self._running < self.max_concurrent and self._queued == 0:
+            self._running += 1
+            self._grant(job)
+        elif not self._enqueue(job):
+            return {"error": "Generation queue is full", "busy": True}
+        self._counters["submitted"] += 1
+        if on_event is not None:
+            position = 0 if job.granted.done() else self._queued
+            on_event({"type": "queued", "position": position})
+
+        try:
+            await job.granted
+        except asyncio.CancelledError:
+            if job.granted.cancelled():
+                self._forget(job)
+            else:
+                # The slot was granted just as the caller went away.
+                self._release()
+            raise
+
+        self._wait_times.append(loop.time() - job.enqueued_at)
+        try:
+            options: Dict[str, Any] = {}
+            if on_event is not None:
+                options["on_event"] = on_event
+            if origin is not None:
+                options["origin"] = origin
+            result = await self.orchestrator.execute_generation(parameters, **options)
+        except Exception:
+            self._counters["failed"] += 1
+            raise
+        finally:
+            self._release()
+
+        self._counters["failed" if "error" in result else "completed"] += 1
+        return dict(result)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._wait_times)
+        stats: Dict[str, Any] = {
+            "running": self._running,
+            "queued": self._queued,
+            "queued_by_priority": [
+                sum(len(jobs) for jobs in lane.values()) for lane in self._lanes
+            ],
+            "max_concurrent": self.max_concurrent,
+            "max_queue_size": self.max_queue_size,
+            **self._counters,
+            "wait_time": {
+                "samples": len(waits),
+                "avg": sum(waits) / len(waits) if waits else 0.0,
+                "p50": _percentile(waits, 0.50),
+                "p95": _percentile(waits, 0.95),
+                "max": waits[-1] if waits else 0.0,
+            },
+        }
+        if self.affinity_window > 0:
+            stats["affinity"] = {
+                "window": self.affinity_window,
+                "hot_checkpoint": self._hot_checkpoint,
+                "reordered": self._reordered,
+                # Upper bound: each reorder avoids at most one swap.
+                "estimated_seconds_saved": round(self._reordered * self.swap_cost, 3),
+                "swaps": getattr(self.orchestrator, "checkpoint_swaps", None),
+            }
+        return stats
+
+    def _enqueue(self, job: _Job) -> bool:
+        user_queued = self._queued_per_user.get(job.user_id, 0)
+        if self._queued >= self.max_queue_size or (
+            self.max_queued_per_user is not None
+            and user_queued >= self.max_queued_per_user
+        ):
+            self._counters["rejected"] += 1
+            logger.warning(f"Rejecting generation for {job.user_id}: queue is full")
+            return False
+
+        self._lanes[job.priority].setdefault(job.user_id, deque()).append(job)
+        self._queued += 1
+        self._queued_per_user[job.user_id] = user_queued + 1
+        return True
+
+    def _forget(self, job: _Job) -> None:
+        lane = self._lanes[job.priority]
+        jobs = lane.get(job.user_id)
+        if jobs is None or job not in jobs:
+            return
+        jobs.remove(job)
+        if not jobs:
+            del lane[job.user_id]
+        self._dequeued(job)
+
+    def _dequeued(self, job: _Job) -> None:
+        self._queued -= 1
+        remaining = self._queued_per_user.pop(job.user_id, 1) - 1
+        if remaining > 0:
+            self._queued_per_user[job.user_id] = remaining
+
+    def _release(self) -> None:
+        self._running -= 1
+        while self._running < self.max_concurrent:
+            job = self._next_job()
+            if job is None:
+                return
+            self._running += 1
+            self._grant(job)
+
+    def _grant(self, job: _Job) -> None:
+        if job.checkpoint is not None:
+            self._hot_checkpoint = job.checkpoint
+        job.granted.set_result(None)
+
+    def _checkpoint_for(self, parameters: Dict[str, Any]) -> Optional[str]:
+        checkpoint_for = getattr(self.orchestrator, "checkpoint_for", None)
+        if self.affinity_window <= 0 or not callable(checkpoint_for):
+            return None
+        try:
+            checkpoint = checkpoint_for(parameters)
+        except Exception as e:
+            logger.debug(f"Could not resolve checkpoint for {parameters}: {e}")
+            return None
+        return str(checkpoint) if checkpoint else None
+
+    def _pick_user(self, lane: "OrderedDict[str, Deque[_Job]]") -> str:
+        """The next user to serve: first in line, unless someone within the
+        affinity window wants the hot checkpoint and nobody ahead of them
+        has been passed over too often."""
+        first_user = next(iter(lane))
+        hot = self._hot_checkpoint
+        first = lane[first_user][0]
+        if (
+            self.affinity_window <= 0
+            or hot is None
+            or first.checkpoint in (None, hot)
+            or first.skips >= self.max_affinity_skips
+        ):
+            return first_user
+
+        passed: List[_Job] = []
+        for index, (user_id, jobs) in enumerate(lane.items()):
+            if index >= self.affinity_window:
+                break
+            head = jobs[0]
+            if head.checkpoint == hot:
+                for job in passed:
+                    job.skips += 1
+                self._reordered += 1
+                return user_id
+            if head.skips >= self.max_affinity_skips:
+                break
+            passed.append(head)
+        return first_user
+
+    def _next_job(self) -> Optional[_Job]:
+        for lane in self._lanes:
+            while lane:
+                user_id = self._pick_user(lane)
+                jobs = lane[user_id]
+                job = jobs.popleft()
+                if jobs:
+                    lane.move_to_end(user_id)
+                else:
+                    del lane[user_id]
+                self._dequeued(job)
+                if not job.granted.done():
+                    return job
+        return None
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
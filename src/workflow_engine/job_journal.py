@@ -0,0 +1,296 @@
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+PENDING = "pending"
+SUBMITTED = "submitted"
+COMPLETED = "completed"
+FAILED = "failed"
+LOST = "lost"
+CANCELLED = "cancelled"
+
+UNFINISHED = (PENDING, SUBMITTED)
+COLUMNS = (
+    "job_id",
+    "user_id",
+    "platform",
+    "parameters",
+    "workflow_key",
+    "prompt_id",
+    "node_map",
+    "state",
+    "error",
+    "owner",
+    "created_at",
+    "updated_at",
+)
+
+
+class JobJournal:
+    """Write-ahead journal of generation jobs, kept in SQLite.
+
+    Every job is recorded before its prompt is queued and updated when
+    ComfyUI accepts it and when it finishes, so a restarted process can find
+    the prompts it was still waiting on. Updates are buffered per job and
+    written in one transaction once ``batch_size`` jobs changed or
+    ``flush_interval`` seconds passed; several updates to the same job
+    between flushes cost a single row write.
+
+    Each journal holds a lease on its jobs that it renews every third of
+    ``lease`` seconds; other processes only take over jobs whose owner's
+    lease ran out, so live siblings sharing the database keep theirs.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        batch_size: int = 100,
+        flush_interval: float = 0.5,
+        retention: float = 7 * 24 * 3600,
+        lease: float = 30.0,
+    ) -> None:
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.retention = retention
+        self.lease = lease
+        self._dirty: Dict[str, Dict[str, Any]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._heartbeat_timer: Optional[asyncio.TimerHandle] = None
+        self._counters = {"recorded": 0, "flushes": 0, "rows_written": 0}
+        # Identifies this process, so jobs left behind by earlier runs (or
+        # other workers) can be told apart from its own.
+        self.owner = uuid.uuid4().hex
+        self._db: Optional[sqlite3.Connection] = self._open_db(db_path)
+        self.heartbeat()
+
+    def record(
+        self,
+        parameters: Dict[str, Any],
+        workflow_key: str,
+        user_id: Optional[str] = None,
+        platform: Optional[str] = None,
+    ) -> str:
+        """Journal a new job before it is queued; returns its job_id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._counters["recorded"] += 1
+        self._write(
+            {
+                "job_id": job_id,
+                "user_id": user_id,
+                "platform": platform,
+                "parameters": json.dumps(parameters, default=str),
+                "workflow_key": workflow_key,
+                "prompt_id": None,
+                "node_map": None,
+                "state": PENDING,
+                "error": None,
+                "owner": self.owner,
+                "created_at": now,
+                "updated_at": now,
+            }
+        )
+        return job_id
+
+    def submitted(
+        self, job_id: str, prompt_id: str, node_map: Optional[Dict[str, str]] = None
+    ) -> None:
+        """ComfyUI accepted the job as ``prompt_id``. ``node_map`` maps the
+        job's node ids to ids in a merged batch prompt."""
+        self._update(
+            job_id,
+            prompt_id=prompt_id,
+            node_map=json.dumps(node_map) if node_map else None,
+            state=SUBMITTED,
+        )
+
+    def finish(self, job_id: str, result: Dict[str, Any]) -> None:
+        if result.get("success"):
+            self._update(job_id, state=COMPLETED, error=None)
+        else:
+            if result.get("cancelled"):
+                state = CANCELLED
+            else:
+                state = LOST if result.get("lost") else FAILED
+            self._update(job_id, state=state, error=str(result.get("error")))
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """Claim the pending or queued jobs of owners whose lease expired.
+
+        A claim is a compare-and-set on the owner that also bumps
+        ``updated_at``, so workers restarting together against one database
+        resume each job once.
+        """
+        self.flush()
+        self.heartbeat()
+        if self._db is None:
+            return []
+        jobs = []
+        try:
+            rows = self._db.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM generation_jobs "
+                "WHERE state IN (?, ?) AND owner != ? AND owner NOT IN "
+                "(SELECT owner FROM journal_owners WHERE lease_until >= ?) "
+                "ORDER BY created_at",
+                (*UNFINISHED, self.owner, time.time()),
+            ).fetchall()
+            for row in rows:
+                job = dict(zip(COLUMNS, row))
+                now = time.time()
+                claimed = self._db.execute(
+                    "UPDATE generation_jobs SET owner = ?, updated_at = ? "
+                    "WHERE job_id = ? AND owner = ?",
+                    (self.owner, now, job["job_id"], job["owner"]),
+                ).rowcount
+                if claimed:
+                    jobs.append({**job, "owner": self.owner, "updated_at": now})
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading job journal: {e}")
+            return []
+
+        for job in jobs:
+            job["parameters"] = json.loads(job["parameters"])
+            job["node_map"] = json.loads(job["node_map"]) if job["node_map"] else None
+        return jobs
+
+    def heartbeat(self) -> None:
+        """Renew this process's lease on its jobs.
+
+        Reschedules itself while an event loop is running.
+        """
+        self._heartbeat_timer = None
+        if self._db is None:
+            return
+        now = time.time()
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO journal_owners (owner, lease_until) "
+                "VALUES (?, ?)",
+                (self.owner, now + self.lease),
+            )
+            self._db.execute(
+                "DELETE FROM journal_owners WHERE lease_until < ?",
+                (now - self.retention,),
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error renewing job journal lease: {e}")
+        self._schedule_heartbeat()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pending_writes": len(self._dirty), **self._counters}
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._db is None or not self._dirty:
+            return
+        rows = [
+            tuple(job[column] for column in COLUMNS) for job in self._dirty.values()
+        ]
+        self._dirty.clear()
+        try:
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO generation_jobs ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+                rows,
+            )
+            self._db.execute(
+                "DELETE FROM generation_jobs WHERE updated_at < ? "
+                "AND state NOT IN (?, ?)",
+                (time.time() - self.retention, *UNFINISHED),
+            )
+            self._db.commit()
+            self._counters["flushes"] += 1
+            self._counters["rows_written"] += len(rows)
+        except sqlite3.Error as e:
+            logger.error(f"Error writing job journal: {e}")
+
+    def close(self) -> None:
+        if self._db is None:
+            return
+        if self._heartbeat_timer is not None:
+            self._heartbeat_timer.cancel()
+            self._heartbeat_timer = None
+        self.flush()
+        try:
+            # Let the next run take over what is left without waiting.
+            self._db.execute(
+                "DELETE FROM journal_owners WHERE owner = ?", (self.owner,)
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error releasing job journal lease: {e}")
+        self._db.close()
+        self._db = None
+
+    def _schedule_heartbeat(self) -> None:
+        if self._heartbeat_timer is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._heartbeat_timer = loop.call_later(self.lease / 3, self.heartbeat)
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        job = self._dirty.get(job_id) or self._read(job_id)
+        if job is None:
+            logger.warning(f"Unknown journal job {job_id}")
+            return
+        self._write({**job, **fields, "updated_at": time.time()})
+
+    def _read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM generation_jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading job journal: {e}")
+            return None
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def _write(self, job: Dict[str, Any]) -> None:
+        self._dirty[job["job_id"]] = job
+        self._schedule_heartbeat()
+        if len(self._dirty) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.flush()
+                return
+            self._timer = loop.call_later(self.flush_interval, self.flush)
+
+    def _open_db(self, db_path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(db_path)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS generation_jobs ("
+            "job_id TEXT PRIMARY KEY, user_id TEXT, platform TEXT, "
+            "parameters TEXT NOT NULL, workflow_key TEXT NOT NULL, prompt_id TEXT, "
+            "node_map TEXT, state TEXT NOT NULL, error TEXT, owner TEXT NOT NULL, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS generation_jobs_state "
+            "ON generation_jobs (state, updated_at)"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS journal_owners ("
+            "owner TEXT PRIMARY KEY, lease_until REAL NOT NULL)"
+        )
+        db.commit()
+        return db
@@ -0,0 +1,249 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from loguru import logger
+
+PILLOW_FORMATS = {"jpg": "JPEG", "jpeg": "JPEG", "png": "PNG", "webp": "WEBP"}
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+
+
+class RenditionSpec:
+    """One derived image: longest side ``max_size`` (0 keeps the original
+    size), re-encoded as ``image_format`` at ``quality``."""
+
+    __slots__ = ("name", "max_size", "image_format", "quality")
+
+    def __init__(
+        self, name: str, max_size: int, image_format: str = "png", quality: int = 95
+    ) -> None:
+        pillow_format = PILLOW_FORMATS.get(image_format.lower())
+        if pillow_format is None:
+            raise ValueError(f"Unsupported output format: {image_format}")
+        self.name = name
+        self.max_size = max_size
+        self.image_format = pillow_format
+        self.quality = quality
+
+    @property
+    def settings(self) -> str:
+        return f"{self.max_size}:{self.image_format}:{self.quality}"
+
+
+def parse_renditions(
+    value: str, default_format: str = "png", quality: int = 95
+) -> List[RenditionSpec]:
+    """Parse ``"thumbnail:256:webp,preview:1024"`` into rendition specs."""
+    specs = []
+    for item in value.split(","):
+        parts = item.strip().split(":")
+        if not parts[0]:
+            continue
+        size = int(parts[1]) if len(parts) > 1 and parts[1] else 0
+        image_format = parts[2] if len(parts) > 2 and parts[2] else default_format
+        specs.append(RenditionSpec(parts[0], size, image_format, quality))
+    return specs
+
+
+def render_rendition(
+    source: str, destination: str, max_size: int, image_format: str, quality: int
+) -> Dict[str, int]:
+    """Resize and re-encode one image. Runs inside a worker process."""
+    from PIL import Image
+
+    with Image.open(source) as opened:
+        image: Image.Image = opened
+        image.load()
+        if max_size > 0:
+            image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        options: Dict[str, Any] = {}
+        if image_format in ("JPEG", "WEBP"):
+            options["quality"] = quality
+        if image_format == "PNG":
+            options["optimize"] = True
+
+        tmp_path = f"{destination}.{uuid.uuid4().hex}.part"
+        image.save(tmp_path, format=image_format, **options)
+        os.replace(tmp_path, destination)
+        width, height = image.size
+    return {"width": width, "height": height, "size": os.path.getsize(destination)}
+
+
+class PostProcessor:
+    """Produces resized/re-encoded renditions of stored artifacts.
+
+    Pillow work runs in a process pool so the event loop never decodes or
+    encodes an image itself. Renditions are keyed on the source image hash
+    plus the rendition settings: a key that already exists on disk (or is
+    being rendered right now) is never rendered twice. Least recently used
+    renditions are deleted once they take more than ``max_bytes``.
+    """
+
+    def __init__(
+        self,
+        output_dir: str = "outputs/renditions",
+        renditions: Optional[Sequence[RenditionSpec]] = None,
+        max_workers: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        max_cached: int = 4096,
+        max_bytes: int = 2 * 1024**3,
+    ) -> None:
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.renditions = list(
+            renditions
+            if renditions is not None
+            else [RenditionSpec("thumbnail", 256), RenditionSpec("preview", 1024)]
+        )
+        self.max_cached = max_cached
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._owns_executor = executor is None
+        self._executor = executor or ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._in_flight: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+        self._files: "OrderedDict[Path, int]" = OrderedDict()
+        self._counters = {"rendered": 0, "hits": 0, "failed": 0, "evicted": 0}
+        self._load_index()
+
+    async def process(
+        self, artifacts: Sequence[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        jobs = [
+            self._rendition(artifact, spec)
+            for artifact in artifacts
+            for spec in self.renditions
+        ]
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        renditions = []
+        for result in results:
+            if isinstance(result, BaseException):
+                self._counters["failed"] += 1
+                logger.error(f"Error rendering image: {result}")
+            else:
+                renditions.append(result)
+        return renditions
+
+    def path_for(self, name: str) -> Optional[Path]:
+        """Resolve a rendition file name (``<key>.<ext>``) to its path."""
+        key, _, extension = name.partition(".")
+        if len(key) != 64 or any(c not in "0123456789abcdef" for c in key):
+            return None
+        path = self.output_dir / key[:2] / name
+        if f".{extension}" not in EXTENSIONS.values() or not path.is_file():
+            return None
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cached": len(self._cache),
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            **self._counters,
+        }
+
+    def close(self) -> None:
+        # Cancelling the renders also cancels their pool jobs that haven't
+        # started (shutdown's cancel_futures needs Python 3.9).
+        for future in list(self._in_flight.values()):
+            future.cancel()
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    async def _rendition(
+        self, artifact: Dict[str, Any], spec: RenditionSpec
+    ) -> Dict[str, Any]:
+        key = hashlib.sha256(
+            f"{artifact['digest']}:{spec.settings}".encode()
+        ).hexdigest()
+        cached = self._cache.get(key)
+        if cached is not None and os.path.exists(cached["path"]):
+            self._cache.move_to_end(key)
+            path = Path(cached["path"])
+            if path in self._files:
+                self._files.move_to_end(path)
+            self._counters["hits"] += 1
+            return {**cached, "digest": artifact["digest"]}
+
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._render(key, artifact["path"], spec))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self._counters["hits"] += 1
+        rendition = await asyncio.shield(future)
+        return {**rendition, "digest": artifact["digest"]}
+
+    async def _render(
+        self, key: str, source: str, spec: RenditionSpec
+    ) -> Dict[str, Any]:
+        destination = (
+            self.output_dir / key[:2] / f"{key}{EXTENSIONS[spec.image_format]}"
+        )
+        if destination.exists():
+            self._counters["hits"] += 1
+            info: Dict[str, Any] = {"size": destination.stat().st_size}
+        else:
+            destination.parent.mkdir(exist_ok=True)
+            info = await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                render_rendition,
+                str(source),
+                str(destination),
+                spec.max_size,
+                spec.image_format,
+                spec.quality,
+            )
+            self._counters["rendered"] += 1
+        self._track(destination, int(info["size"]))
+
+        rendition = {
+            "name": spec.name,
+            "format": spec.image_format.lower(),
+            "path": str(destination),
+            **info,
+        }
+        self._cache[key] = rendition
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+        return rendition
+
+    def _track(self, path: Path, size: int) -> None:
+        self.total_bytes += size - self._files.pop(path, 0)
+        self._files[path] = size
+        self._evict()
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and len(self._files) > 1:
+            path, size = self._files.popitem(last=False)
+            self.total_bytes -= size
+            self._counters["evicted"] += 1
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Could not remove rendition {path}: {e}")
+
+    def _load_index(self) -> None:
+        found = []
+        for path in self.output_dir.glob("??/*"):
+            if path.name.endswith(".part"):
+                path.unlink()
+                continue
+            stat = path.stat()
+            found.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(found):
+            self._files[path] = size
+            self.total_bytes += size
+        self._evict()
@@ -0,0 +1,87 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+EventCallback = Callable[[Dict[str, Any]], None]
+
+
+class _Flight:
+    __slots__ = ("task", "waiters", "listeners", "latest")
+
+    def __init__(self) -> None:
+        self.task: Optional["asyncio.Future[Dict[str, Any]]"] = None
+        self.waiters = 0
+        self.listeners: List[EventCallback] = []
+        self.latest: Dict[Any, Dict[str, Any]] = {}
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        self.latest[event.get("type")] = event
+        for listener in list(self.listeners):
+            listener(event)
+
+    def subscribe(self, listener: EventCallback) -> None:
+        # A late joiner still learns the prompt id and the latest progress.
+        for event in list(self.latest.values()):
+            listener(event)
+        self.listeners.append(listener)
+
+
+class RequestCoalescer:
+    """Single-flight deduplication of identical generations.
+
+    The first caller for a key starts the work; callers arriving while it is
+    still running attach to the same task and receive the same result. Every
+    caller's ``on_event`` hears the events the work publishes. The shared
+    task is cancelled only once every attached caller has gone away.
+    """
+
+    def __init__(self) -> None:
+        self._flights: Dict[str, _Flight] = {}
+        self._counters = {"leaders": 0, "followers": 0}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def run(
+        self,
+        key: str,
+        factory: Callable[[EventCallback], Awaitable[Dict[str, Any]]],
+        on_event: Optional[EventCallback] = None,
+    ) -> Dict[str, Any]:
+        """Run ``factory(publish)`` once per key; events passed to
+        ``publish`` reach every caller's ``on_event``."""
+        flight = self._flights.get(key)
+        leader = flight is None
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            self._counters["leaders"] += 1
+        else:
+            self._counters["followers"] += 1
+        if on_event is not None:
+            flight.subscribe(on_event)
+        task = flight.task
+        if task is None:
+            task = flight.task = asyncio.ensure_future(factory(flight.publish))
+            landed = flight
+            task.add_done_callback(lambda _: self._land(key, landed))
+
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+            if on_event is not None:
+                flight.listeners.remove(on_event)
+
+        return dict(result) if leader else {**result, "coalesced": True}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._flights), **self._counters}
+
+    def _land(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
@@ -0,0 +1,138 @@
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+
+
+class GenerationCache:
+    """Caches generation outputs by rendered-workflow fingerprint.
+
+    The in-memory tier is an LRU bounded by ``max_entries``; entries older
+    than ``ttl`` seconds are treated as misses. When ``db_path`` is given,
+    results are also written to SQLite so hits survive restarts; disk hits
+    are promoted back into memory.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl: float = 24 * 3600,
+        db_path: Optional[str] = None,
+        max_disk_entries: int = 100000,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._puts_since_prune = 0
+        self._counters = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+        if db_path:
+            self._db = self._open_db(db_path)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            if now - stored_at <= self.ttl:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return value
+            del self._entries[key]
+
+        disk_entry = self._load(key, now)
+        if disk_entry is not None:
+            self._remember(key, *disk_entry)
+            self._counters["disk_hits"] += 1
+            return disk_entry[1]
+
+        self._counters["misses"] += 1
+        return None
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        now = time.time()
+        self._remember(key, now, value)
+        self._counters["stores"] += 1
+        if self._db is not None:
+            self._store(self._db, key, now, value)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), **self._counters}
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, key: str, stored_at: float, value: Dict[str, Any]) -> None:
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _open_db(self, db_path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(db_path)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS generation_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS generation_cache_accessed "
+            "ON generation_cache (accessed_at)"
+        )
+        db.commit()
+        return db
+
+    def _load(self, key: str, now: float) -> Optional[Tuple[float, Dict[str, Any]]]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT stored_at, value FROM generation_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[0] > self.ttl:
+                return None
+            self._db.execute(
+                "UPDATE generation_cache SET accessed_at = ? WHERE key = ?",
+                (now, key),
+            )
+            self._db.commit()
+            return float(row[0]), json.loads(row[1])
+        except sqlite3.Error as e:
+            logger.error(f"Error reading generation cache: {e}")
+            return None
+
+    def _store(
+        self, db: sqlite3.Connection, key: str, now: float, value: Dict[str, Any]
+    ) -> None:
+        try:
+            db.execute(
+                "INSERT OR REPLACE INTO generation_cache "
+                "(key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            self._puts_since_prune += 1
+            if self._puts_since_prune >= 100:
+                self._prune(db, now)
+            db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error writing generation cache: {e}")
+
+    def _prune(self, db: sqlite3.Connection, now: float) -> None:
+        self._puts_since_prune = 0
+        db.execute(
+            "DELETE FROM generation_cache WHERE stored_at < ?", (now - self.ttl,)
+        )
+        db.execute(
+            "DELETE FROM generation_cache WHERE key IN ("
+            "SELECT key FROM generation_cache ORDER BY accessed_at DESC "
+            "LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
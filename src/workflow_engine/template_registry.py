@@ -0,0 +1,127 @@
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from loguru import logger
+
+from .compiled_template import CompiledTemplate
+
+
+class TemplateValidationError(ValueError):
+    pass
+
+
+class _Entry:
+    __slots__ = ("template", "mtime_ns", "size", "checked_at")
+
+    def __init__(
+        self, template: CompiledTemplate, mtime_ns: int, size: int, checked_at: float
+    ) -> None:
+        self.template = template
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.checked_at = checked_at
+
+
+def validate_workflow(graph: Any) -> None:
+    if not isinstance(graph, dict) or not graph:
+        raise TemplateValidationError("Workflow must be a non-empty JSON object")
+
+    for node_id, node in graph.items():
+        if not isinstance(node, dict) or not isinstance(node.get("class_type"), str):
+            raise TemplateValidationError(f"Node {node_id} has no class_type")
+        inputs = node.get("inputs", {})
+        if not isinstance(inputs, dict):
+            raise TemplateValidationError(f"Node {node_id} inputs must be an object")
+        for input_name, value in inputs.items():
+            if (
+                isinstance(value, list)
+                and len(value) == 2
+                and isinstance(value[0], str)
+                and isinstance(value[1], int)
+                and value[0] not in graph
+            ):
+                raise TemplateValidationError(
+                    f"Node {node_id} input {input_name} links to missing node "
+                    f"{value[0]}"
+                )
+
+
+class TemplateRegistry:
+    """Workflow templates indexed from a directory of ComfyUI API JSON files.
+
+    Files are only listed at startup; each one is parsed, validated and
+    compiled the first time it is requested. Afterwards its mtime is
+    re-checked at most every ``reload_interval`` seconds and the template is
+    recompiled when the file changes. A file that fails to parse or validate
+    keeps serving its last good version.
+    """
+
+    def __init__(
+        self, directory: Union[str, Path], reload_interval: float = 2.0
+    ) -> None:
+        self.directory = Path(directory)
+        self.reload_interval = reload_interval
+        self._paths: Dict[str, Path] = {}
+        self._entries: Dict[str, _Entry] = {}
+        self._scanned_at = float("-inf")
+        self.scan()
+
+    def scan(self) -> None:
+        self._scanned_at = time.monotonic()
+        if not self.directory.is_dir():
+            logger.warning(f"Workflow directory {self.directory} does not exist")
+            self._paths = {}
+            return
+        self._paths = {path.stem: path for path in self.directory.glob("*.json")}
+        logger.debug(f"Indexed {len(self._paths)} workflow templates")
+
+    def names(self) -> List[str]:
+        return sorted(self._paths)
+
+    def get(self, name: str) -> Optional[CompiledTemplate]:
+        now = time.monotonic()
+        entry = self._entries.get(name)
+        if entry is not None and now - entry.checked_at < self.reload_interval:
+            return entry.template
+
+        path = self._paths.get(name)
+        if path is None and now - self._scanned_at >= self.reload_interval:
+            self.scan()
+            path = self._paths.get(name)
+        if path is None:
+            return None
+
+        try:
+            stat = path.stat()
+        except OSError:
+            logger.warning(f"Workflow template {path} disappeared")
+            self._paths.pop(name, None)
+            self._entries.pop(name, None)
+            return None
+
+        if (
+            entry is not None
+            and entry.mtime_ns == stat.st_mtime_ns
+            and entry.size == stat.st_size
+        ):
+            entry.checked_at = now
+            return entry.template
+
+        try:
+            graph = json.loads(path.read_text(encoding="utf-8"))
+            validate_workflow(graph)
+        except (OSError, ValueError) as e:
+            logger.error(f"Invalid workflow template {path}: {e}")
+            if entry is not None:
+                entry.mtime_ns, entry.size = stat.st_mtime_ns, stat.st_size
+                entry.checked_at = now
+                return entry.template
+            return None
+
+        if entry is not None:
+            logger.info(f"Reloaded workflow template {name}")
+        template = CompiledTemplate(name, graph)
+        self._entries[name] = _Entry(template, stat.st_mtime_ns, stat.st_size, now)
+        return template
@@ -1,14 +1,66 @@
 import asyncio
-import json
-from typing import Any, Dict
+import contextlib
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Set, Tuple
 
 from loguru import logger
 
+from .compiled_template import CompiledTemplate, workflow_checkpoint
+from .fingerprint import workflow_fingerprint
+from .generation_batcher import GenerationBatcher, SubmittedCallback, split_outputs
+from .job_journal import JobJournal
+from .request_coalescer import RequestCoalescer
+from .result_cache import GenerationCache
+from .template_registry import TemplateRegistry
+
+EventCallback = Callable[[Dict[str, Any]], None]
+
+TIMEOUT_ERROR = "Timeout waiting for completion"
+
 
 class WorkflowOrchestrator:
-    def __init__(self, comfyui_client: Any) -> None:
+    def __init__(
+        self,
+        comfyui_client: Any,
+        result_cache: Optional[GenerationCache] = None,
+        template_registry: Optional[TemplateRegistry] = None,
+        batch_window: float = 0.0,
+        max_batch_size: int = 4,
+        artifact_store: Optional[Any] = None,
+        post_processor: Optional[Any] = None,
+        metrics: Optional[Any] = None,
+        journal: Optional[JobJournal] = None,
+        generation_timeout: float = 300.0,
+    ) -> None:
         self.comfyui_client = comfyui_client
+        self.result_cache = result_cache
+        self.template_registry = template_registry
+        self.artifact_store = artifact_store
+        self.post_processor = post_processor
+        self.metrics = metrics
+        self.journal = journal
+        # Seconds a queued prompt may take before it is cancelled in ComfyUI.
+        self.generation_timeout = generation_timeout
+        # The checkpoint ComfyUI will have loaded once its queue drains.
+        self.hot_checkpoint: Optional[str] = None
+        self.checkpoint_swaps = 0
+        self.cancelled_prompts = 0
+        self._shutting_down = False
+        self._cancellations: Set["asyncio.Task[str]"] = set()
+        self.coalescer = RequestCoalescer()
+        # Journal jobs waiting on each workflow, and the prompt it was queued
+        # as once ComfyUI accepted it.
+        self._journal_jobs: Dict[str, List[str]] = {}
+        self._journal_prompts: Dict[str, Tuple[str, Optional[Dict[str, str]]]] = {}
+        self.batcher: Optional[GenerationBatcher] = None
+        if batch_window > 0 and max_batch_size > 1:
+            self.batcher = GenerationBatcher(
+                self._queue_and_wait, window=batch_window, max_batch_size=max_batch_size
+            )
         self.workflow_templates = self._load_workflow_templates()
+        self.compiled_templates = {
+            name: CompiledTemplate(name, graph)
+            for name, graph in self.workflow_templates.items()
+        }
 
     def _load_workflow_templates(self) -> Dict[str, Any]:
         return {
@@ -118,67 +170,540 @@ class WorkflowOrchestrator:
             },
         }
 
-    async def execute_generation(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    async def execute_generation(
+        self,
+        parameters: Dict[str, Any],
+        on_event: Optional[EventCallback] = None,
+        origin: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Render, queue and await a generation. ``origin`` (``user_id`` and
+        ``platform``) is recorded in the job journal, if there is one."""
         try:
             logger.info(f"Executing generation with parameters: {parameters}")
 
-            template_name = (
-                "nsfw_filtered_generation"
-                if parameters.get("nsfw_filter", False)
-                else "basic_generation"
+            workflow = self._create_workflow_from_template(
+                self._template_name(parameters), parameters
             )
-            workflow = self._create_workflow_from_template(template_name, parameters)
 
-            prompt_id = await self.comfyui_client.queue_prompt(workflow)
-            if not prompt_id:
-                return {"error": "Failed to queue prompt"}
+            workflow_key = workflow_fingerprint(workflow)
+            if self.result_cache is not None:
+                cached = self.result_cache.get(workflow_key)
+                if cached is not None:
+                    logger.info(f"Serving generation from cache ({workflow_key[:12]})")
+                    if self._artifacts_missing(cached):
+                        cached = {
+                            **cached,
+                            "artifacts": await self._collect_artifacts(
+                                cached["prompt_id"], cached["outputs"]
+                            ),
+                        }
+                    if self.post_processor is not None and cached.get("artifacts"):
+                        # Renditions are cached by image hash, so this only
+                        # renders what is missing on disk.
+                        cached = {
+                            **cached,
+                            "renditions": await self.post_processor.process(
+                                cached["artifacts"]
+                            ),
+                        }
+                    return {"success": True, **cached, "cached": True}
 
-            result = await self._wait_for_completion(prompt_id)
+            if self.journal is None:
+                return await self._run_coalesced(workflow, workflow_key, on_event)
+
+            job_id = self._journal_record(parameters, workflow_key, origin or {})
+            try:
+                result = await self._run_coalesced(workflow, workflow_key, on_event)
+            except asyncio.CancelledError:
+                if self._shutting_down:
+                    # ComfyUI keeps going: leave the job for the next start.
+                    self._journal_forget(workflow_key, job_id)
+                else:
+                    self._journal_finish(
+                        workflow_key,
+                        job_id,
+                        {"error": "Generation cancelled", "cancelled": True},
+                    )
+                raise
+            except Exception as e:
+                self._journal_finish(workflow_key, job_id, {"error": str(e)})
+                raise
+            self._journal_finish(workflow_key, job_id, result)
             return result
 
         except Exception as e:
             logger.error(f"Error executing generation: {e}")
             return {"error": str(e)}
 
-    def _create_workflow_from_template(
-        self, template_name: str, parameters: Dict[str, Any]
+    async def reattach(
+        self, job: Dict[str, Any], timeout: float = 3600
+    ) -> Dict[str, Any]:
+        """Pick a journaled job back up after a restart and return its result.
+
+        The WebSocket events of a prompt go to the client that queued it, so
+        a restarted process follows the prompt through ``/history`` and
+        ``/queue`` instead. A job that never reached ComfyUI, or whose
+        prompt is neither queued nor in the history, is reported as lost.
+        """
+        prompt_id = job.get("prompt_id")
+        try:
+            if prompt_id:
+                logger.info(f"Reattaching to prompt {prompt_id}")
+                result = await self._follow_prompt(prompt_id, timeout)
+            else:
+                result = {
+                    "error": "Generation was not queued before the restart",
+                    "lost": True,
+                }
+
+            node_map = job.get("node_map")
+            if node_map and result.get("success"):
+                # A batched prompt: keep only this job's outputs.
+                result["outputs"] = split_outputs(result["outputs"], node_map)
+            if result.get("success"):
+                cached = {
+                    "prompt_id": result["prompt_id"],
+                    "outputs": result["outputs"],
+                }
+                if self.artifact_store is not None:
+                    result["artifacts"] = cached[
+                        "artifacts"
+                    ] = await self._collect_artifacts(
+                        result["prompt_id"], result["outputs"]
+                    )
+                    if self.post_processor is not None and result["artifacts"]:
+                        result["renditions"] = await self.post_processor.process(
+                            result["artifacts"]
+                        )
+                if self.result_cache is not None and result["outputs"]:
+                    self.result_cache.put(job["workflow_key"], cached)
+        except Exception as e:
+            logger.error(f"Error reattaching to prompt {prompt_id}: {e}")
+            result = {"error": str(e)}
+
+        if self.journal is not None:
+            self.journal.finish(job["job_id"], result)
+        return result
+
+    async def cancel_prompt(self, prompt_id: str) -> str:
+        """Stop ComfyUI spending GPU time on ``prompt_id``.
+
+        A pending prompt is deleted from the queue, a running one is
+        interrupted. Returns ``"removed"``, ``"interrupted"`` or
+        ``"not_found"`` (already finished, or the queue can't be read).
+        """
+        cancel = getattr(self.comfyui_client, "cancel_prompt", None)
+        interrupt = getattr(self.comfyui_client, "interrupt", None)
+        if not asyncio.iscoroutinefunction(cancel):
+            return "not_found"
+
+        state = await self._queue_state(prompt_id)
+        outcome = "not_found"
+        if state == "running" and asyncio.iscoroutinefunction(interrupt):
+            if await interrupt(prompt_id):
+                outcome = "interrupted"
+        elif state == "pending":
+            if await cancel(prompt_id):
+                outcome = "removed"
+        elif state is None:
+            # The queue can't be read: deleting blindly is harmless,
+            # interrupting blindly is not.
+            await cancel(prompt_id)
+        if outcome != "not_found":
+            self.cancelled_prompts += 1
+            logger.info(f"Cancelled prompt {prompt_id} ({outcome})")
+        return outcome
+
+    def shutdown(self) -> None:
+        """Generations cancelled from now on are being torn down with the
+        process: leave their prompts running and their jobs in the journal,
+        so the next start picks them up."""
+        self._shutting_down = True
+
+    def checkpoint_for(self, parameters: Dict[str, Any]) -> Optional[str]:
+        """The checkpoint a generation with ``parameters`` would load."""
+        checkpoint = parameters.get("checkpoint")
+        if checkpoint:
+            return str(checkpoint)
+        return self._get_template(self._template_name(parameters)).checkpoint
+
+    async def _run_coalesced(
+        self,
+        workflow: Dict[str, Any],
+        workflow_key: str,
+        on_event: Optional[EventCallback],
     ) -> Dict[str, Any]:
-        template = self.workflow_templates.get(
-            template_name, self.workflow_templates["basic_generation"]
+        # Coalesced callers share one prompt, so the coalescer fans its
+        # progress out to every caller waiting on this workflow.
+        return await self.coalescer.run(
+            workflow_key,
+            lambda publish: self._submit_and_wait(workflow, workflow_key, publish),
+            on_event,
         )
-        workflow = json.loads(json.dumps(template))
 
-        prompt = parameters.get("prompt", "a beautiful landscape")
+    def _journal_record(
+        self, parameters: Dict[str, Any], workflow_key: str, origin: Dict[str, Any]
+    ) -> str:
+        assert self.journal is not None
+        job_id = self.journal.record(
+            parameters,
+            workflow_key,
+            user_id=origin.get("user_id"),
+            platform=origin.get("platform"),
+        )
+        self._journal_jobs.setdefault(workflow_key, []).append(job_id)
+        submitted = self._journal_prompts.get(workflow_key)
+        if submitted is not None:
+            # Joined a prompt that is already queued.
+            self.journal.submitted(job_id, *submitted)
+        return job_id
 
-        for node_id, node in workflow.items():
-            if node.get("class_type") == "CLIPTextEncode" and "{prompt}" in str(
-                node.get("inputs", {})
-            ):
-                node["inputs"]["text"] = node["inputs"]["text"].replace(
-                    "{prompt}", prompt
+    def _journal_submitted(
+        self, workflow_key: str, prompt_id: str, node_map: Optional[Dict[str, str]]
+    ) -> None:
+        assert self.journal is not None
+        self._journal_prompts[workflow_key] = (prompt_id, node_map)
+        for job_id in self._journal_jobs.get(workflow_key, ()):
+            self.journal.submitted(job_id, prompt_id, node_map)
+
+    def _journal_finish(
+        self, workflow_key: str, job_id: str, result: Dict[str, Any]
+    ) -> None:
+        assert self.journal is not None
+        self.journal.finish(job_id, result)
+        self._journal_forget(workflow_key, job_id)
+
+    def _journal_forget(self, workflow_key: str, job_id: str) -> None:
+        jobs = self._journal_jobs.get(workflow_key, [])
+        if job_id in jobs:
+            jobs.remove(job_id)
+        if not jobs:
+            self._journal_jobs.pop(workflow_key, None)
+            self._journal_prompts.pop(workflow_key, None)
+
+    async def _submit_and_wait(
+        self, workflow: Dict[str, Any], workflow_key: str, on_event: EventCallback
+    ) -> Dict[str, Any]:
+        options: Dict[str, Any] = {}
+        if self.journal is not None:
+
+            def on_submitted(
+                prompt_id: str, node_map: Optional[Dict[str, str]]
+            ) -> None:
+                self._journal_submitted(workflow_key, prompt_id, node_map)
+
+            options["on_submitted"] = on_submitted
+
+        if self.batcher is not None:
+            result = await self.batcher.run(workflow, on_event, **options)
+        else:
+            result = await self._queue_and_wait(workflow, on_event, **options)
+
+        if not result.get("success"):
+            return result
+
+        cached = {"prompt_id": result["prompt_id"], "outputs": result["outputs"]}
+        if self.artifact_store is not None:
+            result["artifacts"] = cached["artifacts"] = await self._collect_artifacts(
+                result["prompt_id"], result["outputs"]
+            )
+            if self.post_processor is not None and result["artifacts"]:
+                result["renditions"] = await self.post_processor.process(
+                    result["artifacts"]
+                )
+        # An empty result would be served to every identical request.
+        if self.result_cache is not None and result["outputs"]:
+            self.result_cache.put(workflow_key, cached)
+        return result
+
+    async def _collect_artifacts(
+        self, prompt_id: str, outputs: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Stream every output image into the artifact store."""
+        download = getattr(self.comfyui_client, "download_image", None)
+        if self.artifact_store is None or not asyncio.iscoroutinefunction(download):
+            return []
+
+        images = [
+            (node_id, image)
+            for node_id, output in outputs.items()
+            if isinstance(output, dict)
+            for image in output.get("images") or []
+            if isinstance(image, dict)
+        ]
+        downloaded = await asyncio.gather(
+            *(download(image, self.artifact_store, prompt_id) for _, image in images),
+            return_exceptions=True,
+        )
+        artifacts = []
+        for (node_id, image), artifact in zip(images, downloaded):
+            if isinstance(artifact, BaseException):
+                logger.error(f"Error storing {image.get('filename')}: {artifact}")
+            elif artifact is not None:
+                artifacts.append(
+                    {
+                        "node_id": node_id,
+                        "filename": image["filename"],
+                        **artifact.to_dict(),
+                    }
                 )
+        return artifacts
 
-        return dict(workflow)
+    def _artifacts_missing(self, cached: Dict[str, Any]) -> bool:
+        if self.artifact_store is None:
+            return False
+        artifacts = cached.get("artifacts")
+        if artifacts is None:
+            return True
+        return any(
+            artifact["digest"] not in self.artifact_store for artifact in artifacts
+        )
+
+    async def _queue_and_wait(
+        self,
+        workflow: Dict[str, Any],
+        on_event: Optional[EventCallback] = None,
+        on_submitted: Optional[SubmittedCallback] = None,
+    ) -> Dict[str, Any]:
+        prompt_id = await self.comfyui_client.queue_prompt(workflow)
+        if not prompt_id:
+            return {"error": "Failed to queue prompt"}
+        self._track_checkpoint(workflow)
+        if on_submitted is not None:
+            on_submitted(prompt_id, None)
+
+        try:
+            result = await self._follow_submitted(prompt_id, on_event)
+        except asyncio.CancelledError:
+            # Nobody is waiting any more; don't await the cleanup in a task
+            # that is being cancelled.
+            if not self._shutting_down:
+                task = asyncio.ensure_future(self.cancel_prompt(prompt_id))
+                self._cancellations.add(task)
+                task.add_done_callback(self._cancellations.discard)
+            raise
+        if result.get("timeout"):
+            await self.cancel_prompt(prompt_id)
+        return result
+
+    async def _follow_submitted(
+        self, prompt_id: str, on_event: Optional[EventCallback]
+    ) -> Dict[str, Any]:
+        if on_event is None:
+            return await self._wait_for_completion(prompt_id)
+
+        on_event(
+            {
+                "type": "submitted",
+                "prompt_id": prompt_id,
+                "position": await self._queue_position(prompt_id),
+            }
+        )
+        add_listener = getattr(self.comfyui_client, "add_progress_listener", None)
+        if not callable(add_listener):
+            return await self._wait_for_completion(prompt_id)
+
+        add_listener(prompt_id, on_event)
+        try:
+            return await self._wait_for_completion(prompt_id)
+        finally:
+            self.comfyui_client.remove_progress_listener(prompt_id, on_event)
+
+    async def _queue_position(self, prompt_id: str) -> Optional[int]:
+        """Prompts ahead of ``prompt_id`` in ComfyUI's queue (0 = running)."""
+        try:
+            status = await self.comfyui_client.get_queue_status()
+        except Exception as e:
+            logger.debug(f"Could not read queue position for {prompt_id}: {e}")
+            return None
+        if not isinstance(status, dict) or "error" in status:
+            return None
+
+        running = status.get("queue_running", [])
+        if any(len(item) > 1 and item[1] == prompt_id for item in running):
+            return 0
+        pending = sorted(status.get("queue_pending", []), key=lambda item: item[0])
+        for index, item in enumerate(pending):
+            if len(item) > 1 and item[1] == prompt_id:
+                return len(running) + index
+        return None
+
+    def _track_checkpoint(self, workflow: Dict[str, Any]) -> None:
+        checkpoint = workflow_checkpoint(workflow)
+        if checkpoint is None:
+            return
+        if self.hot_checkpoint is not None and checkpoint != self.hot_checkpoint:
+            self.checkpoint_swaps += 1
+        self.hot_checkpoint = checkpoint
+
+    def _template_name(self, parameters: Dict[str, Any]) -> str:
+        if parameters.get("nsfw_filter", False):
+            return "nsfw_filtered_generation"
+        return "basic_generation"
+
+    def _create_workflow_from_template(
+        self, template_name: str, parameters: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        with self._stage("template"):
+            return self._get_template(template_name).render(parameters)
+
+    def _get_template(self, template_name: str) -> CompiledTemplate:
+        if self.template_registry is not None:
+            template = self.template_registry.get(template_name)
+            if template is not None:
+                return template
+        return self.compiled_templates.get(
+            template_name, self.compiled_templates["basic_generation"]
+        )
 
     async def _wait_for_completion(
-        self, prompt_id: str, timeout: int = 300
+        self, prompt_id: str, timeout: Optional[float] = None
     ) -> Dict[str, Any]:
-        start_time = asyncio.get_event_loop().time()
+        if timeout is None:
+            timeout = self.generation_timeout
+        with self._stage("wait_for_completion"):
+            add_listener = getattr(self.comfyui_client, "add_progress_listener", None)
+            if self.metrics is None or not callable(add_listener):
+                return await self._await_outputs(prompt_id, timeout)
+
+            # Split the wait at the first sign of execution, so time spent
+            # behind other prompts isn't read as slow sampling.
+            stages = contextlib.ExitStack()
+            stages.enter_context(self._stage("queue_wait"))
+            executing = False
 
+            def on_event(event: Dict[str, Any]) -> None:
+                nonlocal executing
+                if not executing and event.get("type") in ("executing", "progress"):
+                    executing = True
+                    stages.close()
+                    stages.enter_context(self._stage("execution"))
+
+            add_listener(prompt_id, on_event)
+            try:
+                with stages:
+                    return await self._await_outputs(prompt_id, timeout)
+            finally:
+                self.comfyui_client.remove_progress_listener(prompt_id, on_event)
+
+    async def _await_outputs(self, prompt_id: str, timeout: float) -> Dict[str, Any]:
+        loop = asyncio.get_event_loop()
+        start_time = loop.time()
+
+        wait_for_prompt = getattr(self.comfyui_client, "wait_for_prompt", None)
+        if asyncio.iscoroutinefunction(wait_for_prompt):
+            event = await wait_for_prompt(prompt_id, timeout)
+            status = event.get("status")
+            if status == "timeout":
+                return self._timed_out(prompt_id)
+            if status in ("error", "interrupted"):
+                logger.error(f"Generation failed for prompt {prompt_id}: {event}")
+                self._record_error("wait_for_completion", f"execution_{status}")
+                return {
+                    "error": event.get("error", f"Generation {status}"),
+                    "prompt_id": prompt_id,
+                }
+            if status == "completed":
+                result = await self._fetch_outputs(prompt_id)
+                if result is not None:
+                    return result
+            # WebSocket unavailable (or history lagging): fall back to polling
+            # for whatever time is left.
+
+        return await self._poll_outputs(prompt_id, timeout - (loop.time() - start_time))
+
+    async def _follow_prompt(self, prompt_id: str, timeout: float) -> Dict[str, Any]:
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        while loop.time() < deadline:
+            result = await self._fetch_outputs(prompt_id)
+            if result is not None:
+                return result
+            if await self._queue_state(prompt_id) == "missing":
+                # It may have finished between the two requests.
+                result = await self._fetch_outputs(prompt_id)
+                return result or {
+                    "error": f"Prompt {prompt_id} is no longer known to ComfyUI",
+                    "prompt_id": prompt_id,
+                    "lost": True,
+                }
+            await asyncio.sleep(2)
+        await self.cancel_prompt(prompt_id)
+        return self._timed_out(prompt_id)
+
+    async def _queue_state(self, prompt_id: str) -> Optional[str]:
+        """``"running"``, ``"pending"`` or ``"missing"`` for ``prompt_id`` in
+        ComfyUI's queue; None when the queue can't be read."""
+        try:
+            status = await self.comfyui_client.get_queue_status()
+        except Exception as e:
+            logger.debug(f"Could not read the queue for {prompt_id}: {e}")
+            return None
+        if not isinstance(status, dict) or "error" in status:
+            return None
+        for key, state in (("queue_running", "running"), ("queue_pending", "pending")):
+            if any(
+                len(item) > 1 and item[1] == prompt_id for item in status.get(key, [])
+            ):
+                return state
+        return "missing"
+
+    def _timed_out(self, prompt_id: str) -> Dict[str, Any]:
+        self._record_error("wait_for_completion", "timeout")
+        return {"error": TIMEOUT_ERROR, "prompt_id": prompt_id, "timeout": True}
+
+    async def _poll_outputs(self, prompt_id: str, timeout: float) -> Dict[str, Any]:
+        loop = asyncio.get_event_loop()
+        start_time = loop.time()
         while True:
-            if asyncio.get_event_loop().time() - start_time > timeout:
-                return {"error": "Timeout waiting for completion"}
-
-            history = await self.comfyui_client.get_history(prompt_id)
-
-            if prompt_id in history:
-                prompt_history = history[prompt_id]
-                if "outputs" in prompt_history:
-                    logger.success(f"Generation completed for prompt {prompt_id}")
-                    return {
-                        "success": True,
-                        "prompt_id": prompt_id,
-                        "outputs": prompt_history["outputs"],
-                    }
+            if loop.time() - start_time > timeout:
+                return self._timed_out(prompt_id)
+
+            result = await self._fetch_outputs(prompt_id)
+            if result is not None:
+                return result
 
             await asyncio.sleep(2)
+
+    def _stage(self, stage: str) -> ContextManager[Any]:
+        if self.metrics is None:
+            return contextlib.nullcontext()
+        timer: ContextManager[Any] = self.metrics.stage(stage)
+        return timer
+
+    def _record_error(self, stage: str, error_type: str) -> None:
+        if self.metrics is not None:
+            self.metrics.record_error(stage, error_type)
+
+    async def _fetch_outputs(self, prompt_id: str) -> Optional[Dict[str, Any]]:
+        history = await self.comfyui_client.get_history(prompt_id)
+
+        if prompt_id in history:
+            prompt_history = history[prompt_id]
+            status = prompt_history.get("status") or {}
+            if status.get("status_str") == "error" or status.get("completed") is False:
+                error = _history_error(status)
+                logger.error(f"Generation failed for prompt {prompt_id}: {error}")
+                self._record_error("wait_for_completion", "execution_error")
+                return {"error": error, "prompt_id": prompt_id}
+            if "outputs" in prompt_history:
+                logger.success(f"Generation completed for prompt {prompt_id}")
+                return {
+                    "success": True,
+                    "prompt_id": prompt_id,
+                    "outputs": prompt_history["outputs"],
+                }
+        return None
+
+
+def _history_error(status: Dict[str, Any]) -> str:
+    """The error message ComfyUI recorded in a failed prompt's history."""
+    for message in status.get("messages") or []:
+        if not isinstance(message, (list, tuple)) or len(message) < 2:
+            continue
+        kind, data = message[0], message[1]
+        if kind == "execution_error" and isinstance(data, dict):
+            return str(data.get("exception_message") or "Generation error")
+        if kind == "execution_interrupted":
+            return "Generation interrupted"
+    return "Generation error"
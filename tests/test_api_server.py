@@ -0,0 +1,311 @@
+import asyncio
+from pathlib import Path
+from typing import Any, AsyncGenerator, AsyncIterator, Dict
+from unittest.mock import AsyncMock, Mock
+
+import aiohttp
+import pytest
+from aiohttp.test_utils import TestServer
+
+from src.api_server import APIServer, JobRegistry
+from src.monitoring import Metrics
+
+
+class FakeChatManager:
+    def __init__(self) -> None:
+        self.release = asyncio.Event()
+
+    async def stream_message(
+        self, user_id: str, message: str, platform: str = "default"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        if message.startswith("draw nude"):
+            yield {
+                "type": "completed",
+                "success": False,
+                "response": "rejected",
+                "error": "prompt_rejected",
+                "data": {"screening": {"action": "block"}},
+            }
+            return
+        if not message.startswith("draw"):
+            yield {"type": "intent", "intent": "general", "parameters": {}}
+            yield {"type": "completed", "success": True, "response": "hi"}
+            return
+
+        yield {
+            "type": "intent",
+            "intent": "image_generation",
+            "parameters": {"prompt": message},
+        }
+        yield {"type": "submitted", "prompt_id": "p1", "position": 0}
+        await self.release.wait()
+        yield {"type": "progress", "prompt_id": "p1", "value": 14, "max": 28}
+        yield {
+            "type": "completed",
+            "success": True,
+            "data": {"prompt_id": "p1", "outputs": {"9": {"images": []}}},
+        }
+
+
+@pytest.fixture
+def chat_manager() -> FakeChatManager:
+    return FakeChatManager()
+
+
+@pytest.fixture
+def comfyui_client() -> Mock:
+    client = Mock()
+    client.get_history = AsyncMock(return_value={})
+    client.get_queue_status = AsyncMock(
+        return_value={
+            "queue_running": [[1, "p1", {}]],
+            "queue_pending": [[3, "p3", {}], [2, "p2", {}]],
+        }
+    )
+    return client
+
+
+@pytest.fixture
+async def server(
+    chat_manager: FakeChatManager, comfyui_client: Mock
+) -> AsyncGenerator[TestServer, None]:
+    api = APIServer(chat_manager, comfyui_client, registry=JobRegistry())
+    test_server = TestServer(api.create_app())
+    await test_server.start_server()
+    yield test_server
+    await test_server.close()
+
+
+async def wait_for_status(
+    session: aiohttp.ClientSession, url: str, status: str
+) -> Dict[str, Any]:
+    for _ in range(50):
+        async with session.get(url) as response:
+            body: Dict[str, Any] = await response.json()
+        if body.get("status") == status:
+            return body
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"{url} never reached {status}")
+
+
+class TestAPIServer:
+    @pytest.mark.asyncio
+    async def test_generation_returns_job_id_immediately(
+        self, server: TestServer, chat_manager: FakeChatManager
+    ) -> None:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                server.make_url("/api/v1/chat/process"),
+                json={"message": "draw a cat", "user_id": "u1"},
+            ) as response:
+                assert response.status == 202
+                body = await response.json()
+
+            status_url = server.make_url(body["data"]["status_url"])
+            queued = await wait_for_status(session, str(status_url), "queued")
+            assert queued["prompt_id"] == "p1"
+
+            chat_manager.release.set()
+            done = await wait_for_status(session, str(status_url), "completed")
+            assert done["progress"] == 100
+            assert done["outputs"] == {"9": {"images": []}}
+
+            # The prompt id works as a lookup key too.
+            async with session.get(
+                server.make_url("/api/v1/generation/status/p1")
+            ) as response:
+                assert (await response.json())["job_id"] == body["data"]["job_id"]
+
+    @pytest.mark.asyncio
+    async def test_non_generation_message_answers_inline(
+        self, server: TestServer
+    ) -> None:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                server.make_url("/api/v1/chat/process"), json={"message": "hello"}
+            ) as response:
+                assert response.status == 200
+                assert await response.json() == {"success": True, "response": "hi"}
+
+    @pytest.mark.asyncio
+    async def test_rejected_prompt(self, server: TestServer) -> None:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                server.make_url("/api/v1/chat/process"),
+                json={"message": "draw nude people"},
+            ) as response:
+                assert response.status == 422
+                body = await response.json()
+
+        assert body["error"] == {
+            "code": "NSFW_CONTENT_DETECTED",
+            "message": "rejected",
+            "details": {"screening": {"action": "block"}},
+        }
+
+    @pytest.mark.asyncio
+    async def test_status_of_job_on_another_worker(
+        self, tmp_path: Path, chat_manager: FakeChatManager, comfyui_client: Mock
+    ) -> None:
+        db_path = str(tmp_path / "jobs.db")
+        servers = [
+            TestServer(
+                APIServer(
+                    chat_manager, comfyui_client, registry=JobRegistry(db_path=db_path)
+                ).create_app()
+            )
+            for _ in range(2)
+        ]
+        for test_server in servers:
+            await test_server.start_server()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(
+                    servers[0].make_url("/api/v1/chat/process"),
+                    json={"message": "draw a cat"},
+                ) as response:
+                    job_id = (await response.json())["data"]["job_id"]
+
+                other = str(servers[1].make_url(f"/api/v1/generation/status/{job_id}"))
+                queued = await wait_for_status(session, other, "queued")
+                assert queued["prompt_id"] == "p1"
+                by_prompt = str(servers[1].make_url("/api/v1/generation/status/p1"))
+                assert (await wait_for_status(session, by_prompt, "queued"))[
+                    "job_id"
+                ] == job_id
+
+                chat_manager.release.set()
+                done = await wait_for_status(session, other, "completed")
+                assert done["outputs"] == {"9": {"images": []}}
+        finally:
+            for test_server in servers:
+                await test_server.close()
+
+    @pytest.mark.asyncio
+    async def test_invalid_request(self, server: TestServer) -> None:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                server.make_url("/api/v1/chat/process"), json={}
+            ) as response:
+                assert response.status == 400
+                assert (await response.json())["error"]["code"] == "INVALID_PROMPT"
+
+    @pytest.mark.asyncio
+    async def test_unknown_status_is_404(self, server: TestServer) -> None:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(
+                server.make_url("/api/v1/generation/status/nope")
+            ) as response:
+                assert response.status == 404
+
+    @pytest.mark.asyncio
+    async def test_queue_positions(self, server: TestServer) -> None:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(
+                server.make_url("/api/v1/generation/queue")
+            ) as response:
+                body = await response.json()
+
+        assert body["queue_running"] == [{"prompt_id": "p1", "position": 0}]
+        assert body["queue_pending"] == [
+            {"prompt_id": "p2", "position": 1},
+            {"prompt_id": "p3", "position": 2},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_websocket_streams_progress(
+        self, server: TestServer, chat_manager: FakeChatManager
+    ) -> None:
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(server.make_url("/ws")) as ws:
+                await ws.send_json(
+                    {
+                        "type": "chat_message",
+                        "data": {"message": "draw a cat", "user_id": "u1"},
+                    }
+                )
+                response = await ws.receive_json(timeout=1)
+                assert response["type"] == "chat_response"
+                chat_manager.release.set()
+
+                types = []
+                while not types or types[-1] != "generation_complete":
+                    types.append((await ws.receive_json(timeout=1))["type"])
+
+        assert "generation_progress" in types
+
+    @pytest.mark.asyncio
+    async def test_api_key_required(
+        self, chat_manager: FakeChatManager, comfyui_client: Mock
+    ) -> None:
+        api = APIServer(chat_manager, comfyui_client, api_key="secret")
+        test_server = TestServer(api.create_app())
+        await test_server.start_server()
+        try:
+            async with aiohttp.ClientSession() as session:
+                url = test_server.make_url("/api/v1/generation/queue")
+                async with session.get(url) as response:
+                    assert response.status == 401
+                async with session.get(
+                    url, headers={"Authorization": "Bearer secret"}
+                ) as response:
+                    assert response.status == 200
+        finally:
+            await test_server.close()
+
+    @pytest.mark.asyncio
+    async def test_api_key_protects_websocket_and_files(
+        self, chat_manager: FakeChatManager, comfyui_client: Mock
+    ) -> None:
+        artifact_store = Mock()
+        artifact_store.get.return_value = None
+        api = APIServer(
+            chat_manager,
+            comfyui_client,
+            api_key="secret",
+            artifact_store=artifact_store,
+        )
+        test_server = TestServer(api.create_app())
+        await test_server.start_server()
+        try:
+            async with aiohttp.ClientSession() as session:
+                with pytest.raises(aiohttp.WSServerHandshakeError) as refused:
+                    await session.ws_connect(test_server.make_url("/ws"))
+                assert refused.value.status == 401
+                async with session.ws_connect(
+                    test_server.make_url("/ws").with_query(token="secret")
+                ) as ws:
+                    await ws.send_json(
+                        {"type": "chat_message", "data": {"message": "hello"}}
+                    )
+                    assert (await ws.receive_json())["type"] == "chat_response"
+
+                output = test_server.make_url("/outputs/abc.png")
+                async with session.get(output) as response:
+                    assert response.status == 401
+                async with session.get(output.with_query(token="secret")) as response:
+                    assert response.status == 404
+                async with session.get(test_server.make_url("/health")) as response:
+                    assert response.status == 200
+        finally:
+            await test_server.close()
+
+    @pytest.mark.asyncio
+    async def test_metrics_endpoint(
+        self, chat_manager: FakeChatManager, comfyui_client: Mock
+    ) -> None:
+        metrics = Metrics()
+        with metrics.stage("intent"):
+            pass
+        api = APIServer(chat_manager, comfyui_client, metrics=metrics)
+        test_server = TestServer(api.create_app())
+        await test_server.start_server()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(test_server.make_url("/metrics")) as response:
+                    assert response.status == 200
+                    assert response.content_type == "text/plain"
+                    body = await response.text()
+            assert 'chat_ai_stage_duration_seconds_count{stage="intent"} 1.0' in body
+        finally:
+            await test_server.close()
@@ -0,0 +1,104 @@
+from pathlib import Path
+from typing import AsyncGenerator, AsyncIterator, List
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.comfyui_control import ArtifactStore, ComfyUIClient, RetryPolicy
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 512
+REQUESTED: List[str] = []
+
+
+async def chunks(data: bytes, size: int = 1000) -> AsyncIterator[bytes]:
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+@pytest.fixture
+async def server() -> AsyncGenerator[TestServer, None]:
+    REQUESTED.clear()
+
+    async def system_stats(request: web.Request) -> web.Response:
+        return web.json_response({"system": {}})
+
+    async def view(request: web.Request) -> web.StreamResponse:
+        REQUESTED.append(request.query_string)
+        if request.query["filename"] != "image.png":
+            return web.Response(status=404)
+        return web.Response(body=PNG, content_type="image/png")
+
+    app = web.Application()
+    app.router.add_get("/system_stats", system_stats)
+    app.router.add_get("/view", view)
+    test_server = TestServer(app)
+    await test_server.start_server()
+    yield test_server
+    await test_server.close()
+
+
+class TestArtifactStore:
+    @pytest.mark.asyncio
+    async def test_identical_content_is_stored_once(self, tmp_path: Path) -> None:
+        store = ArtifactStore(str(tmp_path))
+
+        first = await store.store_stream(chunks(PNG), ".png")
+        second = await store.store_stream(chunks(PNG, 333), ".png")
+
+        assert first.path == second.path
+        assert first.path.read_bytes() == PNG
+        assert first.path.name == f"{first.digest}.png"
+        assert store.stats()["deduplicated"] == 1
+        assert store.total_bytes == len(PNG)
+        assert list((tmp_path / ".tmp").iterdir()) == []
+
+    @pytest.mark.asyncio
+    async def test_evicts_least_recently_used(self, tmp_path: Path) -> None:
+        store = ArtifactStore(str(tmp_path), max_bytes=250)
+        a = await store.store_stream(chunks(b"a" * 100))
+        b = await store.store_stream(chunks(b"b" * 100))
+        store.get(a.digest)
+
+        c = await store.store_stream(chunks(b"c" * 100))
+
+        assert b.digest not in store
+        assert not b.path.exists()
+        assert a.digest in store and c.digest in store
+        assert store.total_bytes == 200
+
+    @pytest.mark.asyncio
+    async def test_index_survives_restart_and_mmaps(self, tmp_path: Path) -> None:
+        artifact = await ArtifactStore(str(tmp_path)).store_stream(chunks(PNG), ".png")
+
+        reopened = ArtifactStore(str(tmp_path))
+        mapped = reopened.open_mmap(artifact.digest)
+
+        assert mapped is not None
+        assert mapped[:8] == PNG[:8]
+        assert len(mapped) == len(PNG)
+        mapped.close()
+
+    @pytest.mark.asyncio
+    async def test_client_streams_view_into_store(
+        self, server: TestServer, tmp_path: Path
+    ) -> None:
+        client = ComfyUIClient(
+            host=str(server.host),
+            port=int(server.port or 0),
+            retry_policy=RetryPolicy(max_attempts=1),
+        )
+        await client.http.open()
+        store = ArtifactStore(str(tmp_path))
+        try:
+            artifact = await client.download_image(
+                {"filename": "image.png", "subfolder": "", "type": "output"}, store
+            )
+            missing = await client.download_image({"filename": "nope.png"}, store)
+        finally:
+            await client.disconnect()
+
+        assert artifact is not None
+        assert artifact.path.read_bytes() == PNG
+        assert missing is None
+        assert "filename=image.png" in REQUESTED[0]
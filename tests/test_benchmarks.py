@@ -0,0 +1,196 @@
+import asyncio
+from pathlib import Path
+from typing import AsyncGenerator, Tuple
+
+import pytest
+
+from benchmarks.fake_comfyui import FakeComfyUI
+from benchmarks.micro import (
+    compare,
+    large_workflow,
+    measure,
+    message_corpus,
+    run_suite,
+    run_sync,
+)
+from benchmarks.throughput import generation_messages, percentile, run_benchmark
+from src.comfyui_control import ArtifactStore, ComfyUIClient
+
+pytestmark = pytest.mark.integration
+
+WORKFLOW = {
+    "4": {"class_type": "KSampler", "inputs": {"seed": 1}},
+    "9": {"class_type": "SaveImage", "inputs": {"images": ["4", 0]}},
+}
+
+
+@pytest.fixture
+async def fake_client() -> AsyncGenerator[Tuple[FakeComfyUI, ComfyUIClient], None]:
+    fake = FakeComfyUI(execution_delay=0.02, steps=2, seed=0)
+    port = await fake.start()
+    client = ComfyUIClient(port=port)
+    assert await client.connect()
+    yield fake, client
+    await client.disconnect()
+    await fake.stop()
+
+
+class TestFakeComfyUI:
+    async def test_prompt_runs_to_completion(
+        self, fake_client: Tuple[FakeComfyUI, ComfyUIClient], tmp_path: Path
+    ) -> None:
+        fake, client = fake_client
+        events = []
+
+        prompt_id = await client.queue_prompt(WORKFLOW)
+        assert prompt_id is not None
+        client.add_progress_listener(prompt_id, events.append)
+        finished = await client.wait_for_prompt(prompt_id, 5)
+        history = await client.get_history(prompt_id)
+
+        assert finished["status"] == "completed"
+        assert [event["value"] for event in events if event["type"] == "progress"] == [
+            1,
+            2,
+        ]
+        image = history[prompt_id]["outputs"]["9"]["images"][0]
+        artifact = await client.download_image(image, ArtifactStore(str(tmp_path)))
+        assert artifact is not None
+        assert artifact.path.read_bytes().startswith(b"\x89PNG")
+        assert fake.stats()["completed"] == 1
+
+    async def test_failure_injection(self) -> None:
+        fake = FakeComfyUI(execution_delay=0, failure_rate=1.0)
+        port = await fake.start()
+        client = ComfyUIClient(port=port)
+        try:
+            assert await client.connect()
+            prompt_id = await client.queue_prompt(WORKFLOW)
+            assert prompt_id is not None
+            finished = await client.wait_for_prompt(prompt_id, 5)
+        finally:
+            await client.disconnect()
+            await fake.stop()
+
+        assert finished["status"] == "error"
+        assert finished["error"] == "injected failure"
+
+    async def test_late_waiter_sees_failure(
+        self, fake_client: Tuple[FakeComfyUI, ComfyUIClient]
+    ) -> None:
+        fake, client = fake_client
+        fake.failure_rate = 1.0
+        prompt_id = await client.queue_prompt(WORKFLOW)
+        assert prompt_id is not None
+        while not fake.stats()["failed"]:
+            await asyncio.sleep(0.01)
+        # Let the trailing "executing" event arrive before anyone waits.
+        await asyncio.sleep(0.05)
+
+        finished = await client.wait_for_prompt(prompt_id, 5)
+
+        assert finished["status"] == "error"
+
+    async def test_queue_delete_and_interrupt(
+        self, fake_client: Tuple[FakeComfyUI, ComfyUIClient]
+    ) -> None:
+        fake, client = fake_client
+        fake.execution_delay = 60
+        running = await client.queue_prompt(WORKFLOW)
+        pending = await client.queue_prompt(WORKFLOW)
+        assert running is not None and pending is not None
+        while running not in fake.running:
+            await asyncio.sleep(0.01)
+
+        assert await client.cancel_prompt(pending) is True
+        assert await client.interrupt(running) is True
+        finished = await client.wait_for_prompt(running, 5)
+
+        assert finished["status"] == "interrupted"
+        assert fake.stats()["deleted"] == 1
+        assert fake.stats()["interrupted"] == 1
+        assert fake.stats()["pending"] == 0
+
+
+class TestThroughputBenchmark:
+    def test_percentile(self) -> None:
+        values = [float(v) for v in range(1, 101)]
+
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile([], 50) == 0.0
+
+    def test_generation_messages_repeat_distinct_prompts(self) -> None:
+        messages = generation_messages(10, distinct=2)
+
+        assert len(messages) == 10
+        assert len({message.rsplit("#", 1)[1] for message in messages}) == 2
+
+    async def test_run_benchmark_reports_latency(self) -> None:
+        report = await run_benchmark(
+            requests=12,
+            concurrency=4,
+            fake_options={"execution_delay": 0.01, "workers": 2, "seed": 0},
+        )
+
+        assert report["succeeded"] == 12
+        assert report["failed"] == 0
+        assert report["jobs_per_sec"] > 0
+        assert 0 < report["latency_ms"]["p50"] <= report["latency_ms"]["p99"]
+        assert report["stages"]["queue_prompt"]["count"] == 12
+        assert report["backend"]["completed"] == 12
+
+    async def test_checkpoint_affinity_reduces_swaps(self) -> None:
+        options = {"execution_delay": 0, "swap_delay": 0.01, "seed": 0}
+        reports = [
+            await run_benchmark(
+                requests=24,
+                concurrency=24,
+                max_concurrent_generations=1,
+                checkpoints=3,
+                affinity_window=window,
+                fake_options=options,
+            )
+            for window in (0, 8)
+        ]
+
+        strict, affinity = (report["backend"]["checkpoint_loads"] for report in reports)
+        assert strict > affinity
+        assert reports[1]["scheduler"]["affinity"]["reordered"] > 0
+
+
+class TestMicroBenchmarks:
+    def test_corpora(self) -> None:
+        assert message_corpus(50) == message_corpus(50)
+        assert len(large_workflow()) > 100
+
+    def test_run_sync_drives_coroutine(self) -> None:
+        async def answer() -> int:
+            return 42
+
+        assert run_sync(answer()) == 42
+
+    def test_measure_reports_throughput_and_memory(self) -> None:
+        result = measure(lambda: [0] * 1000, min_time=0.01, rounds=2)
+
+        assert result["ops_per_sec"] > 0
+        assert result["peak_bytes"] >= 8000
+        assert result["retained_bytes_per_op"] < 100
+
+    def test_suite_and_regression_check(self) -> None:
+        results = run_suite(["render_basic_template"], min_time=0.01, rounds=1)
+        current = results["benchmarks"]["render_basic_template"]
+
+        assert compare(results, results) == []
+        slower = {
+            "benchmarks": {
+                "render_basic_template": {
+                    **current,
+                    "normalized": current["normalized"] * 2,
+                    "peak_bytes": current["peak_bytes"] / 4 - 1024,
+                }
+            }
+        }
+        regressions = compare(results, slower)
+        assert len(regressions) == 2
+        assert regressions[0].startswith("render_basic_template: normalized")
@@ -0,0 +1,182 @@
+import asyncio
+from typing import Any, Dict
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from src.chat_interface import ChatManager
+from src.intent_processing import PromptScreener
+
+
+class TestChatManager:
+    @pytest.fixture
+    def intent_processor(self) -> Mock:
+        processor = Mock()
+        processor.process = AsyncMock(
+            return_value={
+                "intent": "image_generation",
+                "parameters": {"prompt": "a cat"},
+            }
+        )
+        return processor
+
+    @pytest.fixture
+    def orchestrator(self) -> Mock:
+        orchestrator = Mock()
+        orchestrator.execute_generation = AsyncMock(
+            return_value={"success": True, "prompt_id": "p1", "outputs": {}}
+        )
+        return orchestrator
+
+    @pytest.mark.asyncio
+    async def test_process_message_generates_image(
+        self, intent_processor: Mock, orchestrator: Mock
+    ) -> None:
+        manager = ChatManager(intent_processor, orchestrator)
+
+        result = await manager.process_message("user", "draw a cat")
+
+        assert result["success"] is True
+        assert result["data"]["prompt_id"] == "p1"
+
+    @pytest.mark.asyncio
+    async def test_process_message_goes_through_scheduler(
+        self, intent_processor: Mock, orchestrator: Mock
+    ) -> None:
+        scheduler = Mock()
+        scheduler.submit = AsyncMock(return_value={"success": True})
+        manager = ChatManager(intent_processor, orchestrator, scheduler)
+
+        await manager.process_message("user", "draw a cat", priority=0)
+
+        scheduler.submit.assert_awaited_once_with(
+            "user", {"prompt": "a cat"}, priority=0
+        )
+        orchestrator.execute_generation.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_process_message_busy(
+        self, intent_processor: Mock, orchestrator: Mock
+    ) -> None:
+        scheduler = Mock()
+        scheduler.submit = AsyncMock(
+            return_value={"error": "Generation queue is full", "busy": True}
+        )
+        manager = ChatManager(intent_processor, orchestrator, scheduler)
+
+        result = await manager.process_message("user", "draw a cat")
+
+        assert result["success"] is False
+        assert result["error"] == "busy"
+
+    @pytest.mark.asyncio
+    async def test_stream_message_yields_progress_then_result(
+        self, intent_processor: Mock, orchestrator: Mock
+    ) -> None:
+        async def submit(
+            user_id: str, parameters: Dict[str, Any], on_event: Any
+        ) -> Dict[str, Any]:
+            on_event({"type": "queued", "position": 1})
+            await asyncio.sleep(0)
+            on_event({"type": "progress", "value": 14, "max": 28})
+            return {"success": True, "prompt_id": "p1", "outputs": {}}
+
+        scheduler = Mock()
+        scheduler.submit = submit
+        manager = ChatManager(intent_processor, orchestrator, scheduler)
+
+        events = [e async for e in manager.stream_message("user", "draw a cat")]
+
+        assert [event["type"] for event in events] == [
+            "intent",
+            "queued",
+            "progress",
+            "completed",
+        ]
+        assert events[0]["intent"] == "image_generation"
+        assert events[-1]["success"] is True
+        assert events[-1]["data"]["prompt_id"] == "p1"
+
+    @pytest.mark.asyncio
+    async def test_stream_message_non_generation(
+        self, intent_processor: Mock, orchestrator: Mock
+    ) -> None:
+        intent_processor.process = AsyncMock(
+            return_value={"intent": "general", "parameters": {}}
+        )
+        manager = ChatManager(intent_processor, orchestrator)
+
+        events = [e async for e in manager.stream_message("user", "hello")]
+
+        assert [event["type"] for event in events] == ["intent", "completed"]
+        orchestrator.execute_generation.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_cancel_message_stops_generation(
+        self, intent_processor: Mock, orchestrator: Mock
+    ) -> None:
+        started = asyncio.Event()
+
+        async def execute_generation(*args: Any, **kwargs: Any) -> Dict[str, Any]:
+            started.set()
+            await asyncio.sleep(60)
+            return {"success": True}
+
+        orchestrator.execute_generation = execute_generation
+        manager = ChatManager(intent_processor, orchestrator)
+        generation = asyncio.ensure_future(
+            manager.process_message("user", "draw a cat")
+        )
+        await started.wait()
+
+        intent_processor.process = AsyncMock(
+            return_value={"intent": "cancel", "parameters": {}}
+        )
+        cancelled = await manager.process_message("user", "cancel")
+        result = await generation
+
+        assert cancelled["data"] == {"cancelled": 1}
+        assert result["success"] is False
+        assert result["error"] == "cancelled"
+        nothing = await manager.process_message("user", "cancel")
+        assert nothing["data"] == {"cancelled": 0}
+
+    @pytest.mark.asyncio
+    async def test_blocked_prompt_is_not_generated(
+        self, intent_processor: Mock, orchestrator: Mock
+    ) -> None:
+        manager = ChatManager(
+            intent_processor, orchestrator, prompt_screener=PromptScreener()
+        )
+
+        result = await manager.process_message("user", "draw nude erotic art")
+        events = [
+            e async for e in manager.stream_message("user", "draw nude erotic art")
+        ]
+
+        assert result["success"] is False
+        assert result["error"] == "prompt_rejected"
+        assert result["data"]["screening"]["action"] == "block"
+        assert [event["type"] for event in events] == ["completed"]
+        assert events[0]["error"] == "prompt_rejected"
+        orchestrator.execute_generation.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_filtered_prompt_gets_nsfw_filter(
+        self, intent_processor: Mock, orchestrator: Mock
+    ) -> None:
+        intent_processor.process = AsyncMock(
+            return_value={
+                "intent": "image_generation",
+                "parameters": {"prompt": "a nude statue", "nsfw_filter": "False"},
+            }
+        )
+        manager = ChatManager(
+            intent_processor, orchestrator, prompt_screener=PromptScreener()
+        )
+
+        result = await manager.process_message("user", "draw a nude statue")
+
+        assert result["success"] is True
+        parameters = orchestrator.execute_generation.call_args[0][0]
+        assert parameters["nsfw_filter"] == "True"
@@ -0,0 +1,125 @@
+from typing import Any, Dict, List
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from src.comfyui_control import ComfyUIPool, parse_endpoints
+
+
+def make_backend(name: str, queue_depth: int, prompt_id: str) -> Mock:
+    client = Mock()
+    client.base_url = name
+    client.connect = AsyncMock(return_value=True)
+    client.disconnect = AsyncMock()
+    client.health_check = AsyncMock(return_value=True)
+    client.start_event_listener = AsyncMock(return_value=True)
+    client.get_queue_status = AsyncMock(
+        return_value={"queue_running": [], "queue_pending": [[0]] * queue_depth}
+    )
+    client.queue_prompt = AsyncMock(return_value=prompt_id)
+    client.get_history = AsyncMock(return_value={prompt_id: {"outputs": {}}})
+    client.wait_for_prompt = AsyncMock(return_value={"status": "completed"})
+    return client
+
+
+class TestComfyUIPool:
+    @pytest.fixture
+    def backends(self) -> List[Mock]:
+        return [make_backend("a", 3, "pa"), make_backend("b", 1, "pb")]
+
+    @pytest.fixture
+    async def pool(self, backends: List[Mock]) -> Any:
+        pool = ComfyUIPool(backends, health_check_interval=0, queue_status_ttl=0)
+        await pool.connect()
+        yield pool
+        await pool.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_queue_prompt_picks_shortest_queue(
+        self, pool: ComfyUIPool, backends: List[Mock]
+    ) -> None:
+        prompt_id = await pool.queue_prompt({"1": {}})
+
+        assert prompt_id == "pb"
+        backends[0].queue_prompt.assert_not_called()
+        assert pool.owner_of("pb") is backends[1]
+
+    @pytest.mark.asyncio
+    async def test_history_and_wait_pinned_to_owner(
+        self, pool: ComfyUIPool, backends: List[Mock]
+    ) -> None:
+        await pool.queue_prompt({"1": {}})
+
+        history: Dict[str, Any] = await pool.get_history("pb")
+        event = await pool.wait_for_prompt("pb", 5)
+
+        assert "pb" in history
+        assert event["status"] == "completed"
+        backends[0].get_history.assert_not_called()
+        backends[1].wait_for_prompt.assert_awaited_once_with("pb", 5)
+
+    @pytest.mark.asyncio
+    async def test_failed_backend_is_skipped(
+        self, pool: ComfyUIPool, backends: List[Mock]
+    ) -> None:
+        backends[1].get_queue_status.return_value = {"error": "HTTP 502"}
+
+        prompt_id = await pool.queue_prompt({"1": {}})
+
+        assert prompt_id == "pa"
+        assert pool.stats()["healthy"] == 2
+
+        for _ in range(2):
+            await pool.queue_prompt({"1": {}})
+        assert pool.stats()["healthy"] == 1
+
+    @pytest.mark.asyncio
+    async def test_rejected_prompt_falls_over(
+        self, pool: ComfyUIPool, backends: List[Mock]
+    ) -> None:
+        backends[1].queue_prompt.return_value = None
+
+        assert await pool.queue_prompt({"1": {}}) == "pa"
+
+    @pytest.mark.asyncio
+    async def test_health_check_restores_backend(
+        self, pool: ComfyUIPool, backends: List[Mock]
+    ) -> None:
+        backends[0].health_check.return_value = False
+        await pool.check_health()
+        assert pool.stats()["healthy"] == 2
+        for _ in range(2):
+            await pool.check_health()
+        assert pool.stats()["healthy"] == 1
+
+        backends[0].health_check.return_value = True
+        await pool.check_health()
+        assert pool.stats()["healthy"] == 2
+        backends[0].start_event_listener.assert_awaited_once()
+        backends[1].start_event_listener.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_cancel_goes_to_owner(
+        self, pool: ComfyUIPool, backends: List[Mock]
+    ) -> None:
+        for backend in backends:
+            backend.cancel_prompt = AsyncMock(return_value=True)
+            backend.interrupt = AsyncMock(return_value=True)
+        await pool.queue_prompt({"1": {}})
+
+        assert await pool.cancel_prompt("pb") is True
+        assert await pool.interrupt("pb") is True
+        # An unknown prompt is never interrupted: it may be someone else's.
+        assert await pool.interrupt("unknown") is False
+
+        backends[0].cancel_prompt.assert_not_called()
+        backends[0].interrupt.assert_not_called()
+        backends[1].interrupt.assert_awaited_once_with("pb")
+
+    def test_parse_endpoints(self) -> None:
+        assert parse_endpoints("gpu1:8188, gpu2:9000,gpu3") == [
+            ("gpu1", 8188),
+            ("gpu2", 9000),
+            ("gpu3", 8188),
+        ]
+        assert parse_endpoints("") == []
@@ -0,0 +1,81 @@
+from typing import Any, Dict
+
+import pytest
+
+from src.workflow_engine.compiled_template import CompiledTemplate
+
+
+class TestCompiledTemplate:
+    @pytest.fixture
+    def graph(self) -> Dict[str, Any]:
+        return {
+            "1": {
+                "class_type": "CheckpointLoaderSimple",
+                "inputs": {"ckpt_name": "model.safetensors"},
+            },
+            "2": {
+                "class_type": "CLIPTextEncode",
+                "inputs": {"text": "{prompt}, detailed", "clip": ["1", 1]},
+            },
+            "3": {
+                "class_type": "CLIPTextEncode",
+                "inputs": {"text": "blurry, {negative}", "clip": ["1", 1]},
+            },
+            "4": {
+                "class_type": "KSampler",
+                "inputs": {"seed": 42, "steps": 28, "cfg": 4.5, "model": ["1", 0]},
+            },
+            "5": {
+                "class_type": "EmptyLatentImage",
+                "inputs": {"width": 1024, "height": 1024, "batch_size": 1},
+            },
+        }
+
+    def test_slots_are_located_once(self, graph: Dict[str, Any]) -> None:
+        template = CompiledTemplate("t", graph)
+
+        assert [slot[:2] for slot in template.text_slots] == [
+            ("2", "text"),
+            ("3", "text"),
+        ]
+        assert template.value_slots["seed"] == [("4", "seed", 42)]
+        assert template.checkpoint == "model.safetensors"
+        assert template.slot_count == 9
+
+    def test_render_fills_placeholders(self, graph: Dict[str, Any]) -> None:
+        template = CompiledTemplate("t", graph)
+
+        workflow = template.render({"prompt": "a cat", "negative_prompt": "dogs"})
+
+        assert workflow["2"]["inputs"]["text"] == "a cat, detailed"
+        assert workflow["3"]["inputs"]["text"] == "blurry, dogs"
+        assert graph["2"]["inputs"]["text"] == "{prompt}, detailed"
+
+    def test_render_shares_untouched_nodes(self, graph: Dict[str, Any]) -> None:
+        template = CompiledTemplate("t", graph)
+
+        workflow = template.render({"prompt": "a cat"})
+
+        assert workflow["1"] is graph["1"]
+        assert workflow["4"] is graph["4"]
+        assert workflow["2"] is not graph["2"]
+
+    def test_render_overrides_and_coerces_values(self, graph: Dict[str, Any]) -> None:
+        template = CompiledTemplate("t", graph)
+
+        workflow = template.render({"prompt": "a cat", "seed": "7", "cfg": 6})
+
+        assert workflow["4"]["inputs"]["seed"] == 7
+        assert workflow["4"]["inputs"]["cfg"] == 6.0
+        assert isinstance(workflow["4"]["inputs"]["cfg"], float)
+        assert workflow["4"]["inputs"]["steps"] == 28
+        assert graph["4"]["inputs"]["seed"] == 42
+
+    def test_prompt_with_braces_is_inserted_verbatim(
+        self, graph: Dict[str, Any]
+    ) -> None:
+        template = CompiledTemplate("t", graph)
+
+        workflow = template.render({"prompt": r"{negative} \1 text"})
+
+        assert workflow["2"]["inputs"]["text"] == r"{negative} \1 text, detailed"
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from src.comfyui_control.completion_tracker import CompletionTracker, parse_event
+
+
+class TestCompletionTracker:
+    @pytest.fixture
+    def tracker(self) -> CompletionTracker:
+        tracker = CompletionTracker()
+        tracker.set_connected(True)
+        return tracker
+
+    @pytest.mark.asyncio
+    async def test_waiter_resolves_on_executing_none(
+        self, tracker: CompletionTracker
+    ) -> None:
+        waiter = asyncio.ensure_future(tracker.wait("p1", timeout=5))
+        await asyncio.sleep(0)
+
+        tracker.handle_message(
+            {"type": "executing", "data": {"node": "4", "prompt_id": "p1"}}
+        )
+        assert not waiter.done()
+        tracker.handle_message(
+            {"type": "executing", "data": {"node": None, "prompt_id": "p1"}}
+        )
+
+        assert (await waiter)["status"] == "completed"
+        assert tracker.pending_count == 0
+
+    @pytest.mark.asyncio
+    async def test_execution_error(self, tracker: CompletionTracker) -> None:
+        waiter = asyncio.ensure_future(tracker.wait("p1", timeout=5))
+        await asyncio.sleep(0)
+
+        tracker.handle_message(
+            {
+                "type": "execution_error",
+                "data": {"prompt_id": "p1", "exception_message": "OOM"},
+            }
+        )
+
+        result = await waiter
+        assert result["status"] == "error"
+        assert result["error"] == "OOM"
+
+    @pytest.mark.asyncio
+    async def test_first_terminal_state_wins(self, tracker: CompletionTracker) -> None:
+        tracker.handle_message(
+            {
+                "type": "execution_error",
+                "data": {"prompt_id": "p1", "exception_message": "OOM"},
+            }
+        )
+        tracker.handle_message(
+            {"type": "executing", "data": {"node": None, "prompt_id": "p1"}}
+        )
+
+        result = await tracker.wait("p1", timeout=0.01)
+
+        assert result["status"] == "error"
+
+    @pytest.mark.asyncio
+    async def test_finished_before_wait(self, tracker: CompletionTracker) -> None:
+        tracker.handle_message(
+            {"type": "execution_success", "data": {"prompt_id": "p1"}}
+        )
+
+        result = await tracker.wait("p1", timeout=0.01)
+
+        assert result["status"] == "completed"
+
+    @pytest.mark.asyncio
+    async def test_timeout(self, tracker: CompletionTracker) -> None:
+        result = await tracker.wait("p1", timeout=0.01)
+
+        assert result["status"] == "timeout"
+        assert tracker.pending_count == 0
+
+    @pytest.mark.asyncio
+    async def test_disconnect_releases_waiters(
+        self, tracker: CompletionTracker
+    ) -> None:
+        waiter = asyncio.ensure_future(tracker.wait("p1", timeout=5))
+        await asyncio.sleep(0)
+
+        tracker.set_connected(False)
+
+        assert (await waiter)["status"] == "unavailable"
+        assert (await tracker.wait("p2", timeout=5))["status"] == "unavailable"
+
+    def test_progress_reaches_listeners(self, tracker: CompletionTracker) -> None:
+        events = []
+        tracker.add_listener("p1", events.append)
+
+        tracker.handle_message(
+            {
+                "type": "progress",
+                "data": {"value": 3, "max": 28, "prompt_id": "p1", "node": "4"},
+            }
+        )
+        tracker.handle_message(
+            {"type": "progress", "data": {"value": 1, "max": 28, "prompt_id": "p2"}}
+        )
+        tracker.remove_listener("p1", events.append)
+        tracker.handle_message(
+            {"type": "progress", "data": {"value": 4, "max": 28, "prompt_id": "p1"}}
+        )
+
+        assert events == [
+            {"type": "progress", "prompt_id": "p1", "node": "4", "value": 3, "max": 28}
+        ]
+
+    def test_parse_event(self) -> None:
+        assert parse_event('{"type": "status", "data": {}}') == {
+            "type": "status",
+            "data": {},
+        }
+        assert parse_event("not json") is None
+        assert parse_event("[1, 2]") is None
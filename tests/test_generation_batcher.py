@@ -0,0 +1,248 @@
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+
+from src.workflow_engine.compiled_template import CompiledTemplate
+from src.workflow_engine.generation_batcher import (
+    GenerationBatcher,
+    batch_key,
+    fold_workflows,
+    split_outputs,
+)
+from src.workflow_engine.workflow_orchestrator import WorkflowOrchestrator
+
+TEMPLATE = CompiledTemplate(
+    "basic_generation",
+    WorkflowOrchestrator(None).workflow_templates["basic_generation"],
+)
+
+
+def render(**parameters: Any) -> Dict[str, Any]:
+    return TEMPLATE.render({"prompt": "a cat", **parameters})
+
+
+def latent(workflow: Dict[str, Any]) -> Dict[str, Any]:
+    return next(
+        node["inputs"]
+        for node in workflow.values()
+        if node["class_type"] == "EmptyLatentImage"
+    )
+
+
+async def submit_batch(workflow: Dict[str, Any], *args: Any) -> Dict[str, Any]:
+    """Fake backend: one image per latent in every SaveImage output."""
+    size = latent(workflow)["batch_size"]
+    outputs = {
+        node_id: {"images": [f"{node_id}_{index}.png" for index in range(size)]}
+        for node_id, node in workflow.items()
+        if node["class_type"] == "SaveImage"
+    }
+    return {"success": True, "prompt_id": "p1", "outputs": outputs}
+
+
+class TestFoldWorkflows:
+    def test_batches_the_empty_latent(self) -> None:
+        folded, node_maps = fold_workflows([render(seed=1), render(seed=2)])
+
+        assert latent(folded)["batch_size"] == 2
+        sampler = next(
+            node for node in folded.values() if node["class_type"] == "KSampler"
+        )
+        assert sampler["inputs"]["seed"] == 1
+        assert node_maps[0]["7"] == "7#0"
+        assert node_maps[1]["7"] == "7#1"
+
+    def test_leaves_inputs_untouched(self) -> None:
+        workflow = render(seed=1)
+
+        fold_workflows([workflow, render(seed=2)])
+
+        assert latent(workflow)["batch_size"] == 1
+
+
+class TestSplitOutputs:
+    def test_picks_the_image_at_the_batch_index(self) -> None:
+        outputs = {"7": {"images": ["a.png", "b.png"]}}
+
+        assert split_outputs(outputs, {"7": "7#1"}) == {"7": {"images": ["b.png"]}}
+
+    def test_plain_target_takes_the_whole_output(self) -> None:
+        outputs = {"0_7": {"images": ["a.png"]}}
+
+        assert split_outputs(outputs, {"7": "0_7", "4": "0_4"}) == {
+            "7": {"images": ["a.png"]}
+        }
+
+
+class TestBatchKey:
+    def test_only_the_seed_may_differ(self) -> None:
+        assert batch_key(render(seed=1)) == batch_key(render(seed=2))
+        assert batch_key(render(prompt="a")) != batch_key(render(prompt="b"))
+        assert batch_key(render(steps=10)) != batch_key(render(steps=20))
+        assert batch_key(render(width=512)) != batch_key(render(width=768))
+
+    def test_none_for_unknown_graphs(self) -> None:
+        assert batch_key({"1": {"class_type": "LoadImage", "inputs": {}}}) is None
+
+    def test_none_for_workflows_already_batched(self) -> None:
+        workflow = {
+            node_id: (
+                {**node, "inputs": {**node["inputs"], "batch_size": 2}}
+                if node["class_type"] == "EmptyLatentImage"
+                else node
+            )
+            for node_id, node in render().items()
+        }
+
+        assert batch_key(workflow) is None
+
+
+class TestGenerationBatcher:
+    @pytest.mark.asyncio
+    async def test_compatible_requests_share_one_submission(self) -> None:
+        submitted: List[Dict[str, Any]] = []
+
+        async def submit(workflow: Dict[str, Any]) -> Dict[str, Any]:
+            submitted.append(workflow)
+            return await submit_batch(workflow)
+
+        batcher = GenerationBatcher(submit, window=0.01, max_batch_size=4)
+        results = await asyncio.gather(
+            batcher.run(render(seed=1)), batcher.run(render(seed=2))
+        )
+
+        assert len(submitted) == 1
+        assert latent(submitted[0])["batch_size"] == 2
+        assert results[0]["outputs"] == {"7": {"images": ["7_0.png"]}}
+        assert results[1]["outputs"] == {"7": {"images": ["7_1.png"]}}
+        assert results[0]["batch_size"] == 2
+        assert batcher.stats()["batched_requests"] == 2
+
+    @pytest.mark.asyncio
+    async def test_submitted_callbacks_get_their_node_map(self) -> None:
+        async def submit(
+            workflow: Dict[str, Any], on_submitted: Any = None
+        ) -> Dict[str, Any]:
+            on_submitted("p1", None)
+            return {"success": True, "prompt_id": "p1", "outputs": {}}
+
+        submitted: List[Any] = []
+        batcher = GenerationBatcher(submit, window=0.01, max_batch_size=2)
+        await asyncio.gather(
+            batcher.run(
+                render(seed=1),
+                on_submitted=lambda *args: submitted.append(("cat", *args)),
+            ),
+            batcher.run(
+                render(seed=2),
+                on_submitted=lambda *args: submitted.append(("dog", *args)),
+            ),
+        )
+
+        assert [(name, prompt_id) for name, prompt_id, _ in submitted] == [
+            ("cat", "p1"),
+            ("dog", "p1"),
+        ]
+        assert submitted[0][2]["7"] == "7#0"
+        assert submitted[1][2]["7"] == "7#1"
+
+    @pytest.mark.asyncio
+    async def test_full_batch_flushes_without_waiting(self) -> None:
+        calls = 0
+
+        async def submit(workflow: Dict[str, Any]) -> Dict[str, Any]:
+            nonlocal calls
+            calls += 1
+            return {"success": True, "prompt_id": "p1", "outputs": {}}
+
+        batcher = GenerationBatcher(submit, window=60, max_batch_size=2)
+        results = await asyncio.wait_for(
+            asyncio.gather(batcher.run(render(seed=1)), batcher.run(render(seed=2))),
+            timeout=1,
+        )
+
+        assert calls == 1
+        assert all(result["success"] for result in results)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "first, second",
+        [({"steps": 10}, {"steps": 20}), ({"prompt": "a cat"}, {"prompt": "a dog"})],
+    )
+    async def test_incompatible_requests_are_submitted_separately(
+        self, first: Dict[str, Any], second: Dict[str, Any]
+    ) -> None:
+        submitted: List[Dict[str, Any]] = []
+
+        async def submit(workflow: Dict[str, Any]) -> Dict[str, Any]:
+            submitted.append(workflow)
+            return {"success": True, "prompt_id": str(len(submitted)), "outputs": {}}
+
+        batcher = GenerationBatcher(submit, window=0.01)
+        await asyncio.gather(
+            batcher.run(render(**first)), batcher.run(render(**second))
+        )
+
+        assert len(submitted) == 2
+        # A lone request is submitted untouched.
+        assert all(latent(workflow)["batch_size"] == 1 for workflow in submitted)
+
+    @pytest.mark.asyncio
+    async def test_submit_failure_reaches_every_caller(self) -> None:
+        async def submit(workflow: Dict[str, Any]) -> Dict[str, Any]:
+            raise RuntimeError("backend down")
+
+        batcher = GenerationBatcher(submit, window=0.01)
+        results = await asyncio.gather(
+            batcher.run(render(seed=1)), batcher.run(render(seed=2))
+        )
+
+        assert results == [{"error": "backend down"}, {"error": "backend down"}]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_request_leaves_the_batch(self) -> None:
+        submitted: List[Dict[str, Any]] = []
+
+        async def submit(workflow: Dict[str, Any]) -> Dict[str, Any]:
+            submitted.append(workflow)
+            return {"success": True, "prompt_id": "p1", "outputs": {}}
+
+        batcher = GenerationBatcher(submit, window=0.05, max_batch_size=4)
+        abandoned = asyncio.ensure_future(batcher.run(render(seed=1)))
+        kept = asyncio.ensure_future(batcher.run(render(seed=2)))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+
+        result = await kept
+
+        assert result["success"] is True
+        assert len(submitted) == 1
+        # Only the remaining request was submitted, untouched.
+        assert latent(submitted[0])["batch_size"] == 1
+
+    @pytest.mark.asyncio
+    async def test_batch_is_cancelled_once_every_caller_leaves(self) -> None:
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def submit(workflow: Dict[str, Any]) -> Dict[str, Any]:
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return {}
+
+        batcher = GenerationBatcher(submit, window=60, max_batch_size=2)
+        tasks = [
+            asyncio.ensure_future(batcher.run(render(seed=seed))) for seed in (1, 2)
+        ]
+        await started.wait()
+        tasks[0].cancel()
+        await asyncio.sleep(0)
+        assert not cancelled.is_set()
+
+        tasks[1].cancel()
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
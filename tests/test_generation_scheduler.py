@@ -0,0 +1,178 @@
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+
+from src.workflow_engine import PRIORITY_HIGH, GenerationScheduler
+
+
+class GatedOrchestrator:
+    def __init__(self) -> None:
+        self.started: List[str] = []
+        self.gate = asyncio.Event()
+
+    async def execute_generation(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        self.started.append(parameters["prompt"])
+        await self.gate.wait()
+        return {"success": True, "prompt": parameters["prompt"]}
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class TestGenerationScheduler:
+    @pytest.fixture
+    def orchestrator(self) -> GatedOrchestrator:
+        return GatedOrchestrator()
+
+    @pytest.mark.asyncio
+    async def test_concurrency_cap(self, orchestrator: GatedOrchestrator) -> None:
+        scheduler = GenerationScheduler(orchestrator, max_concurrent=2)
+
+        tasks = [
+            asyncio.ensure_future(scheduler.submit("u", {"prompt": str(i)}))
+            for i in range(4)
+        ]
+        await settle()
+
+        assert orchestrator.started == ["0", "1"]
+        assert scheduler.stats()["running"] == 2
+        assert scheduler.stats()["queued"] == 2
+
+        orchestrator.gate.set()
+        results = await asyncio.gather(*tasks)
+
+        assert [r["prompt"] for r in results] == ["0", "1", "2", "3"]
+        assert scheduler.stats()["completed"] == 4
+        assert scheduler.stats()["wait_time"]["samples"] == 4
+
+    @pytest.mark.asyncio
+    async def test_full_queue_fails_fast(self, orchestrator: GatedOrchestrator) -> None:
+        scheduler = GenerationScheduler(
+            orchestrator, max_concurrent=1, max_queue_size=1
+        )
+        running = asyncio.ensure_future(scheduler.submit("a", {"prompt": "1"}))
+        queued = asyncio.ensure_future(scheduler.submit("b", {"prompt": "2"}))
+        await settle()
+
+        result = await scheduler.submit("c", {"prompt": "3"})
+
+        assert result["busy"] is True
+        assert scheduler.stats()["rejected"] == 1
+        orchestrator.gate.set()
+        await asyncio.gather(running, queued)
+
+    @pytest.mark.asyncio
+    async def test_users_are_served_round_robin(
+        self, orchestrator: GatedOrchestrator
+    ) -> None:
+        scheduler = GenerationScheduler(orchestrator, max_concurrent=1)
+        first = asyncio.ensure_future(scheduler.submit("busy", {"prompt": "b0"}))
+        await settle()
+        tasks = [
+            asyncio.ensure_future(scheduler.submit("busy", {"prompt": f"b{i}"}))
+            for i in range(1, 4)
+        ]
+        tasks.append(asyncio.ensure_future(scheduler.submit("quiet", {"prompt": "q"})))
+        await settle()
+
+        orchestrator.gate.set()
+        await asyncio.gather(first, *tasks)
+
+        assert orchestrator.started == ["b0", "b1", "q", "b2", "b3"]
+
+    @pytest.mark.asyncio
+    async def test_high_priority_lane_first(
+        self, orchestrator: GatedOrchestrator
+    ) -> None:
+        scheduler = GenerationScheduler(orchestrator, max_concurrent=1)
+        first = asyncio.ensure_future(scheduler.submit("a", {"prompt": "first"}))
+        await settle()
+        normal = asyncio.ensure_future(scheduler.submit("b", {"prompt": "normal"}))
+        urgent = asyncio.ensure_future(
+            scheduler.submit("c", {"prompt": "urgent"}, priority=PRIORITY_HIGH)
+        )
+        await settle()
+
+        orchestrator.gate.set()
+        await asyncio.gather(first, normal, urgent)
+
+        assert orchestrator.started == ["first", "urgent", "normal"]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(
+        self, orchestrator: GatedOrchestrator
+    ) -> None:
+        scheduler = GenerationScheduler(orchestrator, max_concurrent=1)
+        first = asyncio.ensure_future(scheduler.submit("a", {"prompt": "first"}))
+        waiting = asyncio.ensure_future(scheduler.submit("b", {"prompt": "gone"}))
+        await settle()
+
+        waiting.cancel()
+        await settle()
+
+        assert scheduler.stats()["queued"] == 0
+        orchestrator.gate.set()
+        await first
+        assert orchestrator.started == ["first"]
+        assert scheduler.stats()["running"] == 0
+
+
+class CheckpointOrchestrator(GatedOrchestrator):
+    def checkpoint_for(self, parameters: Dict[str, Any]) -> str:
+        return str(parameters["checkpoint"])
+
+
+class TestCheckpointAffinity:
+    async def run_jobs(
+        self, scheduler: GenerationScheduler, orchestrator: GatedOrchestrator
+    ) -> None:
+        jobs = [("a", "A"), ("b", "B"), ("c", "A"), ("d", "B"), ("e", "A")]
+        tasks = []
+        for user, checkpoint in jobs:
+            tasks.append(
+                asyncio.ensure_future(
+                    scheduler.submit(user, {"prompt": user, "checkpoint": checkpoint})
+                )
+            )
+            await settle()
+        orchestrator.gate.set()
+        await asyncio.gather(*tasks)
+
+    @pytest.mark.asyncio
+    async def test_hot_checkpoint_jobs_run_together(self) -> None:
+        orchestrator = CheckpointOrchestrator()
+        scheduler = GenerationScheduler(
+            orchestrator, max_concurrent=1, affinity_window=8, swap_cost=5.0
+        )
+
+        await self.run_jobs(scheduler, orchestrator)
+
+        assert orchestrator.started == ["a", "c", "e", "b", "d"]
+        affinity = scheduler.stats()["affinity"]
+        assert affinity["reordered"] == 2
+        assert affinity["estimated_seconds_saved"] == 10.0
+        assert affinity["hot_checkpoint"] == "B"
+
+    @pytest.mark.asyncio
+    async def test_skips_are_bounded(self) -> None:
+        orchestrator = CheckpointOrchestrator()
+        scheduler = GenerationScheduler(
+            orchestrator, max_concurrent=1, affinity_window=8, max_affinity_skips=1
+        )
+
+        await self.run_jobs(scheduler, orchestrator)
+
+        assert orchestrator.started == ["a", "c", "b", "d", "e"]
+
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self) -> None:
+        orchestrator = CheckpointOrchestrator()
+        scheduler = GenerationScheduler(orchestrator, max_concurrent=1)
+
+        await self.run_jobs(scheduler, orchestrator)
+
+        assert orchestrator.started == ["a", "b", "c", "d", "e"]
+        assert "affinity" not in scheduler.stats()
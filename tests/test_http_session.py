@@ -0,0 +1,189 @@
+import asyncio
+from typing import Any, AsyncGenerator
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.comfyui_control import (
+    ComfyUIClient,
+    HTTPSessionConfig,
+    RetryPolicy,
+    SessionManager,
+)
+
+
+@pytest.fixture
+async def server() -> AsyncGenerator[TestServer, None]:
+    async def system_stats(request: web.Request) -> web.Response:
+        return web.json_response({"system": {}})
+
+    async def queue(request: web.Request) -> web.Response:
+        return web.json_response({"queue_running": [], "queue_pending": []})
+
+    async def history(request: web.Request) -> web.Response:
+        await asyncio.sleep(1)
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_get("/system_stats", system_stats)
+    app.router.add_get("/queue", queue)
+    app.router.add_get("/history/{prompt_id}", history)
+    test_server = TestServer(app)
+    await test_server.start_server()
+    yield test_server
+    await test_server.close()
+
+
+def make_client(server: TestServer, **config: Any) -> ComfyUIClient:
+    return ComfyUIClient(
+        host=str(server.host),
+        port=int(server.port or 0),
+        http_config=HTTPSessionConfig(**config),
+        retry_policy=RetryPolicy(max_attempts=1),
+    )
+
+
+class TestSessionManager:
+    @pytest.mark.asyncio
+    async def test_acquire_before_open(self) -> None:
+        manager = SessionManager()
+
+        assert await manager.acquire() is None
+
+    @pytest.mark.asyncio
+    async def test_reopen_closes_previous_session(self) -> None:
+        manager = SessionManager()
+        first = await manager.open()
+
+        second = await manager.open()
+
+        assert first.closed
+        assert not second.closed
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_recreated_after_consecutive_failures(self) -> None:
+        manager = SessionManager(HTTPSessionConfig(max_consecutive_failures=2))
+        first = await manager.open()
+
+        manager.record_failure(aiohttp.ClientConnectionError())
+        assert await manager.acquire() is first
+        manager.record_failure(aiohttp.ServerDisconnectedError())
+        second = await manager.acquire()
+
+        assert second is not first
+        assert first.closed
+        assert manager.recreated == 1
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_read_timeouts_do_not_count_as_failures(self) -> None:
+        manager = SessionManager(HTTPSessionConfig(max_consecutive_failures=1))
+        session = await manager.open()
+
+        manager.record_failure(asyncio.TimeoutError())
+        manager.record_failure(aiohttp.ServerTimeoutError())
+
+        assert manager.consecutive_failures == 0
+        assert await manager.acquire() is session
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_reset_waits_for_leases_on_the_old_session(self) -> None:
+        manager = SessionManager(HTTPSessionConfig(max_consecutive_failures=1))
+        await manager.open()
+
+        async with manager.lease() as first:
+            assert first is not None
+            manager.record_failure(aiohttp.ClientConnectionError())
+            second = await manager.acquire()
+
+            assert second is not first
+            assert not first.closed
+        assert first.closed
+        assert not second.closed
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_http_errors_do_not_count_as_failures(self) -> None:
+        manager = SessionManager(HTTPSessionConfig(max_consecutive_failures=1))
+        session = await manager.open()
+
+        manager.record_failure(ValueError("bad json"))
+
+        assert await manager.acquire() is session
+        await manager.close()
+
+
+class TestComfyUIClientSession:
+    @pytest.mark.asyncio
+    async def test_connect_and_reconnect(self, server: TestServer) -> None:
+        client = make_client(server)
+
+        assert await client.connect() is True
+        first = client.session
+        assert await client.connect() is True
+
+        assert first is not None and first.closed
+        await client.disconnect()
+        assert client.session is None
+
+    @pytest.mark.asyncio
+    async def test_read_timeout_per_endpoint(self, server: TestServer) -> None:
+        client = make_client(server, read_timeouts={"history": 0.05})
+        await client.connect()
+
+        result = await client.get_history("slow")
+
+        assert "error" in result
+        assert client.http.consecutive_failures == 0
+        await client.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_many_concurrent_requests(self, server: TestServer) -> None:
+        client = make_client(server, pool_size=20)
+        await client.connect()
+
+        results = await asyncio.gather(*(client.get_queue_status() for _ in range(300)))
+
+        assert all("queue_running" in result for result in results)
+        await client.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_event_listener_starts_without_healthy_connect(self) -> None:
+        handshakes = 0
+
+        async def system_stats(request: web.Request) -> web.Response:
+            return web.Response(status=503)
+
+        async def websocket(request: web.Request) -> web.StreamResponse:
+            nonlocal handshakes
+            handshakes += 1
+            if handshakes == 1:
+                return web.Response(status=503)
+            ws = web.WebSocketResponse()
+            await ws.prepare(request)
+            async for _ in ws:
+                pass
+            return ws
+
+        app = web.Application()
+        app.router.add_get("/system_stats", system_stats)
+        app.router.add_get("/ws", websocket)
+        test_server = TestServer(app)
+        await test_server.start_server()
+        client = make_client(test_server)
+        client.ws_reconnect_delay = 0.01
+
+        assert await client.connect() is False
+        for _ in range(100):
+            if client.completion_tracker.connected:
+                break
+            await asyncio.sleep(0.01)
+
+        assert client.completion_tracker.connected
+        assert handshakes == 2
+        await client.disconnect()
+        await test_server.close()
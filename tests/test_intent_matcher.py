@@ -0,0 +1,112 @@
+import random
+import re
+from typing import Dict, List
+
+from src.intent_processing import IntentProcessor
+from src.intent_processing.intent_matcher import IntentMatcher, split_literal_pattern
+from src.intent_processing.intent_processor import (
+    MODIFICATION_KEYWORDS,
+    SAFE_INDICATORS,
+    STYLE_KEYWORDS,
+)
+
+
+def legacy_classify(patterns: Dict[str, List[str]], message: str) -> str:
+    for intent, intent_patterns in patterns.items():
+        for pattern in intent_patterns:
+            if re.search(pattern, message):
+                return intent
+    return "general"
+
+
+def legacy_first_group(groups: Dict[str, List[str]], message: str, default: str) -> str:
+    for name, keywords in groups.items():
+        if any(keyword in message for keyword in keywords):
+            return name
+    return default
+
+
+def corpus() -> List[str]:
+    rng = random.Random(1234)
+    words = [
+        "generate",
+        "image",
+        "create",
+        "picture",
+        "make",
+        "photo",
+        "photograph",
+        "draw",
+        "paint",
+        "painting",
+        "art",
+        "artistic",
+        "modify",
+        "edit",
+        "adjust",
+        "safe",
+        "work",
+        "family",
+        "friendly",
+        "filter",
+        "nsfw",
+        "colour",
+        "dark",
+        "background",
+        "anime",
+        "a",
+        "the",
+        "cat",
+        "\n",
+    ]
+    messages = [
+        "",
+        "generate a red sports car",
+        "image generate",
+        "generate\nimage",
+        "safe\nfor work",
+        "make the photo safe for work",
+        "an artistic painting of a landscape",
+        "generateimage",
+    ]
+    for _ in range(500):
+        messages.append(" ".join(rng.choice(words) for _ in range(rng.randint(1, 8))))
+    return messages
+
+
+class TestIntentMatcher:
+    def test_matches_legacy_regex_results(self) -> None:
+        processor = IntentProcessor()
+        matcher = processor.matcher
+
+        for message in corpus():
+            match = matcher.match(message)
+            assert match["intent"] == legacy_classify(
+                processor.intent_patterns, message
+            ), message
+            assert match["style"] == legacy_first_group(
+                STYLE_KEYWORDS, message, "default"
+            )
+            assert match["nsfw_filter"] == any(
+                indicator in message for indicator in SAFE_INDICATORS
+            )
+            assert match["modification_type"] == legacy_first_group(
+                MODIFICATION_KEYWORDS, message, "general_modification"
+            )
+
+    def test_non_literal_patterns_fall_back_to_regex(self) -> None:
+        patterns = {"numbers": [r"\d+ cats"], "cats": ["cat.*s"]}
+        matcher = IntentMatcher(patterns, {}, [], {})
+
+        assert matcher.classify("3 cats") == "numbers"
+        assert matcher.classify("cats") == "cats"
+        assert matcher.classify("dogs") == "general"
+
+    def test_split_literal_pattern(self) -> None:
+        assert split_literal_pattern("draw.*") == ("draw",)
+        assert split_literal_pattern("safe.*work") == ("safe", "work")
+        assert split_literal_pattern(r"\d+") is None
+        assert split_literal_pattern(".*") is None
+
+    def test_processor_reuses_compiled_matcher(self) -> None:
+        assert IntentProcessor().matcher is IntentProcessor().matcher
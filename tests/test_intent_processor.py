@@ -1,6 +1,10 @@
 import pytest
 
-from src.intent_processing import IntentProcessor
+from src.intent_processing import (
+    EmbeddingIntentClassifier,
+    HashedNgramFeaturizer,
+    IntentProcessor,
+)
 
 
 class TestIntentProcessor:
@@ -31,6 +35,25 @@ class TestIntentProcessor:
         assert result["intent"] == "image_modification"
         assert result["parameters"]["modification_type"] == "color_adjustment"
 
+    @pytest.mark.parametrize(
+        "message, intent",
+        [
+            ("cancel", "cancel"),
+            ("Please stop it!", "cancel"),
+            ("abort the generation.", "cancel"),
+            ("never mind", "cancel"),
+            ("stop sign at dusk, photorealistic", "general"),
+            ("abort mission poster", "general"),
+        ],
+    )
+    @pytest.mark.asyncio
+    async def test_cancel_only_for_a_bare_command(
+        self, processor: IntentProcessor, message: str, intent: str
+    ) -> None:
+        result = await processor.process(message)
+
+        assert result["intent"] == intent
+
     def test_extract_style_artistic(self, processor: IntentProcessor) -> None:
         message = "create an artistic painting of a landscape"
 
@@ -58,3 +81,47 @@ class TestIntentProcessor:
         should_filter = processor._should_apply_nsfw_filter(message)
 
         assert should_filter is False
+
+
+class TestEmbeddingIntentClassifier:
+    @pytest.fixture
+    def classifier(self) -> EmbeddingIntentClassifier:
+        return EmbeddingIntentClassifier()
+
+    def test_scores_batch_in_one_call(
+        self, classifier: EmbeddingIntentClassifier
+    ) -> None:
+        messages = ["draw a dragon", "make the background darker", "hello there"]
+
+        scores = classifier.score(messages)
+
+        assert scores.shape == (3, len(classifier.intents))
+        assert scores.sum(axis=1) == pytest.approx([1.0, 1.0, 1.0], abs=1e-5)
+        assert [intent for intent, _ in classifier.classify_batch(messages)] == [
+            "image_generation",
+            "image_modification",
+            "general",
+        ]
+
+    def test_featurizer_is_stable(self) -> None:
+        first = HashedNgramFeaturizer().transform(["a red car"])
+        second = HashedNgramFeaturizer().transform(["a red car"])
+
+        assert (first == second).all()
+        assert float((first * first).sum()) == pytest.approx(1.0, abs=1e-5)
+
+    @pytest.mark.asyncio
+    async def test_processor_uses_classifier_for_unmatched_messages(
+        self, classifier: EmbeddingIntentClassifier
+    ) -> None:
+        processor = IntentProcessor(classifier)
+
+        results = await processor.process_batch(
+            ["could you whip up a picture of a whale", "modify the image colors"]
+        )
+
+        assert results[0]["intent"] == "image_generation"
+        assert "whale" in results[0]["parameters"]["prompt"]
+        assert results[0]["confidence"] >= classifier.min_confidence
+        assert results[1]["intent"] == "image_modification"
+        assert 0.0 < results[1]["confidence"] <= 1.0
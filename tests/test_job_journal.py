@@ -0,0 +1,192 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import Any, Dict
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from src.chat_interface import ChatManager, SessionStore
+from src.workflow_engine import JobJournal, WorkflowOrchestrator
+
+
+def restart(db_path: Path, journal: JobJournal) -> JobJournal:
+    journal.close()
+    return JobJournal(str(db_path))
+
+
+class TestJobJournal:
+    @pytest.mark.asyncio
+    async def test_batches_writes_and_coalesces_updates(self, tmp_path: Path) -> None:
+        journal = JobJournal(str(tmp_path / "jobs.db"), batch_size=3)
+
+        first = journal.record({"prompt": "a cat"}, "k1", "alice", "discord")
+        journal.submitted(first, "p1")
+        second = journal.record({"prompt": "a dog"}, "k2", "bob", "slack")
+
+        # Three updates to two jobs are still one pending batch.
+        assert journal.stats()["pending_writes"] == 2
+        assert journal.stats()["flushes"] == 0
+
+        journal.record({"prompt": "a fox"}, "k3")
+        assert journal.stats()["flushes"] == 1
+        assert journal.stats()["rows_written"] == 3
+
+        journal.finish(second, {"success": True})
+        journal = restart(tmp_path / "jobs.db", journal)
+        jobs = {job["workflow_key"]: job for job in journal.unfinished()}
+
+        assert set(jobs) == {"k1", "k3"}
+        assert jobs["k1"]["job_id"] == first
+        assert jobs["k1"]["prompt_id"] == "p1"
+        assert jobs["k1"]["state"] == "submitted"
+        assert jobs["k1"]["parameters"] == {"prompt": "a cat"}
+        assert (jobs["k1"]["user_id"], jobs["k1"]["platform"]) == (
+            "alice",
+            "discord",
+        )
+
+    @pytest.mark.asyncio
+    async def test_flushes_after_interval(self, tmp_path: Path) -> None:
+        journal = JobJournal(str(tmp_path / "jobs.db"), flush_interval=0.01)
+
+        journal.record({"prompt": "a cat"}, "k1")
+        assert journal.stats()["flushes"] == 0
+        await asyncio.sleep(0.05)
+
+        assert journal.stats()["flushes"] == 1
+        journal.close()
+
+    def test_jobs_are_claimed_once(self, tmp_path: Path) -> None:
+        db_path = str(tmp_path / "jobs.db")
+        journal = JobJournal(db_path)
+        journal.submitted(journal.record({"prompt": "a cat"}, "k1"), "p1")
+        journal.close()
+
+        first, second = JobJournal(db_path), JobJournal(db_path)
+
+        assert len(first.unfinished()) == 1
+        assert second.unfinished() == []
+
+    def test_live_owner_keeps_its_jobs(self, tmp_path: Path) -> None:
+        db_path = str(tmp_path / "jobs.db")
+        sibling = JobJournal(db_path, lease=0.05)
+        sibling.submitted(sibling.record({"prompt": "a cat"}, "k1"), "p1")
+        sibling.flush()
+
+        restarted = JobJournal(db_path)
+
+        assert restarted.unfinished() == []
+        # The sibling died without closing: its lease runs out.
+        time.sleep(0.06)
+        assert len(restarted.unfinished()) == 1
+
+    def test_finished_jobs_are_not_resumed(self, tmp_path: Path) -> None:
+        journal = JobJournal(str(tmp_path / "jobs.db"))
+        job_id = journal.record({"prompt": "a cat"}, "k1")
+        journal.submitted(job_id, "p1", {"7": "0_7"})
+        journal.finish(job_id, {"error": "boom"})
+
+        assert restart(tmp_path / "jobs.db", journal).unfinished() == []
+
+
+class TestJournaledGenerations:
+    @pytest.fixture
+    def client(self) -> Mock:
+        client = Mock(spec=["queue_prompt", "get_history", "get_queue_status"])
+        client.queue_prompt = AsyncMock(return_value="p1")
+        client.get_history = AsyncMock(return_value={"p1": {"outputs": {"7": {}}}})
+        client.get_queue_status = AsyncMock(
+            return_value={"queue_running": [], "queue_pending": []}
+        )
+        return client
+
+    @pytest.mark.asyncio
+    async def test_generation_is_journaled(self, tmp_path: Path, client: Mock) -> None:
+        journal = JobJournal(str(tmp_path / "jobs.db"))
+        submitted: Dict[str, Any] = {}
+        real_submitted = journal.submitted
+
+        def spy(job_id: str, prompt_id: str, node_map: Any = None) -> None:
+            submitted[job_id] = prompt_id
+            real_submitted(job_id, prompt_id, node_map)
+
+        journal.submitted = spy  # type: ignore[method-assign]
+        orchestrator = WorkflowOrchestrator(client, journal=journal)
+
+        result = await orchestrator.execute_generation(
+            {"prompt": "a cat"}, origin={"user_id": "alice", "platform": "discord"}
+        )
+
+        assert result["success"] is True
+        assert list(submitted.values()) == ["p1"]
+        journal = restart(tmp_path / "jobs.db", journal)
+        assert journal.unfinished() == []
+
+    @pytest.mark.asyncio
+    async def test_restart_reattaches_and_delivers(
+        self, tmp_path: Path, client: Mock
+    ) -> None:
+        db_path = tmp_path / "jobs.db"
+        journal = JobJournal(str(db_path))
+        running = journal.record({"prompt": "a cat"}, "k1", "alice", "discord")
+        journal.submitted(running, "p1")
+        journal.record({"prompt": "a dog"}, "k2", "bob", "slack")
+        journal = restart(db_path, journal)
+
+        sessions = SessionStore()
+        chat_manager = ChatManager(
+            Mock(),
+            WorkflowOrchestrator(client, journal=journal),
+            session_store=sessions,
+            journal=journal,
+        )
+        delivered = []
+        chat_manager.recovery_listeners.append(
+            lambda job, response: delivered.append((job["user_id"], response))
+        )
+
+        responses = await asyncio.gather(*chat_manager.resume_jobs())
+
+        assert [user for user, _ in delivered] == ["alice", "bob"]
+        assert responses[0]["data"]["outputs"] == {"7": {}}
+        assert "error" in responses[1]["data"]
+        session = sessions.get("alice")
+        assert session is not None and session.last_output == "p1"
+        assert restart(db_path, journal).unfinished() == []
+
+    @pytest.mark.asyncio
+    async def test_reattach_waits_for_queued_prompt(self, client: Mock) -> None:
+        client.get_history = AsyncMock(
+            side_effect=[{}, {"p1": {"outputs": {"0_7": {}, "1_7": {"x": 1}}}}]
+        )
+        client.get_queue_status = AsyncMock(
+            return_value={"queue_running": [[1, "p1", {}, {}, []]], "queue_pending": []}
+        )
+        orchestrator = WorkflowOrchestrator(client)
+
+        with pytest.MonkeyPatch.context() as patch:
+            patch.setattr(asyncio, "sleep", AsyncMock())
+            result = await orchestrator.reattach(
+                {
+                    "job_id": "j1",
+                    "prompt_id": "p1",
+                    "workflow_key": "k1",
+                    "node_map": {"7": "1_7"},
+                }
+            )
+
+        assert result["success"] is True
+        # Only this job's outputs from the merged batch prompt.
+        assert result["outputs"] == {"7": {"x": 1}}
+
+    @pytest.mark.asyncio
+    async def test_reattach_reports_lost_prompt(self, client: Mock) -> None:
+        client.get_history = AsyncMock(return_value={})
+
+        result = await WorkflowOrchestrator(client).reattach(
+            {"job_id": "j1", "prompt_id": "p1", "workflow_key": "k1"}
+        )
+
+        assert result["lost"] is True
+        assert client.get_history.await_count == 2
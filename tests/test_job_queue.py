@@ -0,0 +1,228 @@
+import asyncio
+import os
+import uuid
+from pathlib import Path
+from typing import Any, AsyncGenerator, Dict, List
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from src.job_queue import (
+    GenerationWorker,
+    InMemoryBroker,
+    RedisBroker,
+    RemoteOrchestrator,
+    SQLiteBroker,
+    broker_from_url,
+    new_job,
+)
+from src.workflow_engine import WorkflowOrchestrator
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+async def broker(request: Any, tmp_path: Path) -> AsyncGenerator[Any, None]:
+    if request.param == "memory":
+        broker: Any = InMemoryBroker(lease=0.2)
+    else:
+        broker = SQLiteBroker(
+            str(tmp_path / "broker.db"), lease=0.2, poll_interval=0.01
+        )
+    yield broker
+    await broker.close()
+
+
+class TestBrokers:
+    async def test_job_round_trip(self, broker: Any) -> None:
+        job = new_job({"prompt": "a cat"}, "frontend-1")
+        assert await broker.push(job)
+
+        claimed = await broker.claim("worker-1", timeout=1)
+        assert claimed is not None and claimed["parameters"] == {"prompt": "a cat"}
+        assert await broker.claim("worker-2", timeout=0.05) is None
+        await broker.reply("frontend-1", {"job_id": job["job_id"], "type": "event"})
+        await broker.finish(claimed, {"success": True})
+
+        messages = await broker.replies("frontend-1", timeout=1)
+        assert [message["type"] for message in messages] == ["event", "result"]
+        assert messages[1]["data"] == {"success": True}
+        assert await broker.replies("frontend-1", timeout=0.05) == []
+        assert broker.stats()["finished"] == 1
+
+    async def test_expired_lease_is_requeued(self, broker: Any) -> None:
+        await broker.push(new_job({"prompt": "a cat"}, "frontend-1"))
+        first = await broker.claim("worker-1", timeout=1)
+        assert first is not None
+
+        await asyncio.sleep(0.25)
+        second = await broker.claim("worker-2", timeout=1)
+
+        assert second is not None and second["job_id"] == first["job_id"]
+        assert broker.stats()["requeued"] == 1
+
+    async def test_heartbeat_keeps_lease(self, broker: Any) -> None:
+        await broker.push(new_job({"prompt": "a cat"}, "frontend-1"))
+        job = await broker.claim("worker-1", timeout=1)
+        assert job is not None
+
+        for _ in range(3):
+            await asyncio.sleep(0.1)
+            await broker.heartbeat("worker-1", [job["job_id"]])
+
+        assert await broker.claim("worker-2", timeout=0.05) is None
+
+    async def test_cancel(self, broker: Any) -> None:
+        waiting = new_job({"prompt": "a cat"}, "frontend-1")
+        running = new_job({"prompt": "a dog"}, "frontend-1")
+        await broker.push(running)
+        await broker.push(waiting)
+        claimed = await broker.claim("worker-1", timeout=1)
+        assert claimed is not None and claimed["job_id"] == running["job_id"]
+
+        await broker.cancel(waiting["job_id"])
+        await broker.cancel(running["job_id"])
+
+        assert await broker.claim("worker-2", timeout=0.05) is None
+        cancelled = await broker.heartbeat("worker-1", [running["job_id"]])
+        assert cancelled == {running["job_id"]}
+
+    async def test_push_refused_when_full(self, broker: Any) -> None:
+        broker.max_pending = 1
+
+        assert await broker.push(new_job({"prompt": "a cat"}, "frontend-1"))
+        assert not await broker.push(new_job({"prompt": "a dog"}, "frontend-1"))
+
+
+class TestSQLiteBroker:
+    async def test_job_is_claimed_once_across_connections(self, tmp_path: Path) -> None:
+        db_path = str(tmp_path / "broker.db")
+        brokers = [SQLiteBroker(db_path, poll_interval=0.01) for _ in range(3)]
+        for index in range(6):
+            await brokers[0].push(new_job({"seed": index}, "frontend-1"))
+
+        claims = await asyncio.gather(
+            *(
+                broker.claim(f"worker-{index}", timeout=0.1)
+                for index, broker in enumerate(brokers * 3)
+            )
+        )
+
+        seeds = [job["parameters"]["seed"] for job in claims if job is not None]
+        assert sorted(seeds) == list(range(6))
+        for broker in brokers:
+            await broker.close()
+
+
+@pytest.mark.integration
+@pytest.mark.skipif(not os.getenv("REDIS_URL"), reason="REDIS_URL is not set")
+class TestRedisBroker:
+    async def test_job_of_worker_dead_before_lease_is_recovered(self) -> None:
+        broker = RedisBroker.from_url(
+            os.environ["REDIS_URL"], prefix=f"test-{uuid.uuid4().hex}", lease=0.2
+        )
+        job = new_job({"prompt": "a cat"}, "frontend-1")
+        await broker.push(job)
+        # A worker that dies right after taking the job, before leasing it.
+        await broker.redis.blmove(
+            broker._queue, broker._processing, 1, src="RIGHT", dest="LEFT"
+        )
+
+        assert await broker.claim("worker-2", timeout=0.05) is None
+        await asyncio.sleep(0.25)
+        claimed = await broker.claim("worker-2", timeout=1)
+
+        assert claimed is not None and claimed["job_id"] == job["job_id"]
+        await broker.finish(claimed, {"success": True})
+        assert await broker.redis.llen(broker._processing) == 0
+        await broker.close()
+
+
+def test_broker_from_url(tmp_path: Path) -> None:
+    assert isinstance(broker_from_url("memory://"), InMemoryBroker)
+    assert isinstance(broker_from_url(f"sqlite:///{tmp_path}/b.db"), SQLiteBroker)
+    assert isinstance(broker_from_url("redis://localhost:6379/0"), RedisBroker)
+    with pytest.raises(ValueError):
+        broker_from_url("amqp://localhost")
+
+
+class TestFrontendAndWorker:
+    @pytest.fixture
+    def client(self) -> Mock:
+        client = Mock(spec=["queue_prompt", "get_history", "get_queue_status"])
+        client.queue_prompt = AsyncMock(return_value="p1")
+        client.get_history = AsyncMock(return_value={"p1": {"outputs": {"7": {}}}})
+        client.get_queue_status = AsyncMock(
+            return_value={"queue_running": [], "queue_pending": [[1, "p1"]]}
+        )
+        return client
+
+    async def test_generation_runs_in_worker(self, client: Mock) -> None:
+        broker = InMemoryBroker()
+        frontend = RemoteOrchestrator(broker, poll_timeout=0.05)
+        worker = GenerationWorker(
+            broker, WorkflowOrchestrator(client), claim_timeout=0.05
+        )
+        running = asyncio.ensure_future(worker.run())
+        events: List[Dict[str, Any]] = []
+
+        result = await frontend.execute_generation(
+            {"prompt": "a cat"}, on_event=events.append
+        )
+        await worker.stop()
+        await running
+        await frontend.close()
+
+        assert result["success"] is True
+        assert result["outputs"] == {"7": {}}
+        assert events == [{"type": "submitted", "prompt_id": "p1", "position": 0}]
+        assert worker.stats()["completed"] == 1
+
+    async def test_cancelled_caller_stops_worker_job(self) -> None:
+        started = asyncio.Event()
+        stopped = asyncio.Event()
+
+        async def execute_generation(parameters: Dict[str, Any]) -> Dict[str, Any]:
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                stopped.set()
+                raise
+            return {}
+
+        orchestrator = Mock()
+        orchestrator.execute_generation = execute_generation
+        broker = InMemoryBroker()
+        frontend = RemoteOrchestrator(broker, poll_timeout=0.05)
+        worker = GenerationWorker(
+            broker, orchestrator, claim_timeout=0.05, heartbeat_interval=0.01
+        )
+        running = asyncio.ensure_future(worker.run())
+
+        generation = asyncio.ensure_future(
+            frontend.execute_generation({"prompt": "a cat"})
+        )
+        await started.wait()
+        generation.cancel()
+        await asyncio.wait_for(stopped.wait(), timeout=1)
+
+        await worker.stop()
+        await running
+        await frontend.close()
+        assert worker.stats()["cancelled"] == 1
+
+    async def test_busy_and_timeout(self) -> None:
+        broker = InMemoryBroker(max_pending=1)
+        frontend = RemoteOrchestrator(broker, result_timeout=0.05, poll_timeout=0.01)
+
+        first = await frontend.execute_generation({"prompt": "a cat"})
+        # The timed-out job was cancelled, so there is room again.
+        second, third = await asyncio.gather(
+            frontend.execute_generation({"prompt": "a dog"}),
+            frontend.execute_generation({"prompt": "a fox"}),
+        )
+        await frontend.close()
+
+        assert first["timeout"] is True
+        assert second["timeout"] is True
+        assert third["busy"] is True
+        assert broker.stats()["pending"] == 0
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from src.monitoring import Metrics
+
+
+def sample(metrics: Metrics, name: str, **labels: str) -> float:
+    value = metrics.registry.get_sample_value(name, labels)
+    return value if value is not None else 0.0
+
+
+class TestMetrics:
+    def test_stage_records_duration_and_in_flight(self) -> None:
+        metrics = Metrics()
+
+        with metrics.stage("intent"):
+            assert sample(metrics, "chat_ai_stage_in_flight", stage="intent") == 1
+
+        assert sample(metrics, "chat_ai_stage_in_flight", stage="intent") == 0
+        assert (
+            sample(metrics, "chat_ai_stage_duration_seconds_count", stage="intent") == 1
+        )
+
+    def test_exceptions_counted_by_type(self) -> None:
+        metrics = Metrics()
+
+        with pytest.raises(KeyError):
+            with metrics.stage("template"):
+                raise KeyError("missing")
+        metrics.record_error("template", "KeyError")
+
+        assert (
+            sample(
+                metrics,
+                "chat_ai_stage_errors_total",
+                stage="template",
+                error_type="KeyError",
+            )
+            == 2
+        )
+        assert sample(metrics, "chat_ai_stage_in_flight", stage="template") == 0
+
+    def test_render_exposes_text_format(self) -> None:
+        metrics = Metrics()
+        with metrics.stage("queue_prompt"):
+            pass
+
+        body = metrics.render().decode()
+
+        assert (
+            'chat_ai_stage_duration_seconds_bucket{le="0.001",stage="queue_prompt"}'
+            in body
+        )
+        assert metrics.content_type.startswith("text/plain")
+
+    def test_overhead_is_small(self) -> None:
+        metrics = Metrics()
+        iterations = 20000
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            with metrics.stage("intent"):
+                pass
+        per_call = (time.perf_counter() - started) / iterations
+
+        assert per_call < 50e-6
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+from PIL import Image
+
+from src.workflow_engine import PostProcessor, RenditionSpec, parse_renditions
+
+
+def make_artifact(tmp_path: Path, digest: str = "a" * 64) -> Dict[str, Any]:
+    path = tmp_path / f"{digest}.png"
+    Image.new("RGBA", (800, 400), (255, 0, 0, 128)).save(path)
+    return {"digest": digest, "path": str(path)}
+
+
+class TestParseRenditions:
+    def test_parses_sizes_and_formats(self) -> None:
+        specs = parse_renditions("thumb:128:webp, preview:1024,full:0", "jpg", 80)
+
+        assert [(s.name, s.max_size, s.image_format, s.quality) for s in specs] == [
+            ("thumb", 128, "WEBP", 80),
+            ("preview", 1024, "JPEG", 80),
+            ("full", 0, "JPEG", 80),
+        ]
+        assert parse_renditions("") == []
+
+    def test_rejects_unknown_format(self) -> None:
+        with pytest.raises(ValueError):
+            RenditionSpec("thumb", 128, "bmp")
+
+
+class TestPostProcessor:
+    async def test_renders_each_spec(self, tmp_path: Path) -> None:
+        processor = PostProcessor(
+            str(tmp_path / "renditions"),
+            [RenditionSpec("thumb", 100, "webp", 80), RenditionSpec("full", 0, "jpg")],
+            executor=ThreadPoolExecutor(2),
+        )
+
+        renditions = await processor.process([make_artifact(tmp_path)])
+
+        assert [(r["name"], r["format"]) for r in renditions] == [
+            ("thumb", "webp"),
+            ("full", "jpeg"),
+        ]
+        assert (renditions[0]["width"], renditions[0]["height"]) == (100, 50)
+        assert (renditions[1]["width"], renditions[1]["height"]) == (800, 400)
+        with Image.open(renditions[1]["path"]) as image:
+            assert image.format == "JPEG" and image.mode == "RGB"
+        assert processor.stats()["rendered"] == 2
+
+    async def test_same_image_and_settings_rendered_once(self, tmp_path: Path) -> None:
+        processor = PostProcessor(
+            str(tmp_path / "renditions"),
+            [RenditionSpec("thumb", 64)],
+            executor=ThreadPoolExecutor(2),
+        )
+        artifact = make_artifact(tmp_path)
+
+        first, second = await asyncio.gather(
+            processor.process([artifact]), processor.process([artifact])
+        )
+        third = await processor.process([artifact])
+
+        assert first[0]["path"] == second[0]["path"] == third[0]["path"]
+        assert processor.stats()["rendered"] == 1
+
+        # A new processor reuses what is already on disk.
+        restarted = PostProcessor(
+            str(tmp_path / "renditions"),
+            [RenditionSpec("thumb", 64)],
+            executor=ThreadPoolExecutor(1),
+        )
+        assert (await restarted.process([artifact]))[0]["path"] == first[0]["path"]
+        assert restarted.stats()["rendered"] == 0
+
+    async def test_least_recently_used_renditions_are_evicted(
+        self, tmp_path: Path
+    ) -> None:
+        processor = PostProcessor(
+            str(tmp_path / "renditions"),
+            [RenditionSpec("thumb", 64)],
+            executor=ThreadPoolExecutor(1),
+        )
+        first = (await processor.process([make_artifact(tmp_path, "a" * 64)]))[0]
+        processor.max_bytes = first["size"] * 2
+
+        second = (await processor.process([make_artifact(tmp_path, "b" * 64)]))[0]
+        await processor.process([make_artifact(tmp_path, "a" * 64)])
+        await processor.process([make_artifact(tmp_path, "c" * 64)])
+
+        assert Path(first["path"]).exists()
+        assert not Path(second["path"]).exists()
+        assert processor.stats()["evicted"] == 1
+        assert processor.stats()["total_bytes"] <= processor.max_bytes
+
+        # A restart picks up what is on disk and enforces the limit.
+        restarted = PostProcessor(
+            str(tmp_path / "renditions"),
+            executor=ThreadPoolExecutor(1),
+            max_bytes=first["size"],
+        )
+        assert restarted.stats()["total_bytes"] <= first["size"]
+
+    async def test_close_cancels_pending_renders(self, tmp_path: Path) -> None:
+        processor = PostProcessor(
+            str(tmp_path / "renditions"), [RenditionSpec("thumb", 64)]
+        )
+        render = asyncio.ensure_future(processor.process([make_artifact(tmp_path)]))
+        await asyncio.sleep(0)
+
+        processor.close()
+
+        assert await render == []
+        assert processor.stats()["failed"] == 1
+
+    async def test_failed_render_is_skipped(self, tmp_path: Path) -> None:
+        broken = tmp_path / "broken.png"
+        broken.write_bytes(b"not an image")
+        processor = PostProcessor(
+            str(tmp_path / "renditions"), executor=ThreadPoolExecutor(1)
+        )
+
+        renditions = await processor.process(
+            [{"digest": "b" * 64, "path": str(broken)}]
+        )
+
+        assert renditions == []
+        assert processor.stats()["failed"] == 2
+
+    async def test_process_pool_keeps_loop_responsive(self, tmp_path: Path) -> None:
+        processor = PostProcessor(
+            str(tmp_path / "renditions"),
+            [RenditionSpec("thumb", 128, "webp"), RenditionSpec("full", 0, "jpg")],
+            max_workers=2,
+        )
+        artifacts = [make_artifact(tmp_path, str(i) * 64) for i in range(3)]
+        ticks = 0
+
+        async def ticker() -> None:
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        tick_task = asyncio.ensure_future(ticker())
+        started = time.monotonic()
+        try:
+            renditions = await processor.process(artifacts)
+        finally:
+            tick_task.cancel()
+            processor.close()
+
+        assert len(renditions) == 6
+        assert processor.path_for(Path(renditions[0]["path"]).name) is not None
+        # The loop kept ticking while the pool did the Pillow work.
+        assert ticks > (time.monotonic() - started) * 100
+
+    def test_path_for_rejects_unknown_names(self, tmp_path: Path) -> None:
+        processor = PostProcessor(
+            str(tmp_path / "renditions"), executor=ThreadPoolExecutor(1)
+        )
+
+        assert processor.path_for("../etc/passwd") is None
+        assert processor.path_for("c" * 64 + ".png") is None
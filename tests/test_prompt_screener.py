@@ -0,0 +1,77 @@
+import pytest
+
+from src.intent_processing import (
+    SCREENING_EXAMPLES,
+    EmbeddingIntentClassifier,
+    PromptScreener,
+    normalize_prompt,
+)
+
+
+@pytest.mark.parametrize(
+    "prompt, expected",
+    [
+        ("Ｎｕｄｅ Woman", "nude woman"),
+        ("pórn", "porn"),
+        ("n\u200bude", "nude"),
+        ("N4K3D_figure", "naked figure"),
+        ("draw a N.U.D.E woman", "draw a n u d e woman anude nude"),
+    ],
+)
+def test_normalize_prompt(prompt: str, expected: str) -> None:
+    assert normalize_prompt(prompt) == expected
+
+
+class TestPromptScreener:
+    @pytest.mark.parametrize(
+        "prompt, action",
+        [
+            ("a cat sitting on a windowsill", "allow"),
+            ("a woman in lingerie", "allow"),
+            ("a naked man", "filter"),
+            ("draw a n u d e figure", "filter"),
+            ("nude erotic photo", "block"),
+            ("p0rn", "block"),
+            ("a portrait, no nudity, no nsfw", "allow"),
+        ],
+    )
+    def test_actions(self, prompt: str, action: str) -> None:
+        assert PromptScreener().screen(prompt).action == action
+
+    def test_minor_with_sexual_term_is_always_blocked(self) -> None:
+        screener = PromptScreener(filter_threshold=1.0, block_threshold=1.0)
+
+        verdict = screener.screen("a sexy teen")
+
+        assert verdict.blocked
+        assert verdict.reason == "minor"
+        assert screener.screen("a teen riding a bike").action == "allow"
+
+    def test_thresholds(self) -> None:
+        assert PromptScreener(block_threshold=0.7).screen("naked").blocked
+        assert PromptScreener(filter_threshold=0.8).screen("naked").action == "allow"
+
+    def test_cache(self) -> None:
+        screener = PromptScreener(cache_size=1)
+
+        first = screener.screen("a naked man")
+        assert screener.screen("a naked man") is first
+        screener.screen("a cat")
+        assert screener.screen("a naked man") is not first
+
+        stats = screener.stats()
+        assert stats["screened"] == 4
+        assert stats["cache_hits"] == 1
+        assert stats["cached"] == 1
+        assert stats["filtered"] == 3
+
+    def test_classifier_only_filters(self) -> None:
+        screener = PromptScreener(
+            classifier=EmbeddingIntentClassifier(examples=SCREENING_EXAMPLES)
+        )
+
+        verdict = screener.screen("strip tease photo")
+
+        assert verdict.action == "filter"
+        assert verdict.reason == "classifier"
+        assert screener.screen("a bowl of fruit on a table").action == "allow"
@@ -0,0 +1,138 @@
+import asyncio
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+from src.workflow_engine.request_coalescer import RequestCoalescer
+
+
+class TestRequestCoalescer:
+    @pytest.fixture
+    def coalescer(self) -> RequestCoalescer:
+        return RequestCoalescer()
+
+    @pytest.mark.asyncio
+    async def test_identical_keys_share_one_call(
+        self, coalescer: RequestCoalescer
+    ) -> None:
+        calls = 0
+        gate = asyncio.Event()
+
+        async def work(publish: Any) -> Dict[str, Any]:
+            nonlocal calls
+            calls += 1
+            await gate.wait()
+            return {"success": True, "prompt_id": "p1"}
+
+        tasks = [asyncio.ensure_future(coalescer.run("k", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        gate.set()
+        results = await asyncio.gather(*tasks)
+
+        assert calls == 1
+        assert all(r["prompt_id"] == "p1" for r in results)
+        assert "coalesced" not in results[0]
+        assert results[1]["coalesced"] is True
+        assert coalescer.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_different_keys_run_separately(
+        self, coalescer: RequestCoalescer
+    ) -> None:
+        async def work(publish: Any) -> Dict[str, Any]:
+            return {"success": True}
+
+        await asyncio.gather(coalescer.run("a", work), coalescer.run("b", work))
+
+        assert coalescer.stats()["leaders"] == 2
+
+    @pytest.mark.asyncio
+    async def test_leader_cancel_keeps_followers(
+        self, coalescer: RequestCoalescer
+    ) -> None:
+        gate = asyncio.Event()
+
+        async def work(publish: Any) -> Dict[str, Any]:
+            await gate.wait()
+            return {"success": True}
+
+        leader = asyncio.ensure_future(coalescer.run("k", work))
+        follower = asyncio.ensure_future(coalescer.run("k", work))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        gate.set()
+
+        assert (await follower)["success"] is True
+        assert leader.cancelled()
+
+    @pytest.mark.asyncio
+    async def test_last_waiter_cancel_stops_work(
+        self, coalescer: RequestCoalescer
+    ) -> None:
+        cancelled = asyncio.Event()
+
+        async def work(publish: Any) -> Dict[str, Any]:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return {}
+
+        waiter = asyncio.ensure_future(coalescer.run("k", work))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+
+        await asyncio.wait_for(cancelled.wait(), 1)
+
+    @pytest.mark.asyncio
+    async def test_events_reach_every_caller(self, coalescer: RequestCoalescer) -> None:
+        gate = asyncio.Event()
+        leader_events: List[Dict[str, Any]] = []
+        follower_events: List[Dict[str, Any]] = []
+
+        async def work(publish: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+            publish({"type": "submitted", "prompt_id": "p1"})
+            await gate.wait()
+            publish({"type": "progress", "value": 1})
+            return {"success": True}
+
+        leader = asyncio.ensure_future(coalescer.run("k", work, leader_events.append))
+        await asyncio.sleep(0)
+        # Joins after the prompt was submitted.
+        follower = asyncio.ensure_future(
+            coalescer.run("k", work, follower_events.append)
+        )
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(leader, follower)
+
+        expected = [
+            {"type": "submitted", "prompt_id": "p1"},
+            {"type": "progress", "value": 1},
+        ]
+        assert leader_events == expected
+        assert follower_events == expected
+
+    @pytest.mark.asyncio
+    async def test_followers_hear_events_without_a_leader_listener(
+        self, coalescer: RequestCoalescer
+    ) -> None:
+        gate = asyncio.Event()
+        events: List[Dict[str, Any]] = []
+
+        async def work(publish: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+            await gate.wait()
+            publish({"type": "progress", "value": 1})
+            return {"success": True}
+
+        leader = asyncio.ensure_future(coalescer.run("k", work))
+        follower = asyncio.ensure_future(coalescer.run("k", work, events.append))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(leader, follower)
+
+        assert events == [{"type": "progress", "value": 1}]
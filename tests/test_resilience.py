@@ -0,0 +1,178 @@
+import asyncio
+from typing import Any, AsyncGenerator, Dict, List
+from unittest.mock import patch
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.comfyui_control import CircuitBreaker, ComfyUIClient, RetryPolicy
+
+
+class FlakyComfyUI:
+    def __init__(self) -> None:
+        self.failures_left = 0
+        self.land_then_fail = False
+        self.stalled = False
+        self.prompts: List[str] = []
+
+    async def system_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({})
+
+    async def prompt(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if self.land_then_fail and not self.prompts:
+            self.prompts.append(body["prompt_id"])
+            return web.Response(status=503)
+        if self.failures_left:
+            self.failures_left -= 1
+            return web.Response(status=503)
+        self.prompts.append(body["prompt_id"])
+        return web.json_response({"prompt_id": body["prompt_id"]})
+
+    async def queue(self, request: web.Request) -> web.Response:
+        if self.stalled:
+            await asyncio.sleep(0.5)
+        if self.failures_left:
+            self.failures_left -= 1
+            return web.Response(status=502)
+        pending = [[i, prompt_id, {}] for i, prompt_id in enumerate(self.prompts)]
+        return web.json_response({"queue_running": [], "queue_pending": pending})
+
+    async def history(self, request: web.Request) -> web.Response:
+        return web.json_response({})
+
+
+@pytest.fixture
+async def comfyui() -> AsyncGenerator[Dict[str, Any], None]:
+    fake = FlakyComfyUI()
+    app = web.Application()
+    app.router.add_get("/system_stats", fake.system_stats)
+    app.router.add_post("/prompt", fake.prompt)
+    app.router.add_get("/queue", fake.queue)
+    app.router.add_get("/history/{prompt_id}", fake.history)
+    server = TestServer(app)
+    await server.start_server()
+    client = ComfyUIClient(
+        host=str(server.host),
+        port=int(server.port or 0),
+        retry_policy=RetryPolicy(max_attempts=3, base_delay=0.001),
+        failure_threshold=3,
+        recovery_timeout=60,
+    )
+    await client.connect()
+    yield {"fake": fake, "client": client}
+    await client.disconnect()
+    await server.close()
+
+
+class TestCircuitBreaker:
+    def test_opens_after_threshold_and_recovers(self) -> None:
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=10)
+        breaker.record_failure()
+        assert breaker.allow_request()
+        breaker.record_failure()
+
+        assert breaker.state == "open"
+        assert not breaker.allow_request()
+
+        with patch("src.comfyui_control.resilience.time.monotonic") as monotonic:
+            monotonic.return_value = breaker._opened_at + 10
+            assert breaker.state == "half_open"
+            assert breaker.allow_request()
+            assert not breaker.allow_request()
+            breaker.record_success()
+
+        assert breaker.state == "closed"
+        assert breaker.stats()["opened"] == 1
+
+    def test_failed_probe_reopens(self) -> None:
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+        breaker.record_failure()
+        assert breaker.allow_request()
+
+        breaker.record_failure()
+
+        assert breaker.stats()["opened"] == 2
+
+    def test_stuck_probe_expires(self) -> None:
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10)
+        breaker.record_failure()
+
+        with patch("src.comfyui_control.resilience.time.monotonic") as monotonic:
+            monotonic.return_value = breaker._opened_at + 10
+            assert breaker.allow_request()
+            assert not breaker.allow_request()
+            monotonic.return_value += 10
+            assert breaker.allow_request()
+
+    def test_released_probe_reopens(self) -> None:
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+        breaker.release_probe()
+        assert breaker.state == "closed"
+        breaker.record_failure()
+        assert breaker.allow_request()
+
+        breaker.release_probe()
+
+        assert breaker.stats()["opened"] == 2
+
+    def test_retry_delay_is_bounded(self) -> None:
+        policy = RetryPolicy(base_delay=1, max_delay=3)
+
+        delays = [policy.delay(attempt) for attempt in range(1, 10)]
+
+        assert all(0 <= delay <= 3 for delay in delays)
+
+
+class TestClientResilience:
+    @pytest.mark.asyncio
+    async def test_transient_errors_are_retried(self, comfyui: Dict[str, Any]) -> None:
+        comfyui["fake"].failures_left = 2
+
+        status = await comfyui["client"].get_queue_status()
+
+        assert "queue_pending" in status
+        assert comfyui["client"].resilience_stats()["retries"] == {"queue": 2}
+
+    @pytest.mark.asyncio
+    async def test_prompt_retry_does_not_double_queue(
+        self, comfyui: Dict[str, Any]
+    ) -> None:
+        comfyui["fake"].land_then_fail = True
+
+        prompt_id = await comfyui["client"].queue_prompt({"1": {}})
+
+        assert comfyui["fake"].prompts == [prompt_id]
+
+    @pytest.mark.asyncio
+    async def test_open_breaker_fails_fast(self, comfyui: Dict[str, Any]) -> None:
+        comfyui["fake"].failures_left = 100
+
+        first = await comfyui["client"].get_queue_status()
+        calls_before = comfyui["fake"].failures_left
+        second = await comfyui["client"].get_queue_status()
+
+        assert "error" in first
+        assert "unavailable" in second["error"]
+        assert comfyui["fake"].failures_left == calls_before
+        assert comfyui["client"].resilience_stats()["breaker"]["state"] == "open"
+
+    @pytest.mark.asyncio
+    async def test_cancelled_probe_releases_breaker(
+        self, comfyui: Dict[str, Any]
+    ) -> None:
+        client = comfyui["client"]
+        client.breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.05)
+        client.breaker.record_failure()
+        await asyncio.sleep(0.06)
+        comfyui["fake"].stalled = True
+
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.get_queue_status(), 0.05)
+
+        assert client.breaker.state == "open"
+        comfyui["fake"].stalled = False
+        await asyncio.sleep(0.06)
+        assert "queue_pending" in await client.get_queue_status()
+        assert client.breaker.state == "closed"
@@ -0,0 +1,60 @@
+from pathlib import Path
+from unittest.mock import patch
+
+from src.workflow_engine import GenerationCache
+from src.workflow_engine.fingerprint import workflow_fingerprint
+
+
+class TestGenerationCache:
+    def test_fingerprint_ignores_key_order(self) -> None:
+        first = {"1": {"class_type": "A", "inputs": {"x": 1, "y": 2}}}
+        second = {"1": {"inputs": {"y": 2, "x": 1}, "class_type": "A"}}
+
+        assert workflow_fingerprint(first) == workflow_fingerprint(second)
+        assert workflow_fingerprint(first) != workflow_fingerprint(
+            {"1": {"class_type": "A", "inputs": {"x": 1, "y": 3}}}
+        )
+
+    def test_get_and_put(self) -> None:
+        cache = GenerationCache()
+
+        assert cache.get("key") is None
+        cache.put("key", {"prompt_id": "p1", "outputs": {}})
+
+        assert cache.get("key") == {"prompt_id": "p1", "outputs": {}}
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_lru_eviction(self) -> None:
+        cache = GenerationCache(max_entries=2)
+        cache.put("a", {"n": 1})
+        cache.put("b", {"n": 2})
+        cache.get("a")
+
+        cache.put("c", {"n": 3})
+
+        assert cache.get("b") is None
+        assert cache.get("a") == {"n": 1}
+        assert cache.get("c") == {"n": 3}
+
+    def test_ttl_expiry(self) -> None:
+        cache = GenerationCache(ttl=10)
+        with patch("src.workflow_engine.result_cache.time.time", return_value=100):
+            cache.put("a", {"n": 1})
+        with patch("src.workflow_engine.result_cache.time.time", return_value=111):
+            assert cache.get("a") is None
+
+    def test_disk_tier_survives_restart(self, tmp_path: Path) -> None:
+        db_path = str(tmp_path / "cache.db")
+        cache = GenerationCache(db_path=db_path)
+        cache.put("a", {"prompt_id": "p1", "outputs": {"9": {"images": []}}})
+        cache.close()
+
+        reopened = GenerationCache(db_path=db_path)
+
+        assert reopened.get("a") == {
+            "prompt_id": "p1",
+            "outputs": {"9": {"images": []}},
+        }
+        assert reopened.stats()["disk_hits"] == 1
+        reopened.close()
@@ -0,0 +1,78 @@
+from pathlib import Path
+from unittest.mock import patch
+
+from src.chat_interface import SessionStore
+from src.chat_interface.session_store import sqlite_path_from_url
+
+
+class TestSessionStore:
+    def test_record_turn_keeps_last_turns(self) -> None:
+        store = SessionStore(max_turns=2)
+
+        for i in range(3):
+            store.record_turn("u", f"message {i}", "general")
+        session = store.record_turn(
+            "u", "draw a cat", "image_generation", {"style": "anime"}, "p1"
+        )
+
+        assert list(session.turns) == [
+            ("message 2", "general"),
+            ("draw a cat", "image_generation"),
+        ]
+        assert session.slots == {"style": "anime"}
+        assert session.last_output == "p1"
+        assert store.memory_used == session.size
+
+    def test_lru_eviction(self) -> None:
+        store = SessionStore(max_sessions=2)
+        store.record_turn("a", "hi", "general")
+        store.record_turn("b", "hi", "general")
+        store.get("a")
+
+        store.record_turn("c", "hi", "general")
+
+        assert "b" not in store
+        assert "a" in store and "c" in store
+        assert store.stats()["evicted"] == 1
+
+    def test_idle_ttl_expiry(self) -> None:
+        store = SessionStore(idle_ttl=10)
+        with patch("src.chat_interface.session_store.time.time", return_value=100):
+            store.record_turn("a", "hi", "general")
+        with patch("src.chat_interface.session_store.time.time", return_value=111):
+            assert store.get("a") is None
+        assert len(store) == 0
+        assert store.memory_used == 0
+
+    def test_memory_budget_bounds_store(self) -> None:
+        store = SessionStore(memory_budget=4096)
+
+        for i in range(1000):
+            store.record_turn(f"user-{i}", "x" * 100, "general")
+
+        assert store.memory_used <= 4096
+        assert 0 < len(store) < 1000
+
+    def test_evicted_sessions_spill_to_sqlite(self, tmp_path: Path) -> None:
+        db_path = str(tmp_path / "sessions.db")
+        store = SessionStore(max_sessions=1, db_path=db_path, write_batch_size=10)
+        store.record_turn("a", "draw a cat", "image_generation", output="p1")
+        store.record_turn("b", "hello", "general")
+
+        # Still buffered, but readable before the batch is written.
+        assert store.stats()["pending_writes"] == 1
+        assert store.get("a").last_output == "p1"  # type: ignore[union-attr]
+        store.close()
+
+        reopened = SessionStore(db_path=db_path)
+        session = reopened.get("b")
+
+        assert session is not None
+        assert list(session.turns) == [("hello", "general")]
+        assert reopened.stats()["disk_hits"] == 1
+        reopened.close()
+
+    def test_sqlite_path_from_url(self) -> None:
+        assert sqlite_path_from_url("sqlite:///chat.db") == "chat.db"
+        assert sqlite_path_from_url("postgresql://db/chat") is None
+        assert sqlite_path_from_url("") is None
@@ -0,0 +1,97 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict
+from unittest.mock import Mock
+
+import pytest
+
+from src.workflow_engine import (
+    TemplateRegistry,
+    TemplateValidationError,
+    WorkflowOrchestrator,
+)
+from src.workflow_engine.template_registry import validate_workflow
+
+REPO_WORKFLOWS = Path(__file__).resolve().parent.parent / "workflows"
+
+
+def write_template(path: Path, graph: Dict[str, Any], mtime_ns: int) -> None:
+    path.write_text(json.dumps(graph), encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def simple_graph(text: str) -> Dict[str, Any]:
+    return {
+        "1": {"class_type": "CheckpointLoaderSimple", "inputs": {}},
+        "2": {
+            "class_type": "CLIPTextEncode",
+            "inputs": {"text": text, "clip": ["1", 1]},
+        },
+    }
+
+
+class TestTemplateRegistry:
+    def test_indexes_without_parsing(self, tmp_path: Path) -> None:
+        (tmp_path / "broken.json").write_text("{not json", encoding="utf-8")
+        write_template(tmp_path / "ok.json", simple_graph("{prompt}"), 10**18)
+
+        registry = TemplateRegistry(tmp_path)
+
+        assert registry.names() == ["broken", "ok"]
+        assert registry.get("broken") is None
+        assert registry.get("ok") is not None
+
+    def test_hot_reload_on_mtime_change(self, tmp_path: Path) -> None:
+        path = tmp_path / "t.json"
+        write_template(path, simple_graph("{prompt} v1"), 10**18)
+        registry = TemplateRegistry(tmp_path, reload_interval=0)
+        first = registry.get("t")
+        assert first is not None
+        assert registry.get("t") is first
+
+        write_template(path, simple_graph("{prompt} v2"), 2 * 10**18)
+        second = registry.get("t")
+
+        assert second is not None
+        assert second.render({"prompt": "x"})["2"]["inputs"]["text"] == "x v2"
+
+    def test_invalid_edit_keeps_last_good_version(self, tmp_path: Path) -> None:
+        path = tmp_path / "t.json"
+        write_template(path, simple_graph("{prompt}"), 10**18)
+        registry = TemplateRegistry(tmp_path, reload_interval=0)
+        good = registry.get("t")
+
+        bad = simple_graph("{prompt}")
+        bad["2"]["inputs"]["clip"] = ["9", 0]
+        write_template(path, bad, 2 * 10**18)
+
+        assert registry.get("t") is good
+
+    def test_new_files_are_discovered(self, tmp_path: Path) -> None:
+        registry = TemplateRegistry(tmp_path, reload_interval=0)
+        assert registry.get("late") is None
+
+        write_template(tmp_path / "late.json", simple_graph("{prompt}"), 10**18)
+
+        assert registry.get("late") is not None
+
+    def test_validate_workflow_rejects_dangling_links(self) -> None:
+        graph = simple_graph("{prompt}")
+        validate_workflow(graph)
+
+        graph["2"]["inputs"]["clip"] = ["missing", 1]
+        with pytest.raises(TemplateValidationError):
+            validate_workflow(graph)
+
+    def test_repo_workflows_render_through_orchestrator(self) -> None:
+        orchestrator = WorkflowOrchestrator(
+            Mock(), template_registry=TemplateRegistry(REPO_WORKFLOWS)
+        )
+
+        workflow = orchestrator._create_workflow_from_template(
+            "nsfw_filtered_generation", {"prompt": "a red fox"}
+        )
+
+        assert workflow["2"]["inputs"]["text"] == "a red fox, high quality, detailed"
+        assert workflow["8"]["class_type"] == "ApplyNudenet"
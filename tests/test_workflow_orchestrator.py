@@ -1,8 +1,11 @@
+import asyncio
+from typing import Any, Dict, List
 from unittest.mock import AsyncMock, Mock
 
 import pytest
 
-from src.workflow_engine import WorkflowOrchestrator
+from src.monitoring import Metrics
+from src.workflow_engine import GenerationCache, WorkflowOrchestrator
 
 
 class TestWorkflowOrchestrator:
@@ -42,6 +45,327 @@ class TestWorkflowOrchestrator:
         assert result["success"] is True
         mock_client.queue_prompt.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_execute_generation_serves_repeats_from_cache(
+        self, mock_client: Mock
+    ) -> None:
+        orchestrator = WorkflowOrchestrator(mock_client, result_cache=GenerationCache())
+        parameters = {"prompt": "a beautiful landscape", "nsfw_filter": False}
+
+        first = await orchestrator.execute_generation(parameters)
+        second = await orchestrator.execute_generation(parameters)
+
+        assert "cached" not in first
+        assert second["cached"] is True
+        assert second["outputs"] == first["outputs"]
+        mock_client.queue_prompt.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_failed_history_is_an_error_and_not_cached(
+        self, mock_client: Mock
+    ) -> None:
+        mock_client.get_history = AsyncMock(
+            return_value={
+                "test_prompt_id": {
+                    "outputs": {},
+                    "status": {
+                        "status_str": "error",
+                        "completed": False,
+                        "messages": [["execution_error", {"exception_message": "OOM"}]],
+                    },
+                }
+            }
+        )
+        mock_client.wait_for_prompt = AsyncMock(return_value={"status": "completed"})
+        cache = GenerationCache()
+        orchestrator = WorkflowOrchestrator(mock_client, result_cache=cache)
+
+        result = await orchestrator.execute_generation({"prompt": "a cat"})
+
+        assert result["error"] == "OOM"
+        assert "success" not in result
+        assert cache.stats()["entries"] == 0
+
+    @pytest.mark.asyncio
+    async def test_empty_outputs_are_not_cached(self, mock_client: Mock) -> None:
+        mock_client.get_history = AsyncMock(
+            return_value={"test_prompt_id": {"outputs": {}}}
+        )
+        cache = GenerationCache()
+        orchestrator = WorkflowOrchestrator(mock_client, result_cache=cache)
+
+        result = await orchestrator.execute_generation({"prompt": "a cat"})
+
+        assert result["success"] is True
+        assert cache.stats()["entries"] == 0
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_generations_are_coalesced(
+        self, orchestrator: WorkflowOrchestrator, mock_client: Mock
+    ) -> None:
+        parameters = {"prompt": "a beautiful landscape", "nsfw_filter": False}
+
+        results = await asyncio.gather(
+            orchestrator.execute_generation(parameters),
+            orchestrator.execute_generation(dict(parameters)),
+        )
+
+        assert [r["prompt_id"] for r in results] == ["test_prompt_id"] * 2
+        assert results[1]["coalesced"] is True
+        mock_client.queue_prompt.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_wait_for_completion_uses_events(
+        self, orchestrator: WorkflowOrchestrator, mock_client: Mock
+    ) -> None:
+        mock_client.wait_for_prompt = AsyncMock(return_value={"status": "completed"})
+
+        result = await orchestrator._wait_for_completion("test_prompt_id")
+
+        assert result["success"] is True
+        assert result["outputs"] == {"images": ["test.png"]}
+        mock_client.wait_for_prompt.assert_awaited_once_with("test_prompt_id", 300)
+        mock_client.get_history.assert_awaited_once_with("test_prompt_id")
+
+    @pytest.mark.asyncio
+    async def test_wait_for_completion_reports_execution_error(
+        self, orchestrator: WorkflowOrchestrator, mock_client: Mock
+    ) -> None:
+        mock_client.wait_for_prompt = AsyncMock(
+            return_value={"status": "error", "error": "CUDA out of memory"}
+        )
+
+        result = await orchestrator._wait_for_completion("test_prompt_id")
+
+        assert result["error"] == "CUDA out of memory"
+        mock_client.get_history.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_generation_timeout_is_configurable(self, mock_client: Mock) -> None:
+        mock_client.wait_for_prompt = AsyncMock(return_value={"status": "timeout"})
+        mock_client.get_queue_status = AsyncMock(
+            return_value={"queue_running": [], "queue_pending": []}
+        )
+        orchestrator = WorkflowOrchestrator(mock_client, generation_timeout=42)
+
+        result = await orchestrator.execute_generation({"prompt": "a cat"})
+
+        assert result["timeout"] is True
+        mock_client.wait_for_prompt.assert_awaited_once_with("test_prompt_id", 42)
+
+    @pytest.mark.asyncio
+    async def test_execute_generation_streams_progress(
+        self, orchestrator: WorkflowOrchestrator, mock_client: Mock
+    ) -> None:
+        listeners = {}
+        mock_client.add_progress_listener = listeners.__setitem__
+        mock_client.get_queue_status = AsyncMock(
+            return_value={
+                "queue_running": [[1, "other"]],
+                "queue_pending": [[3, "test_prompt_id"], [2, "ahead"]],
+            }
+        )
+
+        async def wait_for_prompt(prompt_id: str, timeout: float) -> dict:
+            listeners[prompt_id]({"type": "progress", "value": 1, "max": 2})
+            return {"status": "completed"}
+
+        mock_client.wait_for_prompt = wait_for_prompt
+        events: list = []
+
+        result = await orchestrator.execute_generation(
+            {"prompt": "a cat"}, on_event=events.append
+        )
+
+        assert result["success"] is True
+        assert events == [
+            {"type": "submitted", "prompt_id": "test_prompt_id", "position": 2},
+            {"type": "progress", "value": 1, "max": 2},
+        ]
+        mock_client.remove_progress_listener.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_execute_generation_stores_artifacts(self, mock_client: Mock) -> None:
+        mock_client.get_history = AsyncMock(
+            return_value={
+                "test_prompt_id": {
+                    "outputs": {"7": {"images": [{"filename": "a.png"}]}}
+                }
+            }
+        )
+        artifact = Mock()
+        artifact.to_dict.return_value = {"digest": "d1", "path": "d1.png", "size": 3}
+        mock_client.download_image = AsyncMock(return_value=artifact)
+        store = Mock()
+        orchestrator = WorkflowOrchestrator(mock_client, artifact_store=store)
+
+        result = await orchestrator.execute_generation({"prompt": "a cat"})
+
+        assert result["artifacts"] == [
+            {
+                "node_id": "7",
+                "filename": "a.png",
+                "digest": "d1",
+                "path": "d1.png",
+                "size": 3,
+            }
+        ]
+        mock_client.download_image.assert_awaited_once_with(
+            {"filename": "a.png"}, store, "test_prompt_id"
+        )
+
+    @pytest.mark.asyncio
+    async def test_execute_generation_post_processes_artifacts(
+        self, mock_client: Mock
+    ) -> None:
+        mock_client.get_history = AsyncMock(
+            return_value={
+                "test_prompt_id": {
+                    "outputs": {"7": {"images": [{"filename": "a.png"}]}}
+                }
+            }
+        )
+        artifact = Mock()
+        artifact.to_dict.return_value = {"digest": "d1", "path": "d1.png", "size": 3}
+        mock_client.download_image = AsyncMock(return_value=artifact)
+        post_processor = Mock()
+        post_processor.process = AsyncMock(return_value=[{"name": "thumbnail"}])
+        orchestrator = WorkflowOrchestrator(
+            mock_client, artifact_store=Mock(), post_processor=post_processor
+        )
+
+        result = await orchestrator.execute_generation({"prompt": "a cat"})
+
+        assert result["renditions"] == [{"name": "thumbnail"}]
+        post_processor.process.assert_awaited_once_with(result["artifacts"])
+
+    @pytest.mark.asyncio
+    async def test_execute_generation_records_stage_metrics(
+        self, mock_client: Mock
+    ) -> None:
+        metrics = Metrics()
+        orchestrator = WorkflowOrchestrator(mock_client, metrics=metrics)
+        listeners: List[Any] = []
+        mock_client.add_progress_listener = Mock(
+            side_effect=lambda prompt_id, listener: listeners.append(listener)
+        )
+
+        async def wait_for_prompt(prompt_id: str, timeout: float) -> Dict[str, Any]:
+            for listener in listeners:
+                listener({"type": "executing", "prompt_id": prompt_id, "node": "4"})
+            return {"status": "timeout"}
+
+        mock_client.wait_for_prompt = wait_for_prompt
+
+        result = await orchestrator.execute_generation({"prompt": "a cat"})
+
+        assert result["error"] == "Timeout waiting for completion"
+        registry = metrics.registry
+        for stage in ("template", "wait_for_completion", "queue_wait", "execution"):
+            assert (
+                registry.get_sample_value(
+                    "chat_ai_stage_duration_seconds_count", {"stage": stage}
+                )
+                == 1
+            )
+        assert (
+            registry.get_sample_value(
+                "chat_ai_stage_errors_total",
+                {"stage": "wait_for_completion", "error_type": "timeout"},
+            )
+            == 1
+        )
+
+    @pytest.mark.asyncio
+    async def test_timed_out_prompt_is_removed_from_queue(
+        self, orchestrator: WorkflowOrchestrator, mock_client: Mock
+    ) -> None:
+        mock_client.wait_for_prompt = AsyncMock(return_value={"status": "timeout"})
+        mock_client.get_queue_status = AsyncMock(
+            return_value={
+                "queue_running": [[1, "other"]],
+                "queue_pending": [[2, "test_prompt_id"]],
+            }
+        )
+        mock_client.cancel_prompt = AsyncMock(return_value=True)
+        mock_client.interrupt = AsyncMock(return_value=True)
+
+        result = await orchestrator.execute_generation({"prompt": "a cat"})
+
+        assert result["timeout"] is True
+        mock_client.cancel_prompt.assert_awaited_once_with("test_prompt_id")
+        mock_client.interrupt.assert_not_called()
+        assert orchestrator.cancelled_prompts == 1
+
+    @pytest.mark.asyncio
+    async def test_abandoned_generation_interrupts_running_prompt(
+        self, orchestrator: WorkflowOrchestrator, mock_client: Mock
+    ) -> None:
+        started = asyncio.Event()
+
+        async def wait_for_prompt(prompt_id: str, timeout: float) -> dict:
+            started.set()
+            await asyncio.sleep(60)
+            return {"status": "completed"}
+
+        mock_client.wait_for_prompt = wait_for_prompt
+        mock_client.get_queue_status = AsyncMock(
+            return_value={"queue_running": [[1, "test_prompt_id"]], "queue_pending": []}
+        )
+        mock_client.cancel_prompt = AsyncMock(return_value=True)
+        mock_client.interrupt = AsyncMock(return_value=True)
+
+        task = asyncio.ensure_future(orchestrator.execute_generation({"prompt": "a"}))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.gather(*orchestrator._cancellations)
+
+        mock_client.interrupt.assert_awaited_once_with("test_prompt_id")
+        mock_client.cancel_prompt.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_shutdown_leaves_prompts_running(
+        self, orchestrator: WorkflowOrchestrator, mock_client: Mock
+    ) -> None:
+        started = asyncio.Event()
+
+        async def wait_for_prompt(prompt_id: str, timeout: float) -> dict:
+            started.set()
+            await asyncio.sleep(60)
+            return {"status": "completed"}
+
+        mock_client.wait_for_prompt = wait_for_prompt
+        mock_client.interrupt = AsyncMock(return_value=True)
+
+        task = asyncio.ensure_future(orchestrator.execute_generation({"prompt": "a"}))
+        await started.wait()
+        orchestrator.shutdown()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert not orchestrator._cancellations
+        mock_client.interrupt.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_tracks_hot_checkpoint_and_swaps(
+        self, orchestrator: WorkflowOrchestrator
+    ) -> None:
+        assert orchestrator.checkpoint_for({}) == "sd3.5_medium.safetensors"
+        assert orchestrator.checkpoint_for({"checkpoint": "flux.safetensors"}) == (
+            "flux.safetensors"
+        )
+
+        for checkpoint in ("a.safetensors", "a.safetensors", "b.safetensors"):
+            await orchestrator.execute_generation(
+                {"prompt": checkpoint, "checkpoint": checkpoint}
+            )
+
+        assert orchestrator.hot_checkpoint == "b.safetensors"
+        assert orchestrator.checkpoint_swaps == 1
+
     def test_create_workflow_from_template_basic(
         self, orchestrator: WorkflowOrchestrator
     ) -> None: